@@ -9,10 +9,22 @@
 #     Writes a list of entries in ssindex format to a file in hierarchical
 #     format.
 #
+#  MergeSubjectIndex (EntryStreams,OutputFile)
+#     Merges a number of sorted sequences of entries in ssindex format and
+#     writes them to a file in hierarchical format.
+#
 #  ReadIndexList (FilePath)
 #     Reads a file in hierarchical format and returns a list of entries in
 #     ssindex format.
 #
+#  ReadSearchIndex (FilePath)
+#     Reads a file in hierarchical format and returns a SearchIndex for the
+#     entries in it.
+#
+#  SearchIndex (Entries)
+#     A class that holds a list of entries in ssindex format, with an index
+#     that allows them to be searched quickly for substrings and prefixes.
+#
 #  'ssindex' format refers to the "topic!sub-topic!sub-topic" form used in
 #  subject index entries in a .tex file, where the index string is the argument
 #  to an \ssindex{} command.
@@ -34,10 +46,22 @@
 #                    Finish.py ADASS scripts. KS.
 #     18th Aug 2017. Added comment about Python 3. KS.
 #     11th Oct 2017. Corrected initial comments - duplicate words removed. KS.
+#     18th Oct 2026. Added the SearchIndex class and ReadSearchIndex(). The
+#                    search index is built in memory each time a file is read;
+#                    saving it on disk was tried, but reading the saved index
+#                    back took nearly as long as building it again.
+#                    Added MergeSubjectIndex(). The writing of the entries is
+#                    now done by WriteSortedEntries(), which buffers the
+#                    output, and WriteSubjectIndex() now returns the number of
+#                    entries written.
+#                    Added SearchIndex.Similar(), to suggest entries close to
+#                    one that is not in the index.
 
 import sys
 import string
 import os
+import heapq
+import bisect
 
 # ------------------------------------------------------------------------------
 
@@ -53,35 +77,84 @@ import os
 #
 #  Note that what is passed should be an open file, not the name of the file.
 #  This allows the caller to add additional material - comments, for example -
-#  before or after the entries written by this routine.
+#  before or after the entries written by this routine. This returns the number
+#  of different entries written.
 
 def WriteSubjectIndex (IndexEntries,OutputFile) :
 
    #  Writing the output file is easy enough, once we have the entries
-   #  in the list sorted - which sorted() does nicely. We can then spot
-   #  duplicate entries - they'll the same as the previous entry - and
-   #  we can see where the various levels change. We only support three
-   #  levels of entry.
+   #  in the list sorted - which sorted() does nicely. WriteSortedEntries()
+   #  does the rest.
+
+   return WriteSortedEntries(sorted(IndexEntries),OutputFile)
+
+# ------------------------------------------------------------------------------
+
+#                     M e r g e  S u b j e c t  I n d e x
+#
+#  This routine is passed a list of sequences of subject entries in the
+#  "topic!sub-topic!sub-topic" form - typically one for each paper in a volume.
+#  Each sequence must already be sorted, but there may be duplicates, both
+#  within a sequence and between them. It merges them and writes them out in
+#  the same alphabetical hierarchical format as WriteSubjectIndex(). The
+#  sequences can be lists or generators, and are only read as the merged
+#  entries are written, so the entries for a whole volume never need to be
+#  held in memory together or sorted again. As for WriteSubjectIndex(),
+#  OutputFile should be an open file, and this returns the number of different
+#  entries written. If a sequence turns out not to be sorted, a ValueError
+#  exception is raised.
+
+def MergeSubjectIndex (EntryStreams,OutputFile) :
+
+   return WriteSortedEntries(heapq.merge(*EntryStreams),OutputFile)
+
+# ------------------------------------------------------------------------------
+
+#                    W r i t e  S o r t e d  E n t r i e s
+#
+#  Does the actual writing for WriteSubjectIndex() and MergeSubjectIndex().
+#  It is passed a sorted sequence of subject entries, and writes them to
+#  the open file OutputFile in alphabetical hierarchical format, returning
+#  the number of different entries written. The lines are collected and
+#  written __WriteBufferLines__ at a time, rather than one write for each
+#  line.
+
+__WriteBufferLines__ = 1024
+
+def WriteSortedEntries (SortedEntries,OutputFile) :
+
+   #  Because the entries are sorted, we can spot duplicate entries - they'll
+   #  the same as the previous entry - and we can see where the various levels
+   #  change. We only support three levels of entry.
 
    LastEntry = ""
    LastTop = ""
    LastSecond = ""
    Count = 0
-   for Entry in sorted(IndexEntries) :
+   Lines = []
+   for Entry in SortedEntries :
       if (Entry != LastEntry) :
+         if (Entry < LastEntry) :
+            raise ValueError("Subject index entries are not sorted: '" + \
+                                         Entry + "' follows '" + LastEntry + "'")
          LastEntry = Entry
          Count = Count + 1
          Levels = Entry.split("!")
          if (Levels[0] != LastTop) :
-            OutputFile.write(Levels[0] + "\r\n")
+            Lines.append(Levels[0] + "\r\n")
             LastTop = Levels[0]
             LastSecond = ""
          if (len(Levels) > 1) :
             if (Levels[1] != LastSecond) :
-               OutputFile.write("    " + Levels[1] + "\r\n")
+               Lines.append("    " + Levels[1] + "\r\n")
                LastSecond = Levels[1]
          if (len(Levels) > 2) :
-            OutputFile.write("        " + Levels[2] + "\r\n")
+            Lines.append("        " + Levels[2] + "\r\n")
+         if (len(Lines) >= __WriteBufferLines__) :
+            OutputFile.write("".join(Lines))
+            Lines = []
+   if (len(Lines) > 0) : OutputFile.write("".join(Lines))
+   return Count
 
 # ------------------------------------------------------------------------------
 
@@ -123,3 +196,170 @@ def ReadIndexList (FilePath) :
                IndexList.append(FullEntry)
       IndexFile.close()
    return IndexList
+
+# ------------------------------------------------------------------------------
+
+#                        S e a r c h  I n d e x
+#
+#  A SearchIndex holds a list of subject entries in the "topic!sub-topic!
+#  sub-topic" form, and can find all the entries that contain a given string,
+#  or that start with a given string, ignoring case. For the substring search,
+#  it keeps a list of the entries containing each 'trigram' (sequence of three
+#  characters) found in the lower case version of the entries. The entries
+#  that contain a string must contain all its trigrams, so only the entries in
+#  the shortest of the lists for those trigrams need to be checked. Strings
+#  shorter than three characters are simply checked against every entry. For
+#  the prefix search, it keeps the entries sorted by their lower case version,
+#  so the ones wanted can be found using a binary search. The trigram lists
+#  are also used by Similar() to find entries like a given string.
+#
+#  All the search routines return the matching entries in the order in which
+#  they were passed to the constructor.
+
+class SearchIndex(object) :
+
+   def __init__(self,Entries = ()) :
+
+      #  Entries is the list of entries in ssindex format.
+
+      self.Entries = list(Entries)
+      self.Lower = [Entry.lower() for Entry in self.Entries]
+      self.Order = sorted(range(len(self.Lower)),key=self.Lower.__getitem__)
+      self.SortedLower = [self.Lower[Index] for Index in self.Order]
+      EntryTrigrams = [TrigramSet(Entry) for Entry in self.Lower]
+      self.TrigramCounts = [len(Set) for Set in EntryTrigrams]
+      Trigrams = {}
+      for Index,Set in enumerate(EntryTrigrams) :
+         for Trigram in Set :
+            if (Trigram in Trigrams) :
+               Trigrams[Trigram].append(Index)
+            else :
+               Trigrams[Trigram] = [Index]
+      self.Trigrams = Trigrams
+
+   def __len__(self) :
+      return len(self.Entries)
+
+   def __contains__(self,Entry) :
+
+      #  Returns True if Entry is one of the entries, with exactly the same
+      #  case.
+
+      Lower = Entry.lower()
+      Posn = bisect.bisect_left(self.SortedLower,Lower)
+      while (Posn < len(self.SortedLower) and self.SortedLower[Posn] == Lower) :
+         if (self.Entries[self.Order[Posn]] == Entry) : return True
+         Posn = Posn + 1
+      return False
+
+   def Search(self,Term) :
+
+      #  Returns a list of the entries that contain Term, ignoring case.
+
+      return [self.Entries[Index] for Index in self.Matches(Term.lower())]
+
+   def SearchAll(self,Terms,Prefix = False) :
+
+      #  Returns a list of the entries that contain every one of the strings
+      #  in the list Terms, ignoring case. If Prefix is True, the entries
+      #  have to start with each of the strings instead.
+
+      if (len(Terms) == 0) : return []
+      Terms = sorted([Term.lower() for Term in Terms],key=len,reverse=True)
+      if (Prefix) :
+         return [self.Entries[Index] for Index in self.PrefixMatches(Terms[0]) \
+                   if all(self.Lower[Index].startswith(Term) for Term in Terms)]
+      Indices = None
+      for Term in Terms :
+         Indices = self.Matches(Term,Indices)
+         if (len(Indices) == 0) : break
+      return [self.Entries[Index] for Index in Indices]
+
+   def SearchPrefix(self,Term) :
+
+      #  Returns a list of the entries that start with Term, ignoring case.
+
+      return [self.Entries[Index] for Index in self.PrefixMatches(Term.lower())]
+
+   def PrefixMatches(self,Term) :
+
+      #  Returns a sorted list of the indices of the entries that start with
+      #  Term, which should already be in lower case.
+
+      Start = bisect.bisect_left(self.SortedLower,Term)
+      End = Start
+      while (End < len(self.SortedLower) and \
+                                   self.SortedLower[End].startswith(Term)) :
+         End = End + 1
+      return sorted(self.Order[Start:End])
+
+   def Similar(self,Term,Count = 3,Threshold = 0.5) :
+
+      #  Returns a list of up to Count (Score,Entry) tuples for the entries
+      #  most like Term, ignoring case, best first. The score runs from 0 to 1,
+      #  and is the proportion of the trigrams in Term and in the entry that
+      #  they have in common. Only entries scoring at least Threshold are
+      #  included. Only the entries in the lists for the trigrams in Term need
+      #  to be looked at, so this is a quick way to suggest what might have
+      #  been meant by an entry that is not in the index.
+
+      Trigrams = TrigramSet(Term.lower())
+      Shared = {}
+      for Trigram in Trigrams :
+         for Index in self.Trigrams.get(Trigram,()) :
+            Shared[Index] = Shared.get(Index,0) + 1
+      Scores = {}
+      for Index in Shared :
+         Score = 2.0 * Shared[Index] / \
+                            (len(Trigrams) + self.TrigramCounts[Index])
+         if (Score >= Threshold) : Scores[self.Entries[Index]] = Score
+      Best = sorted(Scores.items(),key=lambda Item : (-Item[1],Item[0]))
+      return [(Score,Entry) for Entry,Score in Best[:Count]]
+
+   def Matches(self,Term,Candidates = None) :
+
+      #  Returns a sorted list of the indices of the entries that contain
+      #  Term, which should already be in lower case. If Candidates is passed
+      #  as a sorted list of indices, only those entries are considered.
+
+      if (len(Term) >= 3) :
+         Lists = []
+         for Posn in range(len(Term) - 2) :
+            List = self.Trigrams.get(Term[Posn:Posn + 3])
+            if (List == None) : return []
+            Lists.append(List)
+         Shortest = min(Lists,key=len)
+         if (Candidates == None) :
+            Candidates = Shortest
+         elif (len(Shortest) < len(Candidates)) :
+            Wanted = set(Candidates)
+            Candidates = [Index for Index in Shortest if Index in Wanted]
+      elif (Candidates == None) :
+         Candidates = range(len(self.Lower))
+      return [Index for Index in Candidates if Term in self.Lower[Index]]
+
+# ------------------------------------------------------------------------------
+
+#                          T r i g r a m  S e t
+#
+#  Returns the set of trigrams - sequences of three characters - in Text. This
+#  is empty if Text has fewer than three characters.
+
+def TrigramSet (Text) :
+
+   return set(Text[Posn:Posn + 3] for Posn in range(len(Text) - 2))
+
+# ------------------------------------------------------------------------------
+
+#                     R e a d  S e a r c h  I n d e x
+#
+#  This routine is passed the name of a file containing subject index entries
+#  in alphabetical hierarchical format, and returns a SearchIndex for the
+#  entries in the file, as read by ReadIndexList(). The index is only held in
+#  memory - a program that looks up entries many times should keep the
+#  SearchIndex rather than call this again. If the file does not exist, this
+#  returns an empty SearchIndex.
+
+def ReadSearchIndex (FilePath) :
+
+   return SearchIndex(ReadIndexList(FilePath))
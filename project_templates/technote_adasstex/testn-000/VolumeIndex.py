@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+#                       V o l u m e  I n d e x . p y
+#
+#  A convenience script to help with processing the submissions for an
+#  ADASS conference. This builds the subject index and the author index for a
+#  whole volume from the \ssindex and \author entries in the individual papers.
+#
+#  Usage:
+#     VolumeIndex VolumeDir <subject index> <author index> <jobs>
+#
+#     where VolumeDir is the top level directory for the volume, with each
+#     paper in its own sub-directory (see AdassChecks.PaperDirectories()),
+#     subject index and author index are the names of the files to be written
+#     (by default, VolumeSubjectIndex.txt and VolumeAuthorIndex.txt in the
+#     current directory) and jobs is the number of processes used to look at
+#     the papers (by default, one for each processor).
+#
+#  The main .tex file for each paper is found using AdassChecks.LocateTexFile(),
+#  its subject index entries are found using AdassChecks.SubjectIndexEntries()
+#  and its authors using AdassChecks.GetAuthors(). Both of these are kept in
+#  the .tex file cache maintained by AdassChecks.CachedTexProduct(), keyed by a
+#  hash of the contents of the .tex file, so when the indexes are built again
+#  only the papers whose .tex files have changed are looked at again.
+#
+#  The subject index is written in the alphabetical hierarchical format used
+#  by the subject index lists (see AdassIndex.py), so it can be compared with
+#  or merged into the master subject index list. The author index is written
+#  in the same format, with each author (in the form used by an \aindex
+#  directive) followed by the papers they are an author of. The entries for
+#  each paper are sorted as they come in, and the sorted lists are merged by
+#  AdassIndex.MergeSubjectIndex(), so the entries for the whole volume are
+#  never sorted together. Duplicate entries only appear once.
+#
+#  History:
+#     18th Oct 2026. Original version.
+#
+
+from __future__ import (print_function,division,absolute_import)
+
+import io
+import os
+import sys
+import time
+import traceback
+import contextlib
+import concurrent.futures
+
+import AdassChecks
+import AdassIndex
+
+# ------------------------------------------------------------------------------
+
+#                         P a p e r  A u t h o r s
+#
+#   Returns the authors of the paper whose main .tex file is TexFileName, as
+#   a list of two items: the list of authors returned by GetAuthors(), and the
+#   list of notes it produced about the author list. This is the builder used
+#   with CachedTexProduct(), so its result is kept in the .tex file cache.
+
+def PaperAuthors (TexFileName) :
+
+   Notes = []
+   Authors = AdassChecks.GetAuthors("",Notes,TexFileName)
+   return [Authors,Notes]
+
+# ------------------------------------------------------------------------------
+
+#                     E x t r a c t  P a p e r  I n d e x
+#
+#   Finds the index entries for the paper in the specified directory, the
+#   directory name being taken as the paper designation. This is run in a
+#   separate process for each paper, so it can change to the paper's
+#   directory, and any output from the AdassChecks routines is discarded.
+#   This returns a tuple giving the directory, the paper (the name of the main
+#   .tex file without the .tex, blank if none was found), a sorted list of the
+#   paper's authors, a sorted list of its subject index entries, without any
+#   duplicates, and a list of notes about anything that looked amiss.
+
+def ExtractPaperIndex (Directory) :
+
+   Paper = ""
+   Authors = []
+   Entries = []
+   Notes = []
+   try :
+      os.chdir(Directory)
+      with contextlib.redirect_stdout(io.StringIO()) :
+         TexFiles = AdassChecks.LocateTexFile(os.path.basename(Directory),\
+                                                                 None,True)
+         if (len(TexFiles) == 0) :
+            Notes.append("Unable to locate a main .tex file")
+         else :
+            TexFileName = os.path.abspath(TexFiles[0])
+            Paper = TexFiles[0][:-4]
+            Authors,AuthorNotes = AdassChecks.CachedTexProduct(TexFileName,\
+                                                      "Authors",PaperAuthors)
+            Notes.extend(AuthorNotes)
+            if (len(Authors) == 0) : Notes.append("No authors found")
+            Entries = AdassChecks.SubjectIndexEntries(Paper,None,TexFileName)
+   except Exception :
+      Notes.append("Index extraction failed: " + \
+                         traceback.format_exc().strip().split("\n")[-1])
+
+   return (Directory,Paper,sorted(set(Authors)),sorted(set(Entries)),Notes)
+
+# ------------------------------------------------------------------------------
+
+#                         V o l u m e  I n d e x
+#
+#   Builds the subject index and the author index for all the papers in
+#   VolumeDir, writing them to the files SubjectFileName and AuthorFileName,
+#   as described in the header comments. The papers are looked at by a pool of
+#   Jobs processes (by default, one for each processor). This returns the
+#   number of papers for which no authors were found.
+
+def VolumeIndex (VolumeDir,SubjectFileName,AuthorFileName,Jobs = None) :
+
+   VolumeDir = os.path.abspath(VolumeDir)
+   Directories = AdassChecks.PaperDirectories(VolumeDir)
+   print("Building the indexes for",len(Directories),"papers in",VolumeDir)
+
+   SubjectStreams = []
+   AuthorStreams = []
+   NoAuthors = 0
+   Executor = concurrent.futures.ProcessPoolExecutor(max_workers = Jobs)
+   for Result in Executor.map(ExtractPaperIndex,Directories) :
+      Directory,Paper,Authors,Entries,Notes = Result
+      Name = os.path.relpath(Directory,VolumeDir)
+      print("   ",Name,":",len(Authors),"authors,",len(Entries), \
+                                                         "subject entries")
+      for Note in Notes :
+         print("       ",Note)
+      if (len(Authors) == 0) : NoAuthors = NoAuthors + 1
+      if (Paper != "") : Name = Paper
+      SubjectStreams.append(Entries)
+
+      #  The author entries have to be sorted again once the paper has been
+      #  added - "Smith!P1" sorts after "Smith J!P1", although "Smith" sorts
+      #  before "Smith J" - or MergeSubjectIndex() would get them out of order.
+
+      AuthorStreams.append(sorted(Author + '!' + Name for Author in Authors))
+   Executor.shutdown()
+
+   Header = "# " + "%s index for " + VolumeDir + "\r\n# Built by " + \
+                          "VolumeIndex.py, " + time.strftime("%c") + "\r\n"
+   SubjectFile = open(SubjectFileName,mode='w')
+   SubjectFile.write(Header % "Subject")
+   SubjectCount = AdassIndex.MergeSubjectIndex(SubjectStreams,SubjectFile)
+   SubjectFile.close()
+   AuthorFile = open(AuthorFileName,mode='w')
+   AuthorFile.write(Header % "Author")
+   AuthorCount = AdassIndex.MergeSubjectIndex(AuthorStreams,AuthorFile)
+   AuthorFile.close()
+
+   print("")
+   print(SubjectCount,"subject index entries written to",SubjectFileName)
+   print(AuthorCount,"author index entries written to",AuthorFileName)
+   if (NoAuthors > 0) :
+      print("** No authors were found for",NoAuthors,"of the papers **")
+
+   return NoAuthors
+
+# ------------------------------------------------------------------------------
+
+#                   M a i n  V o l u m e  I n d e x  P r o g r a m
+
+if (__name__ == "__main__") :
+
+   NumberArgs = len(sys.argv)
+   if (NumberArgs < 2) :
+      print("Usage: VolumeIndex <volume directory> [<subject index> " + \
+                                           "[<author index> [<jobs>]]]")
+      print("eg: VolumeIndex ADASS2026 SubjectIndex.txt AuthorIndex.txt")
+   else :
+      SubjectFileName = "VolumeSubjectIndex.txt"
+      if (NumberArgs > 2) : SubjectFileName = sys.argv[2]
+      AuthorFileName = "VolumeAuthorIndex.txt"
+      if (NumberArgs > 3) : AuthorFileName = sys.argv[3]
+      Jobs = None
+      if (NumberArgs > 4) : Jobs = int(sys.argv[4])
+      NoAuthors = VolumeIndex(sys.argv[1],SubjectFileName,AuthorFileName,Jobs)
+      sys.exit( - NoAuthors )
@@ -21,11 +21,20 @@
 #                            convert to python3
 #                12-dec-2018 integrating into ADASSProceedings/Author_Template for the 2018 proceedings
 #                 6-oct-2020 allow asclKeywords with codes that contain a space (by using a 2nd :)
+#                18-oct-2026 parse4 uses an Aho-Corasick automaton (CodeMatcher) over the whole file,
+#                            so code names with spaces are found, and reports line:column
+#                            the codes and the automaton are kept in a binary index (asclKeywords.idx)
+#                            next to asclKeywords.txt, rebuilt when that changes; --build to force it
 
 from __future__ import print_function
 
 import sys
 import os
+import re
+import bisect
+import hashlib
+import marshal
+import tempfile
 
 debug   = False
 punct   = ['.', ',', '/', ':', ';', '{', '}', '@', '(', ')', '[', ']', '\\', '\'', '"', '!']
@@ -143,36 +152,154 @@ def wclean(word):
     return w
 
 
-def parse4(file,codes,comment):
+class CodeMatcher(object):
+    """Aho-Corasick automaton for finding ASCL code names in a document
+
+    Built once from the (lowercase) keys of the codes dictionary returned by parse2.
+    A single pass over the text finds all the code names in it, including those
+    that contain spaces. The text is lowercased and each run of whitespace is
+    treated as a single space, so a multi-word name also matches across a line break.
+    As with wclean, a name only matches a whole word, give or take punctuation
+    at either end.
+    """
+    def __init__(self, codes):
+        self.goto = [{}]      # per state: character -> next state
+        self.fail = [0]       # per state: state for the longest proper suffix
+        self.out  = [None]    # per state: code name ending here, if any
+        self.link = [0]       # per state: nearest suffix state with a code name
+        for code in codes:
+            self.add(' '.join(code.split()))
+        self.build()
+
+    @classmethod
+    def from_state(cls, state):
+        """rebuild a matcher from the tuple returned by state(), without redoing the work"""
+        self = cls.__new__(cls)
+        (self.goto, self.fail, self.out, self.link) = state
+        return self
+
+    def state(self):
+        return (self.goto, self.fail, self.out, self.link)
+
+    def add(self, code):
+        if len(code) == 0:
+            return
+        state = 0
+        for c in code:
+            nxt = self.goto[state].get(c)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][c] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(None)
+                self.link.append(0)
+            state = nxt
+        self.out[state] = code
+
+    def build(self):
+        """breadth first pass to set the failure and output links"""
+        queue = list(self.goto[0].values())
+        i = 0
+        while i < len(queue):
+            state = queue[i]
+            i = i + 1
+            for c, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and c not in self.goto[f]:
+                    f = self.fail[f]
+                f = self.goto[f].get(c, 0)
+                if f == nxt:
+                    f = 0
+                self.fail[nxt] = f
+                if self.out[f] is not None:
+                    self.link[nxt] = f
+                else:
+                    self.link[nxt] = self.link[f]
+
+    def find(self, text):
+        """return a list of (line, column, code) for the code names in text
+
+        line and column count from 1. Where matches overlap, the leftmost one is
+        kept, and of those starting at the same place, the longest.
+        """
+        # normalized text, and where each of its words starts in the original
+        spans = [(m.start(), m.end()) for m in re.finditer(r'\S+', text)]
+        words = [text[a:b].lower() for (a, b) in spans]
+        starts = []
+        n = 0
+        for w in words:
+            starts.append(n)
+            n = n + len(w) + 1
+        norm = ' '.join(words)
+
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        link = self.link
+        found = []
+        state = 0
+        for i, c in enumerate(norm):
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+            s = state if out[state] is not None else link[state]
+            while s:
+                code = out[s]
+                a = i + 1 - len(code)
+                if self.isword(norm, a, i + 1):
+                    found.append((a, -len(code), code))
+                s = link[s]
+        found.sort()
+
+        newlines = [0] + [m.end() for m in re.finditer('\n', text)]
+        matches = []
+        end = 0
+        for (a, minus_len, code) in found:
+            if a < end:
+                continue
+            end = a - minus_len
+            w = bisect.bisect_right(starts, a) - 1
+            pos = spans[w][0] + min(a - starts[w], spans[w][1] - spans[w][0] - 1)
+            line = bisect.bisect_right(newlines, pos)
+            matches.append((line, pos - newlines[line - 1] + 1, code))
+        return matches
+
+    def isword(self, norm, a, b):
+        """true if norm[a:b] is a whole word, allowing for leading and trailing punctuation"""
+        while a > 0 and norm[a - 1] in punct:
+            a = a - 1
+        while b < len(norm) and norm[b] in punct:
+            b = b + 1
+        return (a == 0 or norm[a - 1] == ' ') and (b == len(norm) or norm[b] == ' ')
+
+
+def parse4(file,codes,comment,matcher=None):
     """
     codename ->   codename\ooindex{codename, ascl_id}
 
     codename ->
     %
+
+    matcher, a CodeMatcher for codes, can be passed in if it has already been built
     """
     fp = open(file,'r')
-    lines = fp.readlines()
+    text = fp.read()
     fp.close()
+    lines = text.splitlines(True)
     if debug: print(codes)
-    ln = 0
-    for line in lines:
-        ln = ln + 1
-        if debug: print('LINE: '+line)
-        line2 = ''
-        has_a_code = False
-        words = line.split()
-        for dword in words:
-            word = wclean(dword)
-            if debug: print('WORD: ',dword,word)
-            #if codes.has_key(word):                        # not python3
-            if word in codes:
-                has_a_code = True
-                line2 = line2 +  comment + "%s \n" % (codes[word])
-        if has_a_code:
-            print("#[%d] %s" % (ln,line))
-            print(line2)
-        else:
-            if debug: print(line)
+    if matcher is None:
+        matcher = CodeMatcher(codes)
+    byline = {}
+    for (ln, col, code) in matcher.find(text):
+        if debug: print('MATCH: ',ln,col,code)
+        byline.setdefault(ln, []).append((col, code))
+    for ln in sorted(byline):
+        cols = ','.join([str(col) for (col, code) in byline[ln]])
+        line2 = ''.join([comment + "%s \n" % (codes[code]) for (col, code) in byline[ln]])
+        print("#[%d:%s] %s" % (ln,cols,lines[ln-1]))
+        print(line2)
     ns = 0
     for line in lines:
         if line.find('\ooindex{') > 0:
@@ -185,6 +312,75 @@ def parse4(file,codes,comment):
         
 
 
+# binary index of asclKeywords.txt: the codes from parse2 and the CodeMatcher built from them
+
+index_magic = b'ASCLIDX1'
+_index = {}
+
+
+def index_name(afile):
+    return os.path.splitext(afile)[0] + '.idx'
+
+
+def build_index(afile, ifile=None):
+    """parse afile and save the codes and matcher in the binary index ifile
+
+    The index is written with marshal, so it is compact and quick to load, but it is
+    only ever read back by this script, for the Python version that wrote it. It
+    records the size, modification time and SHA1 of afile, so that load_index can tell
+    when it needs rebuilding. If it cannot be written, the results are still returned.
+    """
+    if ifile is None:
+        ifile = index_name(afile)
+    fp = open(afile,'rb')
+    data = fp.read()
+    st = os.fstat(fp.fileno())
+    fp.close()
+    codes = parse2(afile)
+    matcher = CodeMatcher(codes)
+    header = (sys.version_info[:2], st.st_size, st.st_mtime_ns, hashlib.sha1(data).hexdigest())
+    try:
+        fd, tmp = tempfile.mkstemp('.tmp', 'asclidx', os.path.dirname(os.path.abspath(ifile)))
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(index_magic + marshal.dumps((header, codes, matcher.state())))
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, ifile)
+    except OSError as e:
+        if debug: print('Cannot write %s: %s' % (ifile, e))
+    return (codes, matcher)
+
+
+def load_index(afile):
+    """return (codes, matcher) for afile, using the binary index if it is up to date
+
+    The index is only rebuilt if afile's size or modification time has changed and
+    its contents have too. Each afile is only loaded once.
+    """
+    if afile in _index:
+        return _index[afile]
+    ifile = index_name(afile)
+    result = None
+    try:
+        with open(ifile, 'rb') as fp:
+            data = fp.read()
+        if data.startswith(index_magic):
+            # one marshal.loads of the whole thing is much quicker than marshal.load
+            ((version, size, mtime, sha1), codes, state) = marshal.loads(data[len(index_magic):])
+            st = os.stat(afile)
+            fresh = version == sys.version_info[:2]
+            if fresh and (size, mtime) != (st.st_size, st.st_mtime_ns):
+                with open(afile, 'rb') as ap:
+                    fresh = hashlib.sha1(ap.read()).hexdigest() == sha1
+            if fresh:
+                result = (codes, CodeMatcher.from_state(state))
+    except (OSError, EOFError, ValueError, TypeError):
+        result = None
+    if result is None:
+        result = build_index(afile, ifile)
+    _index[afile] = result
+    return result
+
+
 #parse3('sample.tex',codes)
 
 if __name__ == '__main__':
@@ -192,26 +388,31 @@ if __name__ == '__main__':
     afile = 'asclKeywords.txt'
     if len(sys.argv) == 1:
         print("Usage: %s tex_file" % sys.argv[0])
+        print("       %s --build" % sys.argv[0])
         print("")
         print("Scans tex_file for occurences of ASCL code names, and prints out the ")
         print("corresponding %\ooindex{NAME, ascl:yymm:nnn} to be cut and pasted into tex_file")
         print("including the line number and text that triggered the match")
         print("Lookup table of codes in %s" % afile)
+        print("--build rebuilds its index %s (normally done automatically)" % index_name(afile))
         sys.exit(0)
 
         
     filename = sys.argv[1]
-    if os.path.exists(filename):
+    if filename == '--build':
+        codes = build_index(afile)[0]
+        print('Found %d code entries' % len(codes))
+    elif os.path.exists(filename):
         if False:
             codes = parse1('ascl.php')
+            matcher = None
         else:
-            codes = parse2(afile)
-        parse4(filename,codes,comment)
+            (codes, matcher) = load_index(afile)
+        parse4(filename,codes,comment,matcher)
     else:
         # could try grepping this as a word in 'afile'
         codename = filename.lower()
         #
-        codes = parse2(afile)
+        codes = load_index(afile)[0]
         if codename in codes:
             print(codename,codes[codename])
-        
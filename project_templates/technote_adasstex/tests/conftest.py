@@ -0,0 +1,23 @@
+#
+#                        c o n f t e s t . p y
+#
+#  Lets the tests in this directory import the ADASS scripts they test. The
+#  scripts are shipped in the paper template, and the tests are kept here so
+#  that they are not copied into every new paper. Run the tests from the
+#  technote_adasstex directory using:
+#
+#     python3 -m pytest tests
+#
+#  The scripts are imported from the template itself, and no .pyc files are
+#  written for them, so nothing is left behind in the template.
+#
+#  History:
+#     18th Oct 2026. Original version.
+#
+
+import os
+import sys
+
+sys.dont_write_bytecode = True
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+       "..","{{cookiecutter.series.lower()}}-{{cookiecutter.serial_number}}"))
@@ -0,0 +1,132 @@
+#
+#                    t e s t _ A d a s s C h e c k s . p y
+#
+#  Tests for some of the routines in AdassChecks.py that work on the files
+#  supplied with a paper. These use pytest, and each test works on files it
+#  writes into a temporary directory. Run them using:
+#
+#     python3 -m pytest tests/test_AdassChecks.py
+#
+#  History:
+#     18th Oct 2026. Original version, with tests for IndexBibFile(),
+#                    ReadBibEntry() and TrimBibFile(), and for the CheckResults
+#                    from CheckCite(), CheckPackages() and CheckRunningHeads().
+#
+
+import os
+
+import AdassChecks
+
+#  A .bib file with text and comments between the entries, as well as an
+#  entry whose name is on the line after the '@'.
+
+__BibText__ = b"""% References for the test paper
+
+@article{used2020,
+  author = {Smith, J.},
+  title = {{A Used Paper}},
+  year = 2020
+}
+
+Some junk text
+% ---- Other references ----
+
+@book{
+   unused2019,
+  author = {Jones, A.},
+  year = 2019
+}
+More junk after an unused entry
+% A trailing comment
+
+@misc{alsoused,
+  note = {last}
+}
+"""
+
+__TexText__ = """\\documentclass{article}
+\\begin{document}
+See \\citet{used2020} and \\citep{alsoused}.
+\\end{document}
+"""
+
+def WriteFiles (Directory) :
+   with open(os.path.join(Directory,"P9-9.bib"),"wb") as BibFile :
+      BibFile.write(__BibText__)
+   with open(os.path.join(Directory,"P9-9.tex"),"w") as TexFile :
+      TexFile.write(__TexText__)
+
+# ------------------------------------------------------------------------------
+
+#  Each entry found by IndexBibFile() should cover just the entry itself, from
+#  the '@' to the closing brace, and not anything between it and the next one.
+
+def test_IndexBibFile_EntriesStopAtClosingBrace (tmp_path) :
+   WriteFiles(str(tmp_path))
+   BibFileName = os.path.join(str(tmp_path),"P9-9.bib")
+   Entries = AdassChecks.IndexBibFile(BibFileName)
+   assert [Entry.Key for Entry in Entries] == \
+                                      ["used2020","unused2019","alsoused"]
+   assert [Entry.Line for Entry in Entries] == [3,12,20]
+   with open(BibFileName,"rb") as BibFile :
+      Texts = [AdassChecks.ReadBibEntry(BibFile,Entry) for Entry in Entries]
+   for Text in Texts :
+      assert Text.startswith(b"@")
+      assert Text.rstrip().endswith(b"}")
+   assert b"junk" not in Texts[0]
+   assert b"Other references" not in Texts[0]
+   assert b"More junk" not in Texts[1]
+   assert b"trailing comment" not in Texts[1]
+
+#  TrimBibFile() should only comment out the unused entry, leaving the text
+#  and comments around it as they were.
+
+def test_TrimBibFile_KeepsTextBetweenEntries (tmp_path,monkeypatch) :
+   WriteFiles(str(tmp_path))
+   monkeypatch.chdir(str(tmp_path))
+   AdassChecks.TrimBibFile("P9-9")
+   with open("P9-9.bib","rb") as BibFile :
+      Lines = BibFile.read().splitlines()
+   assert b"Some junk text" in Lines
+   assert b"% ---- Other references ----" in Lines
+   assert b"More junk after an unused entry" in Lines
+   assert b"% A trailing comment" in Lines
+   assert b"%_AT_book{" in Lines
+   assert b"%   unused2019," in Lines
+   assert b"@article{used2020," in Lines
+   assert b"@misc{alsoused," in Lines
+
+#  A .tex file with problems for CheckCite(), CheckPackages() and
+#  CheckRunningHeads() on known lines, including a second \markboth with the
+#  wrong number of arguments.
+
+__ChecksText__ = """\\documentclass{article}
+\\usepackage{asp2014}
+\\usepackage{graphicx,foo}
+\\markboth{Author1, Author2, and Author3}{A Title}
+\\begin{document}
+See \\cite{old2019} and
+\\citep{new2020}.
+\\markboth{Only one}
+\\end{document}
+"""
+
+#  The checks should give a CheckResult for each problem, with the line of
+#  the directive concerned and a suggested fix.
+
+def test_CheckResults_GiveLinesAndFixes (tmp_path) :
+   TexFileName = os.path.join(str(tmp_path),"P9-9.tex")
+   with open(TexFileName,"w") as TexFile :
+      TexFile.write(__ChecksText__)
+   Results = []
+   assert not AdassChecks.CheckCite("P9-9",TexFileName,None,Results)
+   assert not AdassChecks.CheckPackages("P9-9",TexFileName,None,Results)
+   assert not AdassChecks.CheckRunningHeads("P9-9",TexFileName,None,Results)
+   Found = [(Result.Check,Result.Line) for Result in Results]
+   assert Found == [("Cite",6),("Packages",3),("Packages",3), \
+             ("RunningHeads",4),("RunningHeads",8),("RunningHeads",8)]
+   for Result in Results :
+      assert Result.File == TexFileName
+      assert Result.Fix != ""
+   assert Results[0].Fix == "Use \\citep{old2019} or \\citet{old2019} instead"
+   assert Results[3].Message == "Author list is unchanged from the template"
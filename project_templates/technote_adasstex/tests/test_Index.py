@@ -0,0 +1,84 @@
+#
+#                         t e s t _ I n d e x . p y
+#
+#  Tests for the way Index.py finds and reads the subject index lists, and
+#  for the checks made by its lookup server. These use pytest, and each test
+#  works in a temporary directory with no ADASS_Configuration file, so the
+#  lists are looked for in that directory. Run them using:
+#
+#     python3 -m pytest tests/test_Index.py
+#
+#  History:
+#     18th Oct 2026. Original version.
+#
+
+import os
+import json
+import socket
+import threading
+
+import Index
+
+def MakeVolume (Directory,monkeypatch) :
+   monkeypatch.setenv("HOME",Directory)
+   monkeypatch.chdir(Directory)
+   with open("subjectKeywords.txt","w") as IndexFile :
+      IndexFile.write("Galaxies\nGalaxies!spiral\n")
+
+# ------------------------------------------------------------------------------
+
+#  If there is no new subject index list, NewIndexPath should stay blank
+#  rather than becoming the current directory, and the searches should only
+#  use the master list.
+
+def test_IndexFiles_NoNewIndex (tmp_path,monkeypatch) :
+   MakeVolume(str(tmp_path),monkeypatch)
+   Indexes = Index.IndexFiles()
+   assert Indexes.Load([])
+   assert Indexes.MasterIndexPath == \
+                         os.path.join(str(tmp_path),"subjectKeywords.txt")
+   assert Indexes.NewIndexPath == ""
+   assert not Indexes.NewIndexExists
+   assert Indexes.Search(["Gal"]) == (["Galaxies","Galaxies!spiral"],[])
+
+#  FileSignature() should only give a signature for an ordinary file.
+
+def test_FileSignature_OnlyForFiles (tmp_path,monkeypatch) :
+   MakeVolume(str(tmp_path),monkeypatch)
+   assert Index.FileSignature("") == None
+   assert Index.FileSignature(str(tmp_path)) == None
+   assert Index.FileSignature("newKeywords.txt") == None
+   assert Index.FileSignature("subjectKeywords.txt") != None
+
+#  LookupHandler() should only accept a list of terms - a single string would
+#  otherwise be searched for one character at a time.
+
+def test_LookupHandler_TermsMustBeList (tmp_path,monkeypatch) :
+   MakeVolume(str(tmp_path),monkeypatch)
+   Indexes = Index.IndexFiles()
+   assert Indexes.Load([])
+   Client,Connection = socket.socketpair()
+   Thread = threading.Thread(target=Index.LookupHandler, \
+                                                args=(Connection,Indexes))
+   Thread.start()
+   Reader = Client.makefile('rb')
+   Client.sendall(b'{"Terms" : "Gal"}\n{"Terms" : ["Gal"]}\n')
+   Reply = json.loads(Reader.readline().decode("utf-8"))
+   assert "Error" in Reply
+   Reply = json.loads(Reader.readline().decode("utf-8"))
+   assert Reply["Searches"][0]["Master"] == ["Galaxies","Galaxies!spiral"]
+   Reader.close()
+   Client.close()
+   Thread.join()
+
+#  Serve() should refuse to start, and leave the file alone, if the socket
+#  path is an existing file that is not a socket.
+
+def test_Serve_RefusesNonSocket (tmp_path,monkeypatch) :
+   MakeVolume(str(tmp_path),monkeypatch)
+   SocketPath = os.path.join(str(tmp_path),"NotASocket")
+   with open(SocketPath,"w") as File :
+      File.write("Keep me\n")
+   assert not Index.Serve(SocketPath)
+   with open(SocketPath) as File :
+      assert File.read() == "Keep me\n"
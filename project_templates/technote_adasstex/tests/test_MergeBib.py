@@ -0,0 +1,56 @@
+#
+#                       t e s t _ M e r g e B i b . p y
+#
+#  Tests for MergeBib.py. These use pytest, and each test builds a small
+#  volume in a temporary directory. Run them using:
+#
+#     python3 -m pytest tests/test_MergeBib.py
+#
+#  History:
+#     18th Oct 2026. Original version.
+#
+
+import os
+
+import MergeBib
+
+def WritePaper (VolumeDir,Paper,BibText) :
+   Directory = os.path.join(VolumeDir,Paper)
+   os.mkdir(Directory)
+   with open(os.path.join(Directory,Paper + ".tex"),"w") as TexFile :
+      TexFile.write("\\documentclass{article}\n")
+   with open(os.path.join(Directory,Paper + ".bib"),"wb") as BibFile :
+      BibFile.write(BibText)
+
+# ------------------------------------------------------------------------------
+
+#  The same entry, laid out differently in two papers and followed by other
+#  material in the second, should be dropped as a duplicate, not reported as
+#  a collision.
+
+def test_MergeBib_LayoutOnlyDifferencesAreDuplicates (tmp_path) :
+   VolumeDir = str(tmp_path)
+   WritePaper(VolumeDir,"P1",b"@article{smith2020,\n  author = {Smith, J.},\n"
+                      b"  title = {A Paper},\n  year = 2020\n}\n")
+   WritePaper(VolumeDir,"P2",b"@ARTICLE{smith2020,\n    author={Smith, J.},\n"
+                      b"    title={A Paper},\n    year=2020,\n}\n\n"
+                      b"% ---- Other references ----\n\n@misc{other,\n"
+                      b" note={x}}\n")
+   Output = os.path.join(VolumeDir,"Merged.bib")
+   assert MergeBib.MergeBib(VolumeDir,Output,1) == 0
+   with open(Output,"rb") as MergedFile :
+      Merged = MergedFile.read()
+   assert Merged.count(b"smith2020") == 1
+   assert b"_AT_" not in Merged
+   assert b"@misc{other," in Merged
+
+#  Entries with the same name but different contents are still collisions.
+
+def test_MergeBib_DifferentContentsCollide (tmp_path) :
+   VolumeDir = str(tmp_path)
+   WritePaper(VolumeDir,"P1",b"@article{smith2020,\n  title = {A Paper}\n}\n")
+   WritePaper(VolumeDir,"P2",b"@article{smith2020,\n  title = {Another}\n}\n")
+   Output = os.path.join(VolumeDir,"Merged.bib")
+   assert MergeBib.MergeBib(VolumeDir,Output,1) == 1
+   with open(Output,"rb") as MergedFile :
+      assert b"%_AT_article{smith2020," in MergedFile.read()
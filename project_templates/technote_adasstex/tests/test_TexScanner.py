@@ -0,0 +1,58 @@
+#
+#                     t e s t _ T e x S c a n n e r . p y
+#
+#  Tests for the positions that TexScanner.py gives for the commands it
+#  finds. These use pytest. Run them using:
+#
+#     python3 -m pytest tests/test_TexScanner.py
+#
+#  History:
+#     18th Oct 2026. Original version.
+#
+
+import io
+
+import TexScanner
+
+def CollectCallback (Words,Commands,Unused) :
+   Commands.append(Words)
+
+def ScanText (Text) :
+   Scanner = TexScanner.TexScanner()
+   Scanner.SetFile(io.StringIO(Text,newline=''))
+   Commands = []
+   Finished = False
+   while (not Finished) :
+      Finished = Scanner.GetNextTexCommand(CollectCallback,Commands,None)
+   return Commands
+
+# ------------------------------------------------------------------------------
+
+#  A command inside the argument of another command should have the same
+#  position whether the lines end with "\r\n" or just "\n", even though
+#  the carriage returns are removed from the argument.
+
+def test_Positions_AllowForCarriageReturns () :
+   for Ending in ("\r\n","\n") :
+      Text = "\\caption{First line" + Ending + "second line" + Ending + \
+                                     "third \\citep{ref1} end}" + Ending
+      Commands = ScanText(Text)
+      assert [Command[0] for Command in Commands] == ["\\citep","\\caption"]
+      Cite = Commands[0]
+      assert (Cite.Line,Cite.Column) == (3,7)
+      assert Text[Cite.Start:Cite.End] == "\\citep{ref1}"
+      Caption = Commands[1]
+      assert Text[Caption.Start:Caption.End] == Text.rstrip("\r\n")
+
+#  The same should hold for commands nested more deeply, and for a command
+#  following them.
+
+def test_Positions_NestedArguments () :
+   Text = "\\a{\r\n\\b{x\r\ny \\c{z}}\r\n}\r\n\\d{w}\r\n"
+   Commands = ScanText(Text)
+   Found = [(Command[0],Text[Command.Start:Command.End],Command.Line, \
+                                   Command.Column) for Command in Commands]
+   assert Found == [("\\c","\\c{z}",3,3), \
+                    ("\\b","\\b{x\r\ny \\c{z}}",2,1), \
+                    ("\\a","\\a{\r\n\\b{x\r\ny \\c{z}}\r\n}",1,1), \
+                    ("\\d","\\d{w}",5,1)]
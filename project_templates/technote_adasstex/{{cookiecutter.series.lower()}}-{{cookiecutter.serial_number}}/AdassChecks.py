@@ -23,7 +23,7 @@
 #
 #
 #  VerifyRefs (Paper,AllowBibitems = True,TexFileName = "",BibFileName = "",
-#                                       Problems = None, Warnings = None)
+#                         Problems = None, Warnings = None, Diff = None)
 #     Checks that the references used in the main .tex file and those
 #     in the .bib file are consistent. It accepts references defined in the
 #     .tex file using \bibitem for purposes of consistency checking, but
@@ -31,20 +31,37 @@
 #     AllowBibItems. BibFileName can optionally be used to explicitly specify
 #     the name of the .bib file.
 #
-#  VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None)
+#  ReconcileRefs (BibFileRefs,TexFileRefs,BibItemRefs)
+#     Compares the references defined in a .bib file and by \bibitem entries
+#     with those cited in the .tex file, and returns a RefsDiff describing
+#     which are unused, undefined, or only match with different case.
+#
+#  CheckResult (Check,Severity,Message,File = "",Line = 0,Fix = "")
+#     A class describing one thing found by a check, for programs that want
+#     the results in a structured form (eg PaperCheck's --json option).
+#
+#  VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None,
+#                                                          Results = None)
 #     Checks that any graphics files used in the main .tex file are
 #     supplied, and that any graphics files supplied are used by the
 #     main .tex file.
 #
-#  CheckPackages (Paper,TexFileName = "",Problems = None)
+#  CheckPackages (Paper,TexFileName = "",Problems = None,Results = None)
 #     Checks any packages used by the main .tex file, and notes the use of
 #     any standard packages - these can be included, but it's unnecessary -
 #     and warns about any non-standard packages.
 #
-#  GetBibFileRefs (BibFileName,BatchMode = False)
+#  GetBibFileRefs (BibFileName,BatchMode = False,Lines = None)
 #     Returns a list of strings giving the names of the various references
 #     defined in the named .bib file.
 #
+#  IndexBibFile (BibFileName,Warnings = None)
+#     Reads a .bib file once and returns a BibEntry for each entry, giving
+#     its name, type, line number, and its offset and length in the file.
+#
+#  ReadBibEntry (BibFile,Entry)
+#     Reads the text of a single entry found by IndexBibFile().
+#
 #  TrimBibFile (Paper,Keep = True)
 #     Looks in the .bib file used by the main .tex file and comments out
 #     any unused references. It assumes the .bib file has the same name as
@@ -52,7 +69,7 @@
 #     Keep argument is False, the unused references are deleted rather than
 #     just commented out.
 #
-#  GetAuthors (Paper,Notes,TexFileName = "")
+#  GetAuthors (Paper,Notes,TexFileName = "",FirstOnly = False)
 #     Looks in the main .tex file and generates a list of the authors
 #     suitable for generating \aindex entries.
 #
@@ -60,11 +77,19 @@
 #     Replaces any of the common non-printable accented characters in a line
 #     with the LaTeX equivalent sequence and returns the corrected line.
 #
+#  FixTranslationTable (Encoding)
+#     Returns a table that can be used with str.translate() to make the same
+#     replacements as FixCharacters() to a whole file at once.
+#
 #  CheckCharacters (Line,LineNumber,Problems = None,Encoding = "Latin1")
 #     Is a version of FixCharacters that only checks for non-printable
 #     characters rather than actually fixing them.
 #
-#  CheckRunningHeads (Paper,TexFileName = "",Problems = None)
+#  FindUnprintable (TexFileName,Encodings,IgnoreComments = True)
+#     Checks a whole .tex file for non-printable characters, for each of a
+#     number of possible encodings, and returns a CharacterFinding for each.
+#
+#  CheckRunningHeads (Paper,TexFileName = "",Problems = None,Results = None)
 #     Checks for a number of common errors in the way the running heads
 #     for the paper are specified using \markboth.
 #
@@ -78,6 +103,14 @@
 #     optional list, it will add the names of all the files it finds to that
 #     list.
 #
+#  GetArchiveTimes (ArchiveList,Jobs = None)
+#     Returns a dictionary giving GetArchiveTime() for each of a list of
+#     archive files, looking at the archives in parallel.
+#
+#  GetLatestArchive (Path,Paper,Jobs = None)
+#     Returns the archive file for the specified paper, out of those found
+#     by GetArchiveList(), that contains the most recently modified files.
+#
 #  GetBibFileName() returns a string giving the name of the common .bib
 #     file used for all the papers, eg "adassXXVreferences.bib".
 #
@@ -93,13 +126,42 @@
 #  GetVolume() returns the number of the current ADASS volume - the ASP
 #     volume number, as needed by a .bib file entry.
 #
-#  CheckCite (Paper,TexFileName = "",Problems = None)
+#  CheckCite (Paper,TexFileName = "",Problems = None,Results = None)
 #     Checks to see if the specified paper is using any \cite commands
 #     instead of the preferred comamnds \citep, \citet etc.
 #
-#  GetFileEncoding (TexFileName,Result,Report)
+#  GetFileEncoding (TexFileName,Result,Report,Detailed = False)
 #     Returns a list of possible character encodings used by the .tex file.
 #
+#  GetTexCommands (TexFileName,Report = None,Lines = None)
+#     Returns a list of all the LaTeX commands in a .tex file, each given as
+#     the directive followed by its arguments, as a TexScanner.TexCommand
+#     that also gives its position in the file. The file is only parsed once,
+#     and the results are also kept in an on-disk cache next to the file.
+#
+#  IterTexCommands (TexFileName,Directives = None)
+#     A generator that produces the LaTeX commands in a .tex file one at a
+#     time, scanning the file only as far as the caller needs.
+#
+#  ScanTexFile (TexFileName,Dispatcher,Report = None)
+#     Passes each of the LaTeX commands in a .tex file to the callbacks that
+#     have been registered with a TexScanner.TexDispatcher.
+#
+#  HaveTexCommands (TexFileName)
+#     Returns True if the commands in a .tex file are already known, either
+#     in memory or in the on-disk cache, without the file needing to be parsed.
+#
+#  CachedTexProduct (TexFileName,Name,Builder)
+#     Returns something derived from the contents of a .tex file, using
+#     the on-disk cache if the file has been seen before.
+#
+#  NewFileMode ()
+#     Returns the permissions a new file would normally be given.
+#
+#  PaperDirectories (VolumeDir)
+#     Returns a list of the directories under the top level directory for
+#     a volume that hold the files for the individual papers.
+#
 #  Author(s): Keith Shortridge (keith@knaveandvarlet.com.au)
 #
 #  History:
@@ -257,6 +319,92 @@
 #                    can return the names or removed directories and archives
 #                    if passed lists for this purpose. KS.
 #     17th Jun 2019  Prepare file for ADASS 2019 JdP.
+#     18th Oct 2026. Added GetTexCommands() and ScanTexFile(). The .tex file
+#                    is now parsed just once, however many of the routines
+#                    here look at it, and each routine has its callback
+#                    passed the directives it is interested in by a
+#                    TexScanner.TexDispatcher.
+#                    Added CachedTexProduct(). The command list produced by
+#                    GetTexCommands(), which now includes line numbers, and
+#                    the entries found by SubjectIndexEntries() are kept in
+#                    a cache file next to the .tex file, keyed by a hash of
+#                    its contents, so re-running the checks on an unchanged
+#                    file does not need to parse it again. ReadTexCache()
+#                    ignores anything in the cache file that is not in the
+#                    expected form, and the cache file is written with the
+#                    normal permissions for a new file (see NewFileMode()).
+#                    Added PaperDirectories(), for use by batch programs.
+#                    GetArchiveTime() and ExtractArchive() now use the
+#                    tarfile and zipfile modules instead of running tar and
+#                    unzip. GetArchiveTime() reads the dates and names of the
+#                    files from the archive headers, through the new routine
+#                    ArchiveMembers(), and no longer extracts the archive.
+#                    GetArchiveList() now uses os.scandir() and a pattern
+#                    compiled once for each paper, and no longer fails under
+#                    Python 3 (it still had a call to os.path.walk()). The
+#                    results of GetArchiveTime() are remembered for each
+#                    archive, and the new GetArchiveTimes() looks at a list of
+#                    archives in parallel, using a pool of threads. Added
+#                    GetLatestArchive().
+#                    GetFileEncoding() now reads the file as bytes, and uses
+#                    the new QuickFileEncoding() to recognise ASCII, UTF-8
+#                    and unambiguous Latin1 or Mac Roman files without going
+#                    through them a character at a time. The character by
+#                    character scan, now in DetailedFileEncoding(), is only
+#                    used when the full report is needed.
+#                    Added FindUnprintable(), which reads a .tex file once
+#                    and checks it for unprintable characters in all the
+#                    possible encodings at the same time, returning the
+#                    results as CharacterFinding objects instead of printing
+#                    them. CheckCharacters() now uses the same code, in
+#                    LineCharacterFindings(). In UTF-8 mode it no longer skips
+#                    the character following an invalid UTF-8 byte.
+#                    Added FixTranslationTable(), for use by FixUnprintable.
+#                    Added ReconcileRefs(), which VerifyRefs() now uses to
+#                    match up the references using sets instead of searching
+#                    one list for each entry in another, and which returns
+#                    the results as a RefsDiff. An exact match is now always
+#                    preferred to one that only differs in case. VerifyRefs()
+#                    has a new optional Diff argument. TrimBibFile() also
+#                    looks up the references in a set.
+#                    Added IndexBibFile(), which replaces the parsing in
+#                    GetBibFileRefs() and records the position of each entry,
+#                    and ReadBibEntry(). TrimBibFile() now uses these to copy
+#                    or comment out whole entries, and works on the file as
+#                    bytes. It no longer comments out @string entries, and
+#                    can now handle entries whose name is on the line after
+#                    the '@'.
+#                    FindBibFile() has a new optional Directory argument, for
+#                    use by MergeBib.
+#                    Added the CheckResult class, and RefsDiff.Results() and
+#                    CharacterFinding.Result() which return what they found
+#                    as CheckResult objects.
+#                    VerifyEps(), CheckPackages(), CheckRunningHeads() and
+#                    CheckCite() have a new optional Results argument, and add
+#                    a CheckResult for each problem they find, giving its line
+#                    in the .tex file and a suggested fix. The results from
+#                    RefsDiff.Results() now give the line of each reference,
+#                    using the new TexLines and BibLines, which VerifyRefs()
+#                    fills in using new optional Lines arguments to
+#                    GetTexFileRefs() and GetBibFileRefs(). GetTexCommands()
+#                    now returns TexScanner.TexCommand objects, which give the
+#                    line of each command as well as its words.
+#                    RunningHeadsCallback() failed if \markboth had the wrong
+#                    number of arguments, and did not report multiple
+#                    \markboth directives. Fixed.
+#                    The TexCommand objects returned by GetTexCommands() now
+#                    give the position of each command in the file as well as
+#                    its line. The positions are saved in the .tex file cache,
+#                    whose version number has been bumped.
+#                    Added IterTexCommands(). GetTitle() and GetAuthors() have
+#                    a new optional FirstOnly argument that uses it to stop at
+#                    the first title or author list, and LocateTexFile() uses
+#                    this when it looks for files with an author and a title.
+#                    ScanTexFile() now uses a TexScanner that only looks at
+#                    the directives the callbacks want, if the commands in the
+#                    file are not already known. Added HaveTexCommands().
+#                    SubjectIndexEntries() returned no entries at all if
+#                    IgnoreThese was not specified. Fixed.
 
 from __future__ import (print_function,division,absolute_import)
 
@@ -266,6 +414,14 @@ import os
 import tempfile
 import shutil
 import subprocess
+import hashlib
+import json
+import time
+import struct
+import tarfile
+import zipfile
+import re
+import concurrent.futures
 
 import TexScanner
 
@@ -332,6 +488,325 @@ def GetBibFileName() :
 
 # ------------------------------------------------------------------------------
 
+#                        G e t  T e x  C o m m a n d s
+#
+#   Returns a list of all the LaTeX commands in the named .tex file, in the
+#   order in which TexScanner.GetNextTexCommand() finds them. Each command is
+#   a TexScanner.TexCommand - the list of strings that the scanner passes to a
+#   callback routine, the directive followed by its arguments, which also
+#   records where the command was found in the file. The list is remembered,
+#   so a number of checks run on the same file only need the file to be
+#   parsed once. The file is only looked at again if its size or modification
+#   date changes, and even then it is only parsed again if its contents have
+#   changed and are not in the on-disk cache maintained by CachedTexProduct().
+#   If the optional Report argument is passed as a list, any problems reported
+#   by the scanner are added to it, so if Report is still empty afterwards,
+#   the file parsed without problems. If the optional Lines argument is passed
+#   as a list, the number of the line on which each command was found is
+#   added to it.
+
+__TexCommandLists__ = {}
+
+def GetTexCommands (TexFileName,Report = None,Lines = None) :
+
+   TexFileName = os.path.abspath(TexFileName)
+   Stat = os.stat(TexFileName)
+   Signature = (Stat.st_size,Stat.st_mtime)
+   Entry = __TexCommandLists__.get(TexFileName)
+   if (Entry == None or Entry[0] != Signature) :
+      Parsed = CachedTexProduct(TexFileName,"Commands",ParseTexFile)
+      Commands = []
+      Positions = Parsed[3]
+      for Index,Words in enumerate(Parsed[0]) :
+         Commands.append(TexScanner.TexCommand(Words,\
+                                  *Positions[Index * 4:Index * 4 + 4]))
+      Entry = (Signature,(Commands,Parsed[1],Parsed[2]))
+      __TexCommandLists__[TexFileName] = Entry
+   Commands,CommandLines,ParseReport = Entry[1]
+   if (Report != None) : Report.extend(ParseReport)
+   if (Lines != None) : Lines.extend(CommandLines)
+   return Commands
+
+# ------------------------------------------------------------------------------
+
+#                          P a r s e  T e x  F i l e
+#
+#   Does the actual parsing for GetTexCommands(). It runs a TexScanner over
+#   the whole of the named .tex file, and returns a list of four items: the
+#   list of commands found (each as a plain list of strings), a list giving
+#   the line number for each command, the list of problems reported by the
+#   scanner, and a single list of integers giving the start and end offsets,
+#   line and column of each command in turn. (This is what is saved in the
+#   .tex file cache, so it is kept to simple lists that can be saved as JSON.)
+
+def ParseTexFile (TexFileName) :
+
+   Commands = []
+   CommandLines = []
+   Positions = []
+   TexFile = open(TexFileName,mode='r')
+   TheScanner = TexScanner.TexScanner()
+   TheScanner.SetFile(TexFile)
+   Finished = False
+   while (not Finished) :
+      Finished = TheScanner.GetNextTexCommand(CommandListCallback,\
+                           (Commands,CommandLines,Positions),TheScanner)
+   TexFile.close()
+   return [Commands,CommandLines,list(TheScanner.GetReport()),Positions]
+
+# ------------------------------------------------------------------------------
+
+#                   C o m m a n d  L i s t  C a l l b a c k
+#
+#   Used as the callback routine for the TexScanner when ParseTexFile()
+#   uses it to collect all the commands in a .tex file. Each set of Words
+#   is added to the first of the three lists passed as Lists, the line on
+#   which it was found, taken from Scanner, is added to the second, and its
+#   position in the file is added to the third.
+
+def CommandListCallback (Words,Lists,Scanner) :
+
+   Lists[0].append(list(Words))
+   Lists[1].append(Scanner.CommandLine)
+   Lists[2].extend((Words.Start,Words.End,Words.Line,Words.Column))
+
+# ------------------------------------------------------------------------------
+
+#                     C a c h e d  T e x  P r o d u c t
+#
+#   Editors run the checks on each paper many times, usually on files that
+#   have not changed since the last run. This routine lets anything that is
+#   derived purely from the contents of a .tex file be worked out once and
+#   then kept in a small cache file (see __TexCacheName__) in the same
+#   directory as the .tex file. Entries in the cache are keyed by a hash of
+#   the contents of the file, so a renamed or touched file still uses the
+#   cache, while any change to the file means its entry is not used. Name
+#   identifies the item wanted, and Builder is a routine that will be called
+#   with the name of the .tex file to produce it if it is not in the cache.
+#   Whatever Builder returns has to be something that can be saved as JSON -
+#   lists, strings, numbers and so on. (JSON is used rather than pickle
+#   because the cache file is in a directory supplied by the authors, and
+#   loading a pickle can run arbitrary code.)
+#
+#   The cache is limited to __TexCacheMaxEntries__ files and about
+#   __TexCacheMaxBytes__ bytes, and the entries least recently written are
+#   dropped to keep it within these limits. If the cache file can't be read
+#   or written, things just work as if there was no cache.
+
+__TexCacheName__ = ".AdassTexCache.json"
+
+__TexCacheVersion__ = 2
+
+__TexCacheMaxEntries__ = 32
+
+__TexCacheMaxBytes__ = 4000000
+
+__TexCacheProducts__ = {}
+
+def CachedTexProduct (TexFileName,Name,Builder) :
+
+   TexFileName = os.path.abspath(TexFileName)
+   Directory = os.path.dirname(TexFileName)
+   Hash = TexFileHash(TexFileName)
+   Products = __TexCacheProducts__.get(Hash)
+   if (Products == None) :
+      Products = ReadTexCache(Directory).get(Hash,{}).get("Products",{})
+      __TexCacheProducts__[Hash] = Products
+   if (not Name in Products) :
+      Products[Name] = Builder(TexFileName)
+      WriteTexCache(Directory,Hash,Products)
+   return Products[Name]
+
+# ------------------------------------------------------------------------------
+
+#                          T e x  F i l e  H a s h
+#
+#   Returns a hash (as a hex string) of the contents of the named file, used
+#   as the key for the entries in the .tex file cache.
+
+def TexFileHash (TexFileName) :
+
+   TexFile = open(TexFileName,mode='rb')
+   Hash = hashlib.sha1(TexFile.read()).hexdigest()
+   TexFile.close()
+   return Hash
+
+# ------------------------------------------------------------------------------
+
+#                          R e a d  T e x  C a c h e
+#
+#   Returns the entries in the .tex file cache in the specified directory,
+#   as a dictionary keyed by file hash. Each entry is itself a dictionary,
+#   with "Products" giving the cached items by name and "Written" giving the
+#   time the entry was last written. If there is no usable cache, this
+#   returns an empty dictionary. The file is in a directory supplied by the
+#   authors, so anything in it that does not look as expected is ignored -
+#   any entry that is not in the form described is dropped.
+
+def ReadTexCache (Directory) :
+
+   Entries = {}
+   try :
+      CacheFile = open(os.path.join(Directory,__TexCacheName__),mode='r')
+      Cache = json.load(CacheFile)
+      CacheFile.close()
+      if (isinstance(Cache,dict) and \
+                          Cache.get("Version") == __TexCacheVersion__) :
+         Entries = Cache.get("Entries",{})
+   except (IOError,OSError,ValueError,AttributeError) :
+      Entries = {}
+   if (not isinstance(Entries,dict)) : return {}
+   for Hash in list(Entries) :
+      Entry = Entries[Hash]
+      if (not isinstance(Entry,dict) or \
+            not isinstance(Entry.get("Products"),dict) or \
+               not isinstance(Entry.get("Written"),(int,float))) :
+         del Entries[Hash]
+   return Entries
+
+# ------------------------------------------------------------------------------
+
+#                          W r i t e  T e x  C a c h e
+#
+#   Updates the .tex file cache in the specified directory with the set of
+#   products (a dictionary of cached items, keyed by name) for the file with
+#   the specified hash. Old entries are dropped if the cache gets too large.
+#   The new cache is written to a temporary file which then replaces the old
+#   one, so a reader never sees a partly written cache. The temporary file is
+#   given the permissions a new file would normally get (see NewFileMode()),
+#   so the cache can be shared by all the editors working on a paper.
+
+def WriteTexCache (Directory,Hash,Products) :
+
+   Entries = ReadTexCache(Directory)
+   Entries[Hash] = {"Written" : time.time(), "Products" : Products}
+   Cache = {"Version" : __TexCacheVersion__, "Entries" : Entries}
+   Text = json.dumps(Cache,separators=(',',':'))
+   while (len(Entries) > __TexCacheMaxEntries__ or \
+                                       len(Text) > __TexCacheMaxBytes__) :
+      if (len(Entries) <= 1) : return
+      Oldest = min(Entries,key=lambda Key : Entries[Key]["Written"])
+      del Entries[Oldest]
+      Text = json.dumps(Cache,separators=(',',':'))
+   try :
+      FileDesc,TempName = tempfile.mkstemp(dir=Directory,\
+                                                   prefix=__TexCacheName__)
+      TempFile = os.fdopen(FileDesc,'w')
+      TempFile.write(Text)
+      TempFile.close()
+      os.chmod(TempName,NewFileMode())
+      os.replace(TempName,os.path.join(Directory,__TexCacheName__))
+   except (IOError,OSError) :
+      pass
+
+# ------------------------------------------------------------------------------
+
+#                          N e w  F i l e  M o d e
+#
+#   Returns the permissions a newly created file would normally get, given
+#   the current umask. Files created by tempfile.mkstemp() can only be read
+#   by their owner, so anything written through a temporary file that should
+#   be shared with others is set to this before it replaces the real file.
+
+def NewFileMode () :
+
+   Mask = os.umask(0)
+   os.umask(Mask)
+   return (0o666 & ~Mask)
+
+# ------------------------------------------------------------------------------
+
+#                      I t e r  T e x  C o m m a n d s
+#
+#   A generator that produces the LaTeX commands in the named .tex file one
+#   at a time, as TexScanner.TexCommand objects, in the same order as the list
+#   returned by GetTexCommands(). If Directives is passed as a list, only the
+#   commands using those directives are produced. If the commands for the file
+#   are already held in memory by GetTexCommands(), they are used. Otherwise
+#   the file is scanned as the commands are needed, so a caller that only
+#   wants, say, the first \title in the file can stop as soon as it finds it
+#   without the rest of the file being scanned, and if Directives is given
+#   the scanner only looks properly at the parts of the file around those
+#   directives. (Since that scan may not cover the whole file, its results are
+#   not cached.)
+
+def IterTexCommands (TexFileName,Directives = None) :
+
+   TexFileName = os.path.abspath(TexFileName)
+   Stat = os.stat(TexFileName)
+   Entry = __TexCommandLists__.get(TexFileName)
+   if (Entry != None and Entry[0] == (Stat.st_size,Stat.st_mtime)) :
+      for Command in Entry[1][0] :
+         if (Directives == None or Command[0] in Directives) : yield Command
+   else :
+      TexFile = open(TexFileName,mode='r')
+      TheScanner = TexScanner.TexScanner()
+      TheScanner.SetFile(TexFile)
+      TexFile.close()
+      if (Directives != None) : TheScanner.SetDirectives(Directives)
+      for Command in TheScanner.IterTexCommands() :
+         if (Directives == None or Command[0] in Directives) : yield Command
+
+# ------------------------------------------------------------------------------
+
+#                          S c a n  T e x  F i l e
+#
+#   Passes each LaTeX command in the named .tex file to the callbacks
+#   registered with the TexScanner.TexDispatcher passed as Dispatcher. Each
+#   callback only sees the directives it was registered for (or all of them
+#   if it was registered without a list of directives). If the commands for
+#   the file have already been found - they are held in memory by
+#   GetTexCommands() or are in the .tex file cache - they are used, so the
+#   file is only parsed once however many checks are run on it. Otherwise, if
+#   all the callbacks were registered for particular directives, the file is
+#   scanned by a TexScanner that has been told which directives are wanted
+#   (see TexScanner.SetDirectives()), which only looks properly at the parts
+#   of the file around those directives. This is much quicker for a large
+#   paper, and finds exactly the same commands, but its results are not
+#   cached, as they do not cover the whole file. If the optional Report
+#   argument is passed as a list, the whole file is parsed and any problems
+#   reported by the scanner are added to it.
+
+def ScanTexFile (TexFileName,Dispatcher,Report = None) :
+
+   Directives = Dispatcher.GetDirectives()
+   if (Directives == None or Report != None or HaveTexCommands(TexFileName)) :
+      for Command in GetTexCommands(TexFileName,Report) :
+         Dispatcher.Dispatch(Command,None,None)
+   else :
+      TexFile = open(TexFileName,mode='r')
+      TheScanner = TexScanner.TexScanner()
+      TheScanner.SetFile(TexFile)
+      TexFile.close()
+      TheScanner.SetDirectives(Directives)
+      Dispatcher.Scan(TheScanner)
+
+# ------------------------------------------------------------------------------
+
+#                       H a v e  T e x  C o m m a n d s
+#
+#   Returns True if the list of all the commands in the named .tex file that
+#   GetTexCommands() returns can be had without parsing the file - either
+#   because it is still held in memory or because it is in the .tex file
+#   cache.
+
+def HaveTexCommands (TexFileName) :
+
+   TexFileName = os.path.abspath(TexFileName)
+   Stat = os.stat(TexFileName)
+   Entry = __TexCommandLists__.get(TexFileName)
+   if (Entry != None and Entry[0] == (Stat.st_size,Stat.st_mtime)) :
+      return True
+   Hash = TexFileHash(TexFileName)
+   Products = __TexCacheProducts__.get(Hash)
+   if (Products == None) :
+      Products = ReadTexCache(os.path.dirname(TexFileName)).get(Hash,{}).\
+                                                       get("Products",{})
+      __TexCacheProducts__[Hash] = Products
+   return ("Commands" in Products)
+
+# ------------------------------------------------------------------------------
+
 #                         E x t r a c t  R e f s
 #
 #  ExtractRefs() is a utility routine for VerifyRefs() which looks at a list
@@ -356,124 +831,188 @@ def ExtractRefs (Words) :
 #                        G e t  B i b  F i l e  R e f s
 #
 #   Looks in the current directory for the  specified .bib file, and
-#   returns a list of all the references it defines.
-
-def GetBibFileRefs (BibFileName,BatchMode = False):
-
-   #  Later versions of Python have better support for enums, but this
-   #  works on old versions too.
-   
-   def enum(**enums):
-      return type('Enum', (), enums)
-   
-   #  These parse states are fairly simplisitic, and really assume that
-   #  the bib file is valid and laid out in a relativly straightforward way.
-   #  Most files will just have a line at the start of each reference
-   #  @type{name,
-   #  and in this case we go through all the states in the one line.
-   #  If the file starts with
-   #  @type{
-   #     name,
-   #  then the first line will take us from needing an @ to needing a 
-   #  comma, and the second line will provide the reference and move us
-   #  back to needing an @. 
-   #  If the file starts with
-   #  @type
-   #     {name,
-   #  or even
-   #  @type
-   #  {
-   #      name,
-   #  Then successive lines take us to needing a brace, then needing a 
-   #  comma, then getting the reference and back to needing an @.
-   #  Anything else it won't handle properly. And it won't pick up cases
-   #  where there's someting before the '@' on a line, and will get confused
-   #  if the reference is incomlete, without a closing brace, say.
-   
-   States = enum(NEED_AT = 0, NEED_BRACE = 1, NEED_COMMA = 2)
-   
-   #  The set of expected entry types
-   
-   ExpectedTypes = ["article","book","booklet","conference","inbook",
+#   returns a list of all the references it defines. The work is done by
+#   IndexBibFile(), and this just lists the names of the entries it found.
+#   Any entries with unexpected types are reported unless BatchMode is set.
+#   If a dictionary is passed as Lines, the line on which each entry starts
+#   is added to it, keyed by the name of the reference.
+
+def GetBibFileRefs (BibFileName,BatchMode = False,Lines = None):
+
+   BibFileRefs = []
+   if (os.path.exists(BibFileName)) :
+      Warnings = []
+      for Entry in IndexBibFile(BibFileName,Warnings) :
+         if (Entry.Key != None) :
+            BibFileRefs.append(Entry.Key)
+            if (Lines != None) : Lines.setdefault(Entry.Key.strip(),Entry.Line)
+      if (not BatchMode) :
+         for Warning in Warnings :
+            print("*",Warning,"*")
+   else:
+      if (not BatchMode) : print("**No bib file called",BibFileName,"found**")
+      
+   return BibFileRefs
+
+# ------------------------------------------------------------------------------
+
+#                          B i b  E n t r y
+#
+#   A BibEntry describes one entry in a .bib file, as found by IndexBibFile().
+#   Key is the name of the reference (None if this couldn't be found, as is
+#   the case for @string entries, for example), Type is the entry type as
+#   given in the file (eg "article" or "ARTICLE"), Line is the number of the
+#   line containing the '@' that starts the entry (counting from 1), and
+#   Offset and Length give the position of the entry in the file, in bytes.
+#   The entry runs from the start of the line with the '@' to the end of the
+#   line with the closing brace, and ReadBibEntry() will read it.
+
+class BibEntry(object):
+
+   __slots__ = ("Key","Type","Offset","Length","Line")
+   
+   def __init__(self,Key,Type,Offset,Length,Line) :
+      self.Key = Key
+      self.Type = Type
+      self.Offset = Offset
+      self.Length = Length
+      self.Line = Line
+
+# ------------------------------------------------------------------------------
+
+#                        I n d e x  B i b  F i l e
+#
+#   Reads through a .bib file just once, and returns a list of BibEntry
+#   objects, one for each entry in the file, in the order they appear. Any
+#   entries with unexpected types are described in strings added to the
+#   Warnings list, if one is passed.
+#
+#   This assumes that the .bib file is laid out in a relatively straightforward
+#   way. An entry starts with a line whose first non-blank character is '@'.
+#   Most files will just have a line at the start of each reference
+#   @type{name,
+#   but it also handles cases where the name, or the brace, are on the
+#   following lines, eg:
+#   @type{
+#      name,
+#   or
+#   @type
+#   {
+#      name,
+#   An entry ends on the line where its '{' and '}' characters balance -
+#   ignoring lines that start with '%', as TrimBibFile() always has - or, if
+#   that doesn't happen, just before the next line that starts with '@'.
+#   Entries with unexpected types (including @string, @preamble and @comment)
+#   are still listed, but their names are not looked for unless they are on the
+#   same line as the '@'. It won't pick up cases where there's something before
+#   the '@' on a line.
+#
+#   The file is read as bytes, so that the offsets are exact. Entry names are
+#   decoded as UTF-8, with any invalid bytes replaced.
+
+__BibEntryTypes__ = ["article","book","booklet","conference","inbook",
                   "incollection","inproceedings","manual","mastersthesis",
                   "misc","phdthesis","proceedings","techreport","unpublished"]
+
+def IndexBibFile (BibFileName,Warnings = None) :
+
+   Entries = []
+   Entry = None
+   Depth = 0
+   Opened = False
+   Pending = None
+   Offset = 0
+   LineNumber = 0
    
-   BibFileRefs = []
-   State = States.NEED_AT
-   Found = False
-   if (os.path.exists(BibFileName)) :
-      BibFile = open(BibFileName,mode='r')
+   BibFile = open(BibFileName,mode='rb')
+   for LineBytes in BibFile :
+      LineNumber = LineNumber + 1
+      BibFileLine = LineBytes.decode("utf-8","replace")
+      Stripped = BibFileLine.strip()
       
-      for BibFileLine in BibFile :
+      if (Stripped.startswith('@')) :
       
-         #  There are some odd .bib fies around that this code doesn't parse
-         #  properly, and we can end up still looking for something in a
-         #  reference definition when we hit a line that starts with '@'.
-         #  It's more likely that we've mis-parsed the file than that
-         #  there is such a line in the middle of a legitimate reference,
-         #  so we restart at this point.
+         #  A new entry. If the last one never balanced its braces, it is
+         #  taken to end here. (If it did, it ended where they balanced, and
+         #  anything between it and this entry is not part of it.)
          
-         if (BibFileLine.strip().startswith('@')) : State = States.NEED_AT
-      
-         #  In most cases, we'll be looking for the '@' that starts a
-         #  reference definition, and will find all we need on the one line.
-         #  If not, we end up in one of the intermediate states.
+         if (Entry != None and Entry.Length == 0) :
+            Entry.Length = Offset - Entry.Offset
+         Entry = BibEntry(None,"",Offset,0,LineNumber)
+         Entries.append(Entry)
+         Depth = 0
+         Opened = False
+         Pending = None
          
-         if (State == States.NEED_AT) :
-            BibFileLine = BibFileLine.strip().rstrip("\r\n")
-            if (BibFileLine.startswith("@")) :
-               State = States.NEED_BRACE
-               Brace = BibFileLine.find("{")
-               if (Brace > 0) :
-                  EntryType = BibFileLine[1:Brace]
-                  State = States.NEED_COMMA
-                  Comma = BibFileLine.find(",")
-                  if (Comma > 0) :
-                     Ref = BibFileLine[Brace + 1:Comma].strip()
-                     State = States.NEED_AT
-                     BibFileRefs.append(Ref)
-               else :
-                  EntryType = BibFileLine[1:]
+         #  Usually the type, brace, name and comma are all on this line.
+         #  Otherwise Pending records whether we still need the brace or the
+         #  name, which will be on the following lines.
+         
+         Brace = Stripped.find('{')
+         if (Brace > 0) :
+            Entry.Type = Stripped[1:Brace]
+            Comma = Stripped.find(',')
+            if (Comma > 0) :
+               Entry.Key = Stripped[Brace + 1:Comma].strip()
+            else :
+               Pending = "Key"
+         else :
+            Entry.Type = Stripped[1:]
+            Pending = "Brace"
+         
+         #  Check the entry type and warn about any non-standard types.
+         
+         if (not (Entry.Type.lower().strip() in __BibEntryTypes__)) :
+            if (Warnings != None) :
+               Warnings.append("Unexpected .bib file entry '" + Entry.Type + \
+                                                  "' - will default to 'MISC'")
+            Pending = None
       
-               #  Check the entry type and warn about any non-standard types.
-               
-               if (not (EntryType.lower().strip() in ExpectedTypes)) :
-                  Problem = "Unexpected .bib file entry '" + EntryType + \
-                                                 "' - will default to 'MISC'"
-                  if (not BatchMode) : print("*",Problem,"*")
-                  State = States.NEED_AT
+      else :
       
-         else :
+         #  If we need a brace, look for it and if we have one, we then
+         #  want the reference and its terminating comma - we assume these
+         #  will be on the same line. 
          
-            #  If we need a brace, look for it and if we have one, we then
-            #  want the reference and its terminating comma - we assume these
-            #  will be on the same line. Then we will probably find the comma
-            #  in the next block. If not, on the next line.
-
-            if (State == States.NEED_BRACE) :
-               Brace = BibFileLine.find('{')
-               if (Brace >= 0) :
-                  BibFileLine = BibFileLine[Brace + 1:]
-                  State = States.NEED_COMMA
-
-            #  If we're looking for the reference name itself followed by
-            #  a comma, see if we have that. This does assume the comma is
-            #  on the same line as the name (how many odd formats are we
-            #  trying to handle?)
-
-            if (State == States.NEED_COMMA) :
-               BibFileLine = BibFileLine.lstrip()
-               Comma = BibFileLine.find(",")
-               if (Comma > 0) :
-                  Ref = BibFileLine[:Comma].strip()
-                  State = States.NEED_AT
-                  BibFileRefs.append(Ref)
+         if (Pending == "Brace") :
+            Brace = BibFileLine.find('{')
+            if (Brace >= 0) :
+               BibFileLine = BibFileLine[Brace + 1:]
+               Pending = "Key"
+         if (Pending == "Key") :
+            BibFileLine = BibFileLine.lstrip()
+            Comma = BibFileLine.find(',')
+            if (Comma > 0) :
+               Entry.Key = BibFileLine[:Comma].strip()
+               Pending = None
+               
+      #  Keep track of the braces, to see where the entry ends.
+      
+      if (Entry != None and Entry.Length == 0 and not Stripped.startswith('%')):
+         Depth = Depth + LineBytes.count(b'{') - LineBytes.count(b'}')
+         if (Depth > 0) : Opened = True
+         if (Opened and Depth <= 0) :
+            Entry.Length = Offset + len(LineBytes) - Entry.Offset
          
-      BibFile.close()
-   else:
-      if (not BatchMode) : print("**No bib file called",BibFileName,"found**")
+      Offset = Offset + len(LineBytes)
+   BibFile.close()
+   
+   if (Entry != None and Entry.Length == 0) : Entry.Length = Offset - Entry.Offset
       
-   return BibFileRefs
+   return Entries
+
+# ------------------------------------------------------------------------------
+
+#                         R e a d  B i b  E n t r y
+#
+#   Given a .bib file opened in binary mode, and a BibEntry for it produced by
+#   IndexBibFile(), returns the text of the entry, as bytes, going straight to
+#   it in the file.
+
+def ReadBibEntry (BibFile,Entry) :
+
+   BibFile.seek(Entry.Offset)
+   return BibFile.read(Entry.Length)
 
 # ------------------------------------------------------------------------------
 
@@ -482,27 +1021,25 @@ def GetBibFileRefs (BibFileName,BatchMode = False):
 #   Looks in the current directory for the specified .tex file, and
 #   adds the identifiers of all the references it cites to the list
 #   passed as TexFileRefs, and adds any bibitems it finds to the list
-#   passed as BibItemRefs. The final optional Problems argument allows this to
+#   passed as BibItemRefs. The optional Problems argument allows this to
 #   be used in batch mode, where direct output from this routine is suppressed
 #   and instead a set of report lines are added to the list of problems passed.
+#   If a dictionary is passed as Lines, the line on which each reference is
+#   first cited or defined is added to it, keyed by the name of the reference.
 
-def GetTexFileRefs (TexFileName,TexFileRefs,BibItemRefs,Problems = None):
-
-   TexFile = open(TexFileName,mode='r')
-   TheScanner = TexScanner.TexScanner()
-   TheScanner.SetFile(TexFile)
+def GetTexFileRefs (TexFileName,TexFileRefs,BibItemRefs,Problems = None, \
+                                                               Lines = None):
 
-   #  GetNextTexCommand() will call RefsScanCallback for each command it
-   #  finds in the file, and RefsScanCallback will check the command
-   #  and add any cited references to TexFileRefs and any items defined
-   #  using \bibitem to BibItemRefs.
+   #  The dispatcher will call RefsScanCallback for each command in the
+   #  file, and RefsScanCallback will check the command and add any cited
+   #  references to TexFileRefs and any items defined using \bibitem to
+   #  BibItemRefs. (RefsScanCallback looks for all the variations on \cite,
+   #  so it has to see every command.)
 
-   Finished = False
-   Refs = (TexFileRefs,BibItemRefs)
-   while (not Finished) :
-      Finished = TheScanner.GetNextTexCommand(RefsScanCallback,Refs,Problems)
-
-   TexFile.close()
+   Refs = (TexFileRefs,BibItemRefs,Lines)
+   Dispatcher = TexScanner.TexDispatcher()
+   Dispatcher.Register(RefsScanCallback,Refs,Problems)
+   ScanTexFile(TexFileName,Dispatcher)
 
 # ------------------------------------------------------------------------------
 
@@ -523,16 +1060,20 @@ def GetTexFileRefs (TexFileName,TexFileRefs,BibItemRefs,Problems = None):
 #   routine could check for that, but at the moment it doesn't.
 #
 #   The optional Details parameter can be a list of strings to which this
-#   routine will append a description of the file it is using.
+#   routine will append a description of the file it is using. If Directory
+#   is specified, the .bib file is looked for in that directory instead of
+#   the current one, and the name returned includes the directory.
 
-def FindBibFile (Paper,Details = None) :
+def FindBibFile (Paper,Details = None,Directory = "") :
 
    BatchMode = False
    if (Details != None) : BatchMode = True
    
    Found = False
    BibFileName = GetBibFileName()
-   if (BibFileName != "") : Found = os.path.exists(BibFileName)
+   if (BibFileName != "") :
+      BibFileName = os.path.join(Directory,BibFileName)
+      Found = os.path.exists(BibFileName)
    if (Found) :
       Report = "Using standard .bib file " + BibFileName
       if (BatchMode) :
@@ -540,7 +1081,7 @@ def FindBibFile (Paper,Details = None) :
       else :
          print(Report)
    else :
-      BibFileName = Paper + ".bib"
+      BibFileName = os.path.join(Directory,Paper + ".bib")
       Found = os.path.exists(BibFileName)
       if (Found) :
          Report = "Using .bib file " + BibFileName + " (based on paper name)"
@@ -550,10 +1091,10 @@ def FindBibFile (Paper,Details = None) :
             print(Report)
       else :
          BibFileCount = 0
-         FileList = os.listdir(".")
+         FileList = os.listdir(Directory or ".")
          for File in FileList :
             if (File.endswith(".bib")) :
-               if (BibFileCount == 0) : BibFileName = File
+               if (BibFileCount == 0) : BibFileName = os.path.join(Directory,File)
                BibFileCount = BibFileCount + 1
                Found = True
          if (Found) :
@@ -571,6 +1112,192 @@ def FindBibFile (Paper,Details = None) :
 
 # ------------------------------------------------------------------------------
 
+#                          C h e c k  R e s u l t
+#
+#   A CheckResult is one thing found by a check, in a form a program can use
+#   rather than having to read the text output. Check identifies the check
+#   that found it (for example "References"), and Severity is "error" for a
+#   problem that needs to be fixed, "warning" for something that should be
+#   looked at, or "note" for anything else. File and Line give where it was
+#   found, if that is known (Line is zero if not), Message describes it, and
+#   Fix is a suggested fix, or a blank string if there isn't one. ToDict()
+#   returns it as a dictionary that can be written out using the json module,
+#   and CheckResult(**Dict) turns such a dictionary back into a CheckResult.
+
+class CheckResult(object):
+
+   __slots__ = ("Check","Severity","File","Line","Message","Fix")
+
+   def __init__(self,Check,Severity,Message,File = "",Line = 0,Fix = "") :
+      self.Check = Check
+      self.Severity = Severity
+      self.Message = Message
+      self.File = File
+      self.Line = Line
+      self.Fix = Fix
+
+   def ToDict(self) :
+      return {"Check" : self.Check, "Severity" : self.Severity,
+              "File" : self.File, "Line" : self.Line,
+              "Message" : self.Message, "Fix" : self.Fix}
+
+# ------------------------------------------------------------------------------
+
+#                           R e f s  D i f f
+#
+#   A RefsDiff holds the result of comparing the references defined in a
+#   .bib file, and by any \bibitem directives, with those cited in the .tex
+#   file. It is produced by ReconcileRefs(), and each of its lists keeps the
+#   order (and any repeats) of the list it came from, with the names stripped
+#   of surrounding blanks:
+#
+#   BibRefs   has an entry (Ref,Match) for each .bib file reference, where
+#             Match is "exact" if the .tex file cites it, "case" if it is only
+#             cited with different case, and None if it isn't cited at all.
+#   BibItems  has an entry (Ref,Used) for each \bibitem reference, where Used
+#             is True if the .tex file cites it (with the same case).
+#   TexRefs   has an entry (Ref,Match,AsBibitem) for each citation in the
+#             .tex file, where Match is as for BibRefs and AsBibitem is True if
+#             it was found as a \bibitem reference rather than in the .bib file.
+#
+#   TexLines and BibLines are dictionaries giving the line on which each
+#   reference was first cited or defined in the .tex file, and the line on
+#   which each .bib file entry starts. VerifyRefs() fills these in.
+#
+#   Unused(), Undefined() etc. return just the names of interest, and ToDict()
+#   returns the whole thing as a dictionary that can be written out using the
+#   json module. Results() returns the problems it shows as a list of
+#   CheckResult objects, given the names of the .tex and .bib files and the
+#   AllowBibitems flag used by VerifyRefs().
+
+class RefsDiff(object):
+
+   def __init__(self) :
+      self.BibRefs = []
+      self.BibItems = []
+      self.TexRefs = []
+      self.TexLines = {}
+      self.BibLines = {}
+
+   def Unused(self) :
+      return [Ref for (Ref,Match) in self.BibRefs if Match == None]
+
+   def BibCaseMismatches(self) :
+      return [Ref for (Ref,Match) in self.BibRefs if Match == "case"]
+
+   def UnusedBibItems(self) :
+      return [Ref for (Ref,Used) in self.BibItems if not Used]
+
+   def Undefined(self) :
+      return [Ref for (Ref,Match,AsBibitem) in self.TexRefs if Match == None]
+
+   def CaseMismatches(self) :
+      return [Ref for (Ref,Match,AsBibitem) in self.TexRefs if Match == "case"]
+
+   def DefinedAsBibItems(self) :
+      return [Ref for (Ref,Match,AsBibitem) in self.TexRefs if AsBibitem]
+
+   def ToDict(self) :
+      return {"Unused" : self.Unused(),
+              "BibCaseMismatches" : self.BibCaseMismatches(),
+              "UnusedBibItems" : self.UnusedBibItems(),
+              "Undefined" : self.Undefined(),
+              "CaseMismatches" : self.CaseMismatches(),
+              "DefinedAsBibItems" : self.DefinedAsBibItems()}
+
+   def Results(self,TexFileName,BibFileName,AllowBibitems = True) :
+      Results = []
+      BibLines = self.BibLines
+      TexLines = self.TexLines
+      for Ref in self.Unused() :
+         Results.append(CheckResult("References","warning", \
+            "Bib file reference " + Ref + " not used in .tex file", \
+            BibFileName,BibLines.get(Ref,0), \
+            "Remove the entry for " + Ref + " from the .bib file"))
+      for Ref in self.BibCaseMismatches() :
+         Results.append(CheckResult("References","error", \
+            "Bib file reference " + Ref + " used with different case in " \
+            ".tex file",BibFileName,BibLines.get(Ref,0),"Cite it as " + Ref))
+      for Ref in self.UnusedBibItems() :
+         Results.append(CheckResult("References","error", \
+            "\\bibitem reference " + Ref + " not used in .tex file", \
+            TexFileName,TexLines.get(Ref,0), \
+            "Remove the \\bibitem entry for " + Ref))
+      for Ref in self.Undefined() :
+         Results.append(CheckResult("References","error", \
+            ".tex file reference " + Ref + " undefined",TexFileName, \
+            TexLines.get(Ref,0),"Add an entry for " + Ref + " to the .bib " \
+                                                                     "file"))
+      for Ref in self.CaseMismatches() :
+         Results.append(CheckResult("References","error", \
+            ".tex file reference " + Ref + " defined but with different case",\
+            TexFileName,TexLines.get(Ref,0), \
+            "Use the same case as the entry in the .bib file"))
+      if (not AllowBibitems) :
+         for Ref in self.DefinedAsBibItems() :
+            Results.append(CheckResult("References","error", \
+               ".tex file reference " + Ref + " defined but as a \\bibitem " \
+               "entry",TexFileName,TexLines.get(Ref,0), \
+               "Replace the \\bibitem entry for " + Ref + \
+                                                 " with one in the .bib file"))
+      return Results
+
+# ------------------------------------------------------------------------------
+
+#                         R e c o n c i l e  R e f s
+#
+#   Compares the references defined in a .bib file (BibFileRefs), and by any
+#   \bibitem directives (BibItemRefs), with those cited in the .tex file
+#   (TexFileRefs), and returns the result as a RefsDiff. All three are lists
+#   of strings, as returned by GetBibFileRefs() and GetTexFileRefs(). Each list
+#   is turned into a set of names - and a set of lower case names - so that
+#   each name can be looked up directly, rather than by searching the other
+#   lists. An exact match is always preferred to one that differs only in case.
+#   (As before, a citation that only matches a \bibitem reference when case is
+#   ignored is only reported as a case problem.)
+
+def ReconcileRefs (BibFileRefs,TexFileRefs,BibItemRefs) :
+
+   Diff = RefsDiff()
+   
+   BibRefs = [Ref.strip() for Ref in BibFileRefs]
+   TexRefs = [Ref.strip() for Ref in TexFileRefs]
+   BibItems = [Ref.strip() for Ref in BibItemRefs]
+   
+   TexExact = set(TexRefs)
+   TexLower = set([Ref.lower() for Ref in TexRefs])
+   BibExact = set(BibRefs)
+   BibLower = set([Ref.lower() for Ref in BibRefs])
+   ItemExact = set(BibItems)
+   ItemLower = set([Ref.lower() for Ref in BibItems])
+
+   for BibRef in BibRefs :
+      Match = None
+      if (BibRef in TexExact) : Match = "exact"
+      elif (BibRef.lower() in TexLower) : Match = "case"
+      Diff.BibRefs.append((BibRef,Match))
+   
+   for BibItem in BibItems :
+      Diff.BibItems.append((BibItem,BibItem in TexExact))
+   
+   for TexRef in TexRefs :
+      Match = None
+      AsBibitem = False
+      if (TexRef in BibExact) :
+         Match = "exact"
+      elif (TexRef.lower() in BibLower) :
+         Match = "case"
+      elif (TexRef in ItemExact) :
+         Match = "exact"
+         AsBibitem = True
+      elif (TexRef.lower() in ItemLower) :
+         Match = "case"
+      Diff.TexRefs.append((TexRef,Match,AsBibitem))
+   
+   return Diff
+
+# ------------------------------------------------------------------------------
+
 #                            V e r i f y  R e f s
 #
 #   This routine looks in the current directory for a file called 
@@ -592,10 +1319,13 @@ def FindBibFile (Paper,Details = None) :
 #   True if no problems were found, False otherwise. The final optional
 #   Problems and Warnings arguments allow this to be used in batch mode, where
 #   direct output from this routine is suppressed and instead a set of report
-#   lines are added to the list of problems passed.
+#   lines are added to the list of problems passed. If a list is passed as
+#   Diff, the RefsDiff produced by ReconcileRefs() is appended to it, with
+#   its TexLines and BibLines filled in, so the caller can make use of the
+#   details.
 
 def VerifyRefs (Paper,AllowBibitems = True,TexFileName = "",BibFileName = "", \
-                                            Problems = None, Warnings = None) :
+                               Problems = None, Warnings = None, Diff = None) :
 
    ReturnOK = True
    
@@ -625,10 +1355,11 @@ def VerifyRefs (Paper,AllowBibitems = True,TexFileName = "",BibFileName = "", \
          if (not os.path.exists(BibFileName)) : LookForBibFile = True
       if (LookForBibFile) : BibFileName = FindBibFile(Paper,Warnings)
 
+      BibLines = {}
       if (BibFileName == "") :
          BibFileRefs = []
       else :
-         BibFileRefs = GetBibFileRefs(BibFileName,BatchMode)
+         BibFileRefs = GetBibFileRefs(BibFileName,BatchMode,BibLines)
          if (not BatchMode) :
             print("")
             print("References in",BibFileName," :")
@@ -669,8 +1400,9 @@ def VerifyRefs (Paper,AllowBibitems = True,TexFileName = "",BibFileName = "", \
 
       TexFileRefs = []
       BibItemRefs = []
+      TexLines = {}
 
-      GetTexFileRefs(TexFileName,TexFileRefs,BibItemRefs,Problems)
+      GetTexFileRefs(TexFileName,TexFileRefs,BibItemRefs,Problems,TexLines)
 
       if (not BatchMode) :
          if (len(TexFileRefs) > 0) :
@@ -696,6 +1428,13 @@ def VerifyRefs (Paper,AllowBibitems = True,TexFileName = "",BibFileName = "", \
                print("** These need to be replaced by a .bib file", \
                                                      "with BibTex entries **")
 
+      #  Work out which references match up, then go through the results.
+      
+      Result = ReconcileRefs(BibFileRefs,TexFileRefs,BibItemRefs)
+      Result.TexLines = TexLines
+      Result.BibLines = BibLines
+      if (Diff != None) : Diff.append(Result)
+
       #  See if all the references defined in the .bib file are used
       #  in the .tex file.
 
@@ -703,27 +1442,14 @@ def VerifyRefs (Paper,AllowBibitems = True,TexFileName = "",BibFileName = "", \
          if (not BatchMode) : print("No Bib file references supplied")
       else :
          AllUsed = True
-         for BibRef in BibFileRefs :
-            BibRef = BibRef.strip()
-            BibRefLower = BibRef.lower()
-            Found = False
-            CaseCheck = False
-            for TexRef in TexFileRefs :
-               TexRef = TexRef.strip()
-               if (BibRef == TexRef) :
-                  Found = True
-                  CaseCheck = True
-                  break
-               if (BibRefLower == TexRef.lower()) :
-                  Found = True
-                  break
-            if (not Found) :
+         for (BibRef,Match) in Result.BibRefs :
+            if (Match == None) :
                Warning = "Bib file reference " + BibRef + \
                                                     " not used in .tex file"
                if (BatchMode) : Warnings.append(Warning)
                else : print(Warning)
                AllUsed = False
-            if (Found and (not CaseCheck)) :
+            if (Match == "case") :
                Problem = "Bib file reference " + BibRef + \
                                    " used with different case in .tex file"
                if (BatchMode) : Problems.append(Problem)
@@ -739,15 +1465,8 @@ def VerifyRefs (Paper,AllowBibitems = True,TexFileName = "",BibFileName = "", \
 
       if (BibItemCount > 0) :
          AllUsed = True
-         for BibItem in BibItemRefs :
-            BibItem = BibItem.strip()
-            Found = False
-            for TexRef in TexFileRefs :
-               TexRef = TexRef.strip()
-               if (BibItem == TexRef) :
-                  Found = True
-                  break
-            if (not Found) :
+         for (BibItem,Used) in Result.BibItems :
+            if (not Used) :
                Problem = "\\bibitem reference " + BibItem + \
                                              " not used in .tex file"
                if (BatchMode) : Problems.append(Problem)
@@ -767,44 +1486,18 @@ def VerifyRefs (Paper,AllowBibitems = True,TexFileName = "",BibFileName = "", \
          if (not BatchMode) : print("No citations found in tex file")
       else :
          AllFound = True
-         for TexRef in TexFileRefs :
-            TexRef = TexRef.strip()
-            TexRefLower = TexRef.lower()
-            Found = False
-            AsBibitem = False
-            CaseCheck = False
-            for BibRef in BibFileRefs :
-               BibRef = BibRef.strip()
-               if (TexRef == BibRef) :
-                  Found = True
-                  CaseCheck = True
-                  break
-               if (TexRefLower == BibRef.lower()) :
-                  Found = True
-                  break
-            if (not Found) :
-               for BibItem in BibItemRefs :
-                  BibItem = BibItem.strip()
-                  if (TexRef == BibItem) :
-                     Found = True
-                     CaseCheck = True
-                     AsBibitem = True
-                     break
-                  if (TexRefLower == BibItem.lower()) :
-                     Found = True
-                     AsBibItem = True
-                     break
-            if (not Found) :
+         for (TexRef,Match,AsBibitem) in Result.TexRefs :
+            if (Match == None) :
                Problem = ".tex file reference " + TexRef + " undefined"
                if (BatchMode) : Problems.append(Problem)
                else : print(Problem)
                AllFound = False
-            if (Found and (not CaseCheck)) :
+            if (Match == "case") :
                Problem = ".tex file reference " + TexRef + \
                                      " defined but with different case"
                if (BatchMode) : Problems.append(Problem)
                else : print(Problem)
-            if (Found and AsBibitem and not AllowBibitems) :
+            if (AsBibitem and not AllowBibitems) :
                Problem = ".tex file reference " + TexRef + \
                                      " defined but as a \\bibitem entry"
                if (BatchMode) : Problems.append(Problem)
@@ -827,13 +1520,15 @@ def VerifyRefs (Paper,AllowBibitems = True,TexFileName = "",BibFileName = "", \
 #   the .tex file for citations to references that should be in the .bib
 #   file. Also scans for references defined within the .tex file using
 #   \bibitem entries. Words are the components of a LaTeX directive parsed 
-#   by the TexScanner. The second argument, Refs, should be a list of two
-#   lists, the first being TexFileRefs (a list of cited references in the file)
+#   by the TexScanner. The second argument, Refs, should be a list of three
+#   items, the first being TexFileRefs (a list of cited references in the file)
 #   and the second being BibItemRefs (a list of any \bibitem entries in the
 #   file - which we don't approve of, but need to know about). If this is a
 #   recognised citation, the cited references are added to TexFileRefs. If it
 #   is a \bibitem entry, the name of the reference is added to BibItemRefs.
-#   TexFileRefs and BibItemRefs are both lists of strings. The final optional
+#   TexFileRefs and BibItemRefs are both lists of strings. The third item is
+#   either None or a dictionary to which the line of the directive is added
+#   for each reference not already in it, keyed by name. The final optional
 #   Problems argument allows this to be used in batch mode, where direct output
 #   from this routine is suppressed and instead a set of report lines are added
 #   to the list of problems passed.
@@ -842,6 +1537,7 @@ def RefsScanCallback (Words,Refs,Problems = None) :
    
    TexFileRefs = Refs[0]
    BibItemRefs = Refs[1]
+   RefLines = Refs[2]
    
    BatchMode = (Problems != None)
 
@@ -906,6 +1602,9 @@ def RefsScanCallback (Words,Refs,Problems = None) :
             if (Refs != "") :
                RefList = Refs.split(",")
                TexFileRefs.extend(RefList)
+               if (RefLines != None) :
+                  for Ref in RefList :
+                     RefLines.setdefault(Ref.strip(),Words.Line)
             else :
                Problem = "Note: no reference list in " + ' '.join(Words) + \
                                                             " in .tex file"
@@ -918,6 +1617,8 @@ def RefsScanCallback (Words,Refs,Problems = None) :
          Refs = ExtractRefs(Words)
          if (Refs != "") :
             BibItemRefs.append(Refs.strip("{}"))
+            if (RefLines != None) :
+               RefLines.setdefault(Refs.strip("{}").strip(),Words.Line)
          else :
             Problem = "Note: no reference list in " + ' '.join(Words) + \
                                                             "in .tex file"
@@ -938,15 +1639,18 @@ def RefsScanCallback (Words,Refs,Problems = None) :
 #   also checks that there are no additional .eps files that are unused.
 #   To allow this to be used for preliminary checking, where the main .tex
 #   file has been misnamed, the actual .tex file name can be supplied as
-#   an optional argument. The final optional Problems and Warnings arguments
+#   an optional argument. The optional Problems and Warnings arguments
 #   allow this to be used in batch mode, where direct output from this routine
 #   is suppressed and instead a set of report lines are added to the lists of
-#   problems and warnings passed.
+#   problems and warnings passed. If a list is passed as Results, a
+#   CheckResult is added to it for each problem with a particular graphics
+#   file, giving the line of the .tex file that uses it and a suggested fix.
 #
 #   This routine returns True if everything looks OK, False otherwise.
 
 
-def VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None) :
+def VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None, \
+                                                             Results = None) :
 
    #  Originally, for early versions of Python 2, CalledFromWalk() was a
    #  function passed to os.path.walk() in order to build up a full list of the
@@ -962,12 +1666,27 @@ def VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None) :
             if (Path.startswith("./")) : Path = Path[2:]
             FileList.append(Path)
    
+   #  AddResult() adds a CheckResult to Results, if it was passed, for a
+   #  problem with the graphics file GraphicsFile, as named in the .tex file.
+   #  The result is for the line of the .tex file that uses it, unless the
+   #  name of another file it refers to is passed as File.
+   
+   def AddResult(Severity,Message,GraphicsFile,Fix,File = "") :
+      if (Results != None) :
+         if (File == "") :
+            Results.append(CheckResult("Graphics",Severity,Message,\
+                    ResultFileName,GraphicsLines.get(GraphicsFile,0),Fix))
+         else :
+            Results.append(CheckResult("Graphics",Severity,Message,File,0,Fix))
+   
    ReturnOK = True
+   GraphicsLines = {}
    
    BatchMode = False
    if (Problems != None and Warnings != None) : BatchMode = True
    
    if (TexFileName == "") : TexFileName = Paper + ".tex"
+   ResultFileName = TexFileName
    TexFileName = os.path.abspath(TexFileName)
    if (not os.path.exists(TexFileName)) :
       Problem = "Cannot find main .tex file: " + TexFileName
@@ -980,20 +1699,18 @@ def VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None) :
       #  file.
 
       FileListFromTex = []
-      TexFile = open(TexFileName,mode='r')
-      TheScanner = TexScanner.TexScanner()
-      TheScanner.SetFile(TexFile)
       
-      #  GetNextTexCommand() will call EpsScanCallback for each command it
-      #  finds in the file, and EpsScanCallback will check the command
-      #  and add any specified graphic file names used to FileListFromTex.
+      #  The dispatcher will call EpsScanCallback for each graphics command
+      #  in the file, and EpsScanCallback will check the command and add any
+      #  specified graphic file names used to FileListFromTex, and the line
+      #  that uses each of them to LinesFromTex.
       
-      Finished = False
-      while (not Finished) :
-         Finished =  TheScanner.GetNextTexCommand(EpsScanCallback,\
-                                                      FileListFromTex,None)
-                                                         
-      TexFile.close()
+      LinesFromTex = []
+      Dispatcher = TexScanner.TexDispatcher()
+      Dispatcher.Register(EpsScanCallback,FileListFromTex,LinesFromTex,\
+                                                     __GraphicsDirectives__)
+      ScanTexFile(TexFileName,Dispatcher)
+      GraphicsLines = dict(zip(FileListFromTex,LinesFromTex))
 
       #  See if any of the graphics files are in sub-directories. They shouldn't
       #  be, but people often do put them there.
@@ -1026,6 +1743,12 @@ def VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None) :
             Problem = "Some graphics files are in sub-directories"
             if (BatchMode) : Problems.append(Problem)
             else : print("**",Problem,"**")
+            for FileName in FileListFromTex :
+               if (os.path.dirname(FileName) != "") :
+                  BaseName = os.path.basename(FileName)
+                  AddResult("error",FileName + " is in a sub-directory", \
+                     FileName,"Move " + FileName + " into the paper's " + \
+                               "directory and refer to it as " + BaseName)
          
          #  Now run through them again, checking for files with .eps extensions.
          #  If so, see if they were supplied. 
@@ -1060,6 +1783,9 @@ def VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None) :
                         Files = Files + Match + " "
                      if (BatchMode) : Problems.append(Files)
                      else : print("    ",Files)
+                     AddResult("error",Problem + " " + Files.strip(),FileName,\
+                            "Give the extension of the file to use for " + \
+                                               FileName + " in the .tex file")
                      if (EpsMatch) :
                         Problem = "Only one of which is an eps file"
                      else :
@@ -1077,10 +1803,14 @@ def VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None) :
                         ReturnOK = False
                         if (BatchMode) : Problems.append(Problem)
                         else : print("**",Problem,"**")
+                        AddResult("error",Problem,FileName, \
+                                            "Supply " + FileName + ".eps")
                   else :
                      Problem = "No files match " + FileName
                      if (BatchMode) : Problems.append(Problem)
                      else : print("**",Problem,"**")
+                     AddResult("error",Problem,FileName, \
+                                            "Supply " + FileName + ".eps")
 
                else :
                
@@ -1090,10 +1820,14 @@ def VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None) :
                   Problem = FileName + " does not have a .eps extension"
                   if (BatchMode) : Problems.append(Problem)
                   else : print("**",Problem,"**")
+                  EpsName = os.path.splitext(FileName)[0] + ".eps"
+                  AddResult("error",Problem,FileName,"Convert " + FileName + \
+                                  " to .eps and refer to it as " + EpsName)
                   if (not os.path.exists(FileName)) :
                      Problem = FileName + " has not been supplied"
                      if (BatchMode) : Problems.append(Problem)
                      else : print("**",Problem,"**")
+                     AddResult("error",Problem,FileName,"Supply " + EpsName)
                   ReturnOK = False
                      
          if (not BatchMode) : print(" ")
@@ -1130,6 +1864,8 @@ def VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None) :
                                                        " but has different case"
                   if (BatchMode) : Problems.append(Problem)
                   else : print("**",Problem,"**")
+                  AddResult("error",Problem,GraphicsFile, \
+                                                   "Refer to it as " + EpsFile)
                   break
                if (GraphicsFile.find('.') < 0) :
                   if (GraphicsFile + ".eps" == EpsFile) :
@@ -1142,11 +1878,15 @@ def VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None) :
                                                       " but has different case"
                      if (BatchMode) : Problems.append(Problem)
                      else : print("**",Problem,"**")
+                     AddResult("error",Problem,GraphicsFile, \
+                                    "Refer to it as " + EpsFile[:-4])
                      break
             if (not Found) :
                Warning = EpsFile + " is not used in the .tex file"
                if (BatchMode) : Warnings.append(Warning)
                else : print("*",Warning,"*")
+               AddResult("warning",Warning,"","Remove " + EpsFile + \
+                                 " if the paper doesn't need it",EpsFile)
                AllFound = False
          if (AllFound) :
             if (not BatchMode) :
@@ -1170,6 +1910,7 @@ def VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None) :
          AllEps = True
          CaseProblems = False
          for GraphicsFile in FileListFromTex :
+            TexName = GraphicsFile
             if (os.path.splitext(GraphicsFile)[1] == "") :
                GraphicsFile = GraphicsFile + ".eps"
             Found = False
@@ -1199,11 +1940,14 @@ def VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None) :
                                                        " but has different case"
                      if (BatchMode) : Problems.append(Problem)
                      else : print("**",Problem,"**")
+                     AddResult("error",Problem,TexName,"Refer to it as " + File)
                      break
             if (not Found) :
                Problem = GraphicsFile + " is missing from the directory"
                if (BatchMode) : Problems.append(Problem)
                else : print("**",Problem,"**")
+               if (TexName.endswith(".eps")) :
+                  AddResult("error",Problem,TexName,"Supply " + GraphicsFile)
                AllFound = False
                ReturnOK = False
          if (AllFound) :
@@ -1237,15 +1981,23 @@ def VerifyEps (Paper,TexFileName = "",Problems = None,Warnings = None) :
 #   the .tex file for references to figures that should be supplied in files.
 #   Words are the components of a LaTeX directive parsed by the TexScanner. If
 #   this is a recognised graphics command, the specified file name will be
-#   added to FileListFromTex, which is a list of strings. TexScanner supplies
-#   an additional argument when it makes the callback, but this is unused here.
+#   added to FileListFromTex, which is a list of strings. The additional
+#   argument, Lines, is either None or a list to which the line of the command
+#   is added for each file name added to FileListFromTex.
 #   File names already in the list are not added to it - some .tex files use
 #   the same image more than once. Any leading "./" characters are removed from
 #   the file names; I don't think they should really be there, but this makes
 #   things consistent with the way the files found in the directory are handled
-#   when the two are compared by VerifyEps().
+#   when the two are compared by VerifyEps(). __GraphicsDirectives__ lists the
+#   graphics commands recognised, so VerifyEps() can register this callback
+#   for just those directives.
+
+__GraphicsDirectives__ = ["\\includegraphics","\\articlefigure",
+   "\\articlefiguretwo","\\articlefigurethree","\\articlefigurefour",
+   "\\articlelandscapefigure","\\articlelandscapefiguretwo","\\plotone",
+   "\\plottwo","\\plotfiddle"]
 
-def EpsScanCallback (Words,FileListFromTex,Unused) :
+def EpsScanCallback (Words,FileListFromTex,Lines) :
    if (len(Words) > 0) :
       if (Words[0] == "\\includegraphics" or \
             Words[0] == "\\articlefigure" or \
@@ -1271,6 +2023,7 @@ def EpsScanCallback (Words,FileListFromTex,Unused) :
                   File = File.strip()
                   if (not File in FileListFromTex) :
                      FileListFromTex.append(File)
+                     if (Lines != None) : Lines.append(Words.Line)
                   if (FileCount >= MaxFiles) : break
                   
 # ------------------------------------------------------------------------------
@@ -1322,78 +2075,57 @@ def TrimBibFile (Paper,Keep = True) :
       else :
    
          GetTexFileRefs (TexFileName,TexFileRefs,BibItemRefs)
+         UsedRefs = set([Ref.strip() for Ref in TexFileRefs])
          
-         BibFile = open(BibFileName,mode='r')
+         #  IndexBibFile() tells us where each entry is in the file. Anything
+         #  between the entries is copied as it is, and each entry is either
+         #  copied or commented out, depending on whether it's used. The file
+         #  is handled as bytes, so whatever encoding it uses is preserved.
+         
+         Entries = IndexBibFile(BibFileName)
+         BibFile = open(BibFileName,mode='rb')
          ModBibFileName = "oldReferences.bib"
-         ModBibFile = open(ModBibFileName,mode='w')
+         ModBibFile = open(ModBibFileName,mode='wb')
          Changed = False
-         CommentingOut = False
-         BraceCount = 0
-         LineCount = 0
-         for BibFileLine in BibFile :
-         
-            #  The parsing here is rather crude. It assumes that each
-            #  starts with a line that begins "@type{name" and goes on
-            #  to count '{' and '}' characters and assumes the entry 
-            #  ends when these are balanced. There may be files that
-            #  break this, but most should be OK.
+         Posn = 0
+         for Entry in Entries :
+            BibFile.seek(Posn)
+            ModBibFile.write(BibFile.read(Entry.Offset - Posn))
+            Posn = Entry.Offset + Entry.Length
+            EntryText = ReadBibEntry(BibFile,Entry)
             
-            LineCount = LineCount + 1
-            ThisIsAComment = False
-            if (not BibFileLine.strip().startswith('%')) :
-               if (CommentingOut) :
-                  BraceCount = BraceCount + BibFileLine.count('{') - \
-                                              BibFileLine.count('}')
-                  if (BraceCount <= 0) :
-                     CommentingOut = False
-                     BraceCount = 0
-                  BibFileLine = '%' + BibFileLine
-                  ThisIsAComment = True
+            #  Entries such as @string definitions have no name, and are
+            #  always kept. If the name is blank, we flag the problem and keep
+            #  the reference.
+            
+            Used = True
+            if (Entry.Key == "") :
+               print("** Blank name in .bib file at line",Entry.Line,"**")
+               ParsedOK = False
+            elif (Entry.Key != None) :
+               if (Entry.Key in UsedRefs) :
+                  print("Keeping reference",Entry.Key)
                else :
-                  if (BibFileLine.strip().startswith("@")) :
-                  
-                     #  Lines starting with '@' indicate a new reference.
-                     #  Extract the name, then see if this is one that's in
-                     #  the list of those used by the .tex file. This 
-                     #  parsing has problems with cases where the name is on
-                     #  the next line. Handling this is tricky, as we don't
-                     #  know if we want to keep the reference until we've read
-                     #  the second line. For the moment, we just flag the
-                     #  problem and keep the reference.
-                     
-                     Brace = BibFileLine.find("{")
-                     if (Brace > 0) :
-                        Comma = BibFileLine.find(",")
-                        if (Comma > 0) :
-                           Ref = BibFileLine[Brace + 1:Comma]
-                        else :
-                           Ref = BibFileLine[Brace + 1:]
-                        Ref = Ref.strip()
-                        Used = False
-                        if (Ref == "") :
-                           print("** Blank name in .bib file at line",\
-                                                              LineCount,"**")
-                           ParsedOK = False
-                           Used = True
-                        for TexFileRef in TexFileRefs :
-                           if (Ref == TexFileRef.strip()) :
-                              Used = True
-                              print("Keeping reference",Ref)
-                              break
-                        if (not Used) :
-                           BibFileLine = '%' + BibFileLine.replace('@',"_AT_")
-                           if (Keep) :
-                              print("Commenting out unused reference",Ref)
-                           else :
-                              print("Deleting unused reference",Ref)
-                           Changed = True
-                           CommentingOut = True
-                           ThisIsAComment = True
-                           BraceCount = BibFileLine.count('{') - \
-                                              BibFileLine.count('}')
-            WriteThis = True
-            if (ThisIsAComment and (not Keep)) : WriteThis = False
-            if (WriteThis) : ModBibFile.write(BibFileLine)
+                  Used = False
+            if (Used) :
+               ModBibFile.write(EntryText)
+            else :
+               if (Keep) :
+                  print("Commenting out unused reference",Entry.Key)
+               else :
+                  print("Deleting unused reference",Entry.Key)
+               Changed = True
+               First = True
+               for BibFileLine in EntryText.splitlines(True) :
+                  ThisIsAComment = False
+                  if (not BibFileLine.strip().startswith(b'%')) :
+                     if (First) : BibFileLine = BibFileLine.replace(b'@',b"_AT_")
+                     BibFileLine = b'%' + BibFileLine
+                     ThisIsAComment = True
+                  First = False
+                  if (Keep or not ThisIsAComment) : ModBibFile.write(BibFileLine)
+         BibFile.seek(Posn)
+         ModBibFile.write(BibFile.read())
          ModBibFile.close()
          BibFile.close()
          
@@ -1832,10 +2564,13 @@ def AuthorScanCallback(Words,AuthorList,Notes) :
 #   required as the argument to an \aindex directive, eg "Shortridge,~K.".
 #   Notes is a list to which this adds a brief description of anything 
 #   possibly amiss that it comes across when processing the author list.
+#   If FirstOnly is True, the search stops at the first \author directive
+#   that produces any authors, which is all that is needed to find the first
+#   author, or to see if the file has an author list at all.
 
 
 
-def GetAuthors (Paper,Notes,TexFileName = "") :
+def GetAuthors (Paper,Notes,TexFileName = "",FirstOnly = False) :
 
    AuthorList = []
    
@@ -1847,20 +2582,18 @@ def GetAuthors (Paper,Notes,TexFileName = "") :
 
       #  Now get a list of the authors from the .tex file.
 
-      TexFile = open(TexFileName,mode='r')
-      TheScanner = TexScanner.TexScanner()
-      TheScanner.SetFile(TexFile)
-      
-      #  GetNextTexCommand() will call AuthorScanCallback for each command it
-      #  finds in the file, and AuthorScanCallback will check the command
+      #  The dispatcher will call AuthorScanCallback for each \author
+      #  command in the file, and AuthorScanCallback will check the command
       #  and add the list of authors to AuthorList.
       
-      Finished = False
-      while (not Finished) :
-         Finished =  TheScanner.GetNextTexCommand(AuthorScanCallback,\
-                                                      AuthorList,Notes)
-                                                         
-      TexFile.close()
+      if (FirstOnly) :
+         for Command in IterTexCommands(TexFileName,["\\author"]) :
+            AuthorScanCallback(Command,AuthorList,Notes)
+            if (len(AuthorList) > 0) : break
+      else :
+         Dispatcher = TexScanner.TexDispatcher()
+         Dispatcher.Register(AuthorScanCallback,AuthorList,Notes,["\\author"])
+         ScanTexFile(TexFileName,Dispatcher)
 
    return AuthorList
 
@@ -2050,6 +2783,41 @@ def FixCharacters (Line,LineNumber,Encoding = "Latin1") :
 
 # ------------------------------------------------------------------------------
 
+#                 F i x  T r a n s l a t i o n  T a b l e
+#
+#   This provides what is needed to make the same replacements as
+#   FixCharacters() to a whole file at once, using str.translate(). It returns
+#   a tuple (Codec,Table). The contents of the file should be decoded using
+#   Codec, with the "surrogateescape" error handler, translated using Table,
+#   and then encoded again in the same way - this leaves any characters that
+#   cannot be replaced exactly as they were. For Latin1 and Mac Roman, Codec is
+#   "latin-1", which maps each byte onto the character with the same value, so
+#   the table can be indexed by the byte values used by those encodings. For
+#   UTF-8, it is indexed by Unicode value. The tables are only built once.
+
+__FixTranslationTables__ = {}
+
+def FixTranslationTable (Encoding) :
+
+   LowEncoding = Encoding.lower()
+   Translation = __FixTranslationTables__.get(LowEncoding)
+   if (Translation == None) :
+      Codec = "latin-1"
+      Table = {}
+      if (LowEncoding == "latin1") :
+         Table.update(__Latin1_LaTeX_Chars__)
+      elif (LowEncoding == "macroman") :
+         Table.update(__Macintosh_LaTeX_Chars__)
+      elif (LowEncoding == "utf-8") :
+         Codec = "utf-8"
+         Table.update(__Latin1_LaTeX_Chars__)
+         Table.update(__Unicode_LaTeX_Chars__)
+      Translation = (Codec,Table)
+      __FixTranslationTables__[LowEncoding] = Translation
+   return Translation
+
+# ------------------------------------------------------------------------------
+
 #                    C h e c k  F o r  U T F  8  U n i c o d e
 #
 #   This utility routine is passed a byte string, which should be a line read
@@ -2226,8 +2994,13 @@ def CheckForUTF8Unicode (Line,Index,Length) :
 #   100, then the resut is perfectly clear. Any lesser value indicates that
 #   there is some uncertainty, best handled by the calling routine displaying
 #   the full Report that this routine also returns.
+#
+#   The Report only lists the individual extended characters found in the file
+#   when the result is uncertain - that's the only time it's needed. If the
+#   optional Detailed argument is passed as True, the full report is always
+#   generated, although this takes rather longer for large files.
 
-def GetFileEncoding (TexFileName,Result,Report) :
+def GetFileEncoding (TexFileName,Result,Report,Detailed = False) :
 
    Certainty = 100
    
@@ -2236,140 +3009,24 @@ def GetFileEncoding (TexFileName,Result,Report) :
       Certainty = 0
    
    else :
-      HasUnicode = False       # File does contain Unicode characters
-      AllAscii = True          # All chars so fat are standard ASCII
-      HasMacRoman = False      # File has chars that could be Mac Roman
-      HasLatin1 = False        # File has chars that could be Latin1
-      HasAmbiguous = False     # File has chars that could be Mac or Latin1
-      HasUnknown = False       # File has chars that can't be classified
-      HasUFFFD = False         # File has the Unicode replacement character
+   
+      #  The file is read as bytes - it is the byte values themselves that
+      #  tell us about the encoding, and reading it as text would need us to
+      #  know the encoding already.
       
-      LineNumber = 0
-      TexFile = open(TexFileName,"r")
-      for Line in TexFile :
-         LineNumber = LineNumber + 1
-         Index = 0
-         LineLength = len(Line)
-         while (Index < LineLength) :
-
-            IsUnicode = False       # Almost certainly Unicode
-            IsLatin1 = False        # Probably Latin1
-            IsMacRoman = False      # Probably Mac Roman
-            IsAscii = False         # Definitely standard ASCII
-            IsUnknown = False       # Not Unicode, not a usual Latin or Mac char
-            IsAmbiguous = False     # Not Unicode, known in both Latin & Mac
-            
-            Char = Line[Index]
-            CharNum = ord(Char)
-            
-            #  First, an easy test. Any character in the range 0..7F is an
-            #  ordinary ASCII character.
-            
-            if (CharNum <= 0x7f) :
-               IsAscii = True
-            else :
-            
-               #  A character greater than 7F might be a Latin-1 character,
-               #  a Mac OS Roman character (and these can be hard to tell apart)
-               #  or it might be the start of a UTF-8 Unicode multi-byte
-               #  character. Such Unicode characters have a distinctive
-               #  signature, that CheckForUTF8Unicode() will spot pretty
-               #  unambiguously, so we check that next. If this is such a
-               #  character, we increment Index to skip over the rest of the
-               #  bytes that make up the multi-byte character.
-               
-               (IsUnicode, Unicode, NewIndex) = \
-                                 CheckForUTF8Unicode(Line,Index,LineLength)
-               if (IsUnicode) :
-               
-                  #  This is clearly Unicode. See if we can get the LaTeX
-                  #  equivalent for the report.
-                  
-                  Index = NewIndex
-                  Message = "Line " + str(LineNumber) + \
-                              " : has Unicode char U+" + hex(Unicode)[2:]
-
-                  #  Unicode U+FFFD is the Unicode replacement character. If the
-                  #  file has this, then it indicates that it has been read by
-                  #  another program and converted into Unicode, but that some
-                  #  characters could not be converted - probably becasue the
-                  #  program assumed the wrong input format. Some versions of
-                  #  TexWorks used to do this to files they read in different
-                  #  formats.
-                  
-                  if (Unicode == 0xfffd) :
-                     HasUFFFD = True
-                     Message = Message + " (the Unicode replacement character)"
-                  else :
-                  
-                     #  See if we canget the LaTeX equivalent string, and add
-                     #  that to the report.
-                     
-                     Repl = __Unicode_LaTeX_Chars__.get(Unicode)
-                     if (Repl == None) :
-                        Repl = __Latin1_LaTeX_Chars__.get(Unicode)
-                     if (Repl != None) :
-                        Message = Message + ' (LaTeX: "' + Repl + '")'
-                     else :
-                        Message = Message + ' (LaTeX: Unknown)'
-                  Report.append(Message)
-                  
+      TexFile = open(TexFileName,"rb")
+      Data = TexFile.read()
+      TexFile.close()
       
-               else :
-
-                  #  It wasn't a Unicode character. What we have now is a
-                  #  single character in the range 80..FF. This will usually be
-                  #  a LATIN-1 character, but it just might be Mac Roman.
-
-                  Message = "Line " + str(LineNumber) + " : has char " + \
-                                                         hex(CharNum)[2:]
-                  
-                  #  We see if this is a character we know how to convert
-                  #  into LaTeX in either of the encodings. (LATIN-1 doesn't use
-                  #  the range 80-9F, and we note that.) If we have a LaTeX
-                  #  equivalent for this character in either of the encodings,
-                  #  that's a pretty good hint as to which encoding is being
-                  #  used. However, some characters have encodings in both
-                  #  Latin-1 and Mac Roman. We use the LaTeX equivalents in
-                  #  the lines we generate for the reports.
-
-                  MacRepl = __Macintosh_LaTeX_Chars__.get(CharNum)
-                  if (MacRepl != None) :
-                     Message = Message + ' (LaTeX: "' + MacRepl + \
-                                                              '" if Mac Roman)'
-                  LatinRepl = __Latin1_LaTeX_Chars__.get(CharNum)
-                  if (LatinRepl != None) :
-                     Message = Message + ' (LaTeX: "' + LatinRepl + \
-                                                                 '" if Latin1)'
-                  if (CharNum >= 0x80 and CharNum <= 0x9F) :
-                     Message = Message + " (not used in Latin-1)"
-                  Report.append(Message)
-                  if (MacRepl == None and LatinRepl != None) :
-                     IsLatin1 = True
-                  elif (MacRepl != None and LatinRepl == None) :
-                     IsMacRoman = True
-                  elif (MacRepl == None and LatinRepl == None) :
-                     IsUnknown = True
-                  else :
-                     IsAmbiguous = True
+      #  Most files can be classified without looking at each character in
+      #  turn. QuickFileEncoding() returns None if it can't be sure, in which
+      #  case we go through the file a character at a time, which also
+      #  generates the detailed line-by-line report.
       
-
-            #  Now we've classified that character, how does that fit with what
-            #  we've seen so far?
-
-            if (not IsAscii) : AllAscii = False
-            if (IsUnicode) : HasUnicode = True
-            if (IsLatin1) : HasLatin1 = True
-            if (IsMacRoman) : HasMacRoman = True
-            if (IsAmbiguous) : HasAmbiguous = True
-            if (IsUnknown) : HasUnknown = True
-
-            Index = Index + 1
-
-      #  And once we've passed through the whole file, let's see what we've
-      #  got.
-
-      TexFile.close()
+      Flags = None
+      if (not Detailed) : Flags = QuickFileEncoding(Data,Report)
+      if (Flags == None) : Flags = DetailedFileEncoding(Data,Report)
+      (AllAscii,HasUnicode,HasLatin1,HasMacRoman,HasAmbiguous,HasUFFFD) = Flags
 
       if (HasAmbiguous) :
       
@@ -2437,6 +3094,219 @@ def GetFileEncoding (TexFileName,Result,Report) :
 
 # ------------------------------------------------------------------------------
 
+#                      Q u i c k  F i l e  E n c o d i n g
+#
+#   This is used by GetFileEncoding() to classify the contents of a file -
+#   passed as a bytes object - without going through it a character at a time.
+#   Almost all ADASS papers are either pure ASCII or clean UTF-8, and these can
+#   be recognised using bytes.isascii() and a strict UTF-8 decode, both of
+#   which run at C speed. If a file has no byte sequences that could be UTF-8,
+#   then each extended character can be classified on its own, and it is
+#   enough to look at the distinct byte values the file uses - there can only
+#   be 128 of them, however large the file is.
+#
+#   If it returns a result, it is a tuple of the flags GetFileEncoding() uses:
+#   (AllAscii,HasUnicode,HasLatin1,HasMacRoman,HasAmbiguous,HasUFFFD). If the
+#   result is at all uncertain, it returns None, and GetFileEncoding() then
+#   uses DetailedFileEncoding() to generate the full line-by-line report that
+#   it will need. Nothing is added to the Report in that case.
+
+__PossibleUTF8Pattern__ = re.compile( \
+      b"[\xc0-\xdf][\x80-\xbf]|[\xe0-\xef][\x80-\xbf]{2}|[\xf0-\xff][\x80-\xbf]{3}")
+
+__AsciiBytes__ = bytes(range(0x80))
+
+def QuickFileEncoding (Data,Report) :
+
+   Flags = None
+   
+   if (Data.isascii()) :
+      Flags = (True,False,False,False,False,False)
+      
+   else :
+      Text = None
+      try :
+         Text = Data.decode("utf-8")
+      except UnicodeDecodeError :
+         pass
+      if (Text != None) :
+      
+         #  It's valid UTF-8. If it has the replacement character, the full
+         #  report will be needed to show where it was found.
+         
+         if (Text.find(u"\ufffd") < 0) :
+            Flags = (False,True,False,False,False,False)
+            
+      elif (__PossibleUTF8Pattern__.search(Data) == None) :
+      
+         #  Nothing here could be UTF-8, so every extended character stands
+         #  on its own. Work out the set of distinct extended byte values, and
+         #  look each of them up in the Latin1 and Mac Roman tables.
+         
+         HasLatin1 = False
+         HasMacRoman = False
+         HasUncertain = False
+         for CharNum in set(Data.translate(None,__AsciiBytes__)) :
+            MacRepl = __Macintosh_LaTeX_Chars__.get(CharNum)
+            LatinRepl = __Latin1_LaTeX_Chars__.get(CharNum)
+            if (MacRepl == None and LatinRepl != None) :
+               HasLatin1 = True
+            elif (MacRepl != None and LatinRepl == None) :
+               HasMacRoman = True
+            else :
+               HasUncertain = True
+         if (not HasUncertain and HasLatin1 != HasMacRoman) :
+            Flags = (False,False,HasLatin1,HasMacRoman,False,False)
+            
+   return Flags
+
+# ------------------------------------------------------------------------------
+
+#                   D e t a i l e d  F i l e  E n c o d i n g
+#
+#   This is used by GetFileEncoding() to classify the contents of a file -
+#   passed as a bytes object - a character at a time, adding a line to the
+#   Report for each extended character it finds. It returns a tuple of flags:
+#   (AllAscii,HasUnicode,HasLatin1,HasMacRoman,HasAmbiguous,HasUFFFD). The
+#   lines are decoded as Latin-1, which maps each byte onto the character
+#   with the same value, so the checks here can work on the byte values.
+
+def DetailedFileEncoding (Data,Report) :
+
+   HasUnicode = False       # File does contain Unicode characters
+   AllAscii = True          # All chars so fat are standard ASCII
+   HasMacRoman = False      # File has chars that could be Mac Roman
+   HasLatin1 = False        # File has chars that could be Latin1
+   HasAmbiguous = False     # File has chars that could be Mac or Latin1
+   HasUnknown = False       # File has chars that can't be classified
+   HasUFFFD = False         # File has the Unicode replacement character
+   
+   LineNumber = 0
+   for LineBytes in Data.splitlines(True) :
+      Line = LineBytes.decode("latin-1")
+      LineNumber = LineNumber + 1
+      Index = 0
+      LineLength = len(Line)
+      while (Index < LineLength) :
+
+         IsUnicode = False       # Almost certainly Unicode
+         IsLatin1 = False        # Probably Latin1
+         IsMacRoman = False      # Probably Mac Roman
+         IsAscii = False         # Definitely standard ASCII
+         IsUnknown = False       # Not Unicode, not a usual Latin or Mac char
+         IsAmbiguous = False     # Not Unicode, known in both Latin & Mac
+         
+         Char = Line[Index]
+         CharNum = ord(Char)
+         
+         #  First, an easy test. Any character in the range 0..7F is an
+         #  ordinary ASCII character.
+         
+         if (CharNum <= 0x7f) :
+            IsAscii = True
+         else :
+         
+            #  A character greater than 7F might be a Latin-1 character,
+            #  a Mac OS Roman character (and these can be hard to tell apart)
+            #  or it might be the start of a UTF-8 Unicode multi-byte
+            #  character. Such Unicode characters have a distinctive
+            #  signature, that CheckForUTF8Unicode() will spot pretty
+            #  unambiguously, so we check that next. If this is such a
+            #  character, we increment Index to skip over the rest of the
+            #  bytes that make up the multi-byte character.
+            
+            (IsUnicode, Unicode, NewIndex) = \
+                              CheckForUTF8Unicode(Line,Index,LineLength)
+            if (IsUnicode) :
+            
+               #  This is clearly Unicode. See if we can get the LaTeX
+               #  equivalent for the report.
+               
+               Index = NewIndex
+               Message = "Line " + str(LineNumber) + \
+                           " : has Unicode char U+" + hex(Unicode)[2:]
+
+               #  Unicode U+FFFD is the Unicode replacement character. If the
+               #  file has this, then it indicates that it has been read by
+               #  another program and converted into Unicode, but that some
+               #  characters could not be converted - probably becasue the
+               #  program assumed the wrong input format. Some versions of
+               #  TexWorks used to do this to files they read in different
+               #  formats.
+               
+               if (Unicode == 0xfffd) :
+                  HasUFFFD = True
+                  Message = Message + " (the Unicode replacement character)"
+               else :
+               
+                  #  See if we canget the LaTeX equivalent string, and add
+                  #  that to the report.
+                  
+                  Repl = __Unicode_LaTeX_Chars__.get(Unicode)
+                  if (Repl == None) :
+                     Repl = __Latin1_LaTeX_Chars__.get(Unicode)
+                  if (Repl != None) :
+                     Message = Message + ' (LaTeX: "' + Repl + '")'
+                  else :
+                     Message = Message + ' (LaTeX: Unknown)'
+               Report.append(Message)
+               
+   
+            else :
+
+               #  It wasn't a Unicode character. What we have now is a
+               #  single character in the range 80..FF. This will usually be
+               #  a LATIN-1 character, but it just might be Mac Roman.
+
+               Message = "Line " + str(LineNumber) + " : has char " + \
+                                                      hex(CharNum)[2:]
+               
+               #  We see if this is a character we know how to convert
+               #  into LaTeX in either of the encodings. (LATIN-1 doesn't use
+               #  the range 80-9F, and we note that.) If we have a LaTeX
+               #  equivalent for this character in either of the encodings,
+               #  that's a pretty good hint as to which encoding is being
+               #  used. However, some characters have encodings in both
+               #  Latin-1 and Mac Roman. We use the LaTeX equivalents in
+               #  the lines we generate for the reports.
+
+               MacRepl = __Macintosh_LaTeX_Chars__.get(CharNum)
+               if (MacRepl != None) :
+                  Message = Message + ' (LaTeX: "' + MacRepl + \
+                                                           '" if Mac Roman)'
+               LatinRepl = __Latin1_LaTeX_Chars__.get(CharNum)
+               if (LatinRepl != None) :
+                  Message = Message + ' (LaTeX: "' + LatinRepl + \
+                                                              '" if Latin1)'
+               if (CharNum >= 0x80 and CharNum <= 0x9F) :
+                  Message = Message + " (not used in Latin-1)"
+               Report.append(Message)
+               if (MacRepl == None and LatinRepl != None) :
+                  IsLatin1 = True
+               elif (MacRepl != None and LatinRepl == None) :
+                  IsMacRoman = True
+               elif (MacRepl == None and LatinRepl == None) :
+                  IsUnknown = True
+               else :
+                  IsAmbiguous = True
+   
+
+         #  Now we've classified that character, how does that fit with what
+         #  we've seen so far?
+
+         if (not IsAscii) : AllAscii = False
+         if (IsUnicode) : HasUnicode = True
+         if (IsLatin1) : HasLatin1 = True
+         if (IsMacRoman) : HasMacRoman = True
+         if (IsAmbiguous) : HasAmbiguous = True
+         if (IsUnknown) : HasUnknown = True
+
+         Index = Index + 1
+
+   return (AllAscii,HasUnicode,HasLatin1,HasMacRoman,HasAmbiguous,HasUFFFD)
+
+# ------------------------------------------------------------------------------
+
 #                         C h e c k  C h a r a c t e r s
 #
 #   This is a version of FixCharacters() that only checks to see there are
@@ -2452,36 +3322,114 @@ def CheckCharacters (Line,LineNumber,Problems = None,Encoding = "Latin1") :
 
    BatchMode = False
    if (Problems != None) : BatchMode = True
-   LowEncoding = Encoding.lower()
-   UseLatin1 = (LowEncoding == "latin1")
-   UseMacRoman = (LowEncoding == "macroman")
-   UseUnicode = (LowEncoding == "utf-8")
-   UseAscii = (LowEncoding == "ascii")
    
-   Problem = False
+   Findings = {Encoding : []}
+   LineCharacterFindings(Line,LineNumber,Findings)
+   for Finding in Findings[Encoding] :
+      Text = Finding.Message()
+      if (BatchMode) : Problems.append(Text)
+      else : print(Text)
+   
+   return (len(Findings[Encoding]) > 0)
+
+# ------------------------------------------------------------------------------
+
+#                      C h a r a c t e r  F i n d i n g
+#
+#   A CharacterFinding records one potentially unprintable character found
+#   in a .tex file by LineCharacterFindings(), on the assumption that the file
+#   uses a given encoding. Line and Column give its position (counting from 1,
+#   with the column counted in bytes), Codepoint is the value of the character
+#   - the Unicode value if it was a valid UTF-8 sequence - and Replacement is
+#   the equivalent LaTeX sequence, or None if this isn't known. Message()
+#   returns the description of the problem used by CheckCharacters(), or, if
+#   Fixed is passed as True, a description of the character having been
+#   replaced. Result() returns it as a CheckResult, given the name of the
+#   check and of the .tex file.
+
+class CharacterFinding(object):
+
+   __slots__ = ("Encoding","Line","Column","Codepoint","Replacement", \
+                                                                "Description")
+   
+   def __init__(self,Encoding,Line,Column,Codepoint,Replacement,Description) :
+      self.Encoding = Encoding
+      self.Line = Line
+      self.Column = Column
+      self.Codepoint = Codepoint
+      self.Replacement = Replacement
+      self.Description = Description
+      
+   def Message(self,Fixed = False) :
+      if (self.Replacement == None) :
+         Text = self.Description + " in .tex file at line " + \
+                               str(self.Line) + " : LaTeX equivalent unknown"
+      else :
+         Verb = " should be replaced by "
+         if (Fixed) : Verb = " replaced by "
+         Text = self.Description + " in .tex file at line " + \
+                               str(self.Line) + Verb + self.Replacement
+      return Text
+
+   def Result(self,Check,TexFileName) :
+      Fix = ""
+      if (self.Replacement != None) :
+         Fix = "Replace with " + self.Replacement
+      return CheckResult(Check,"warning",self.Message() + " (assuming " + \
+               self.Encoding + " encoding)",TexFileName,self.Line,Fix)
+
+# ------------------------------------------------------------------------------
+
+#               L i n e  C h a r a c t e r  F i n d i n g s
+#
+#   This is the analysis behind CheckCharacters() and FindUnprintable(). It
+#   looks at a single Line from a .tex file for characters that are not in
+#   string.printable, and classifies each of them assuming each of a number
+#   of possible encodings in turn. Findings should be a dictionary, keyed by
+#   encoding name ("ASCII", "Latin1", "MacRoman" or "UTF-8"), each entry being
+#   a list. A CharacterFinding is appended to the appropriate list for each
+#   character found. The line is expected to have each character holding a
+#   single byte value, as is the case if it was decoded as Latin-1. Most lines
+#   have no such characters at all, and a single regular expression search
+#   is enough to show that.
+
+__UnprintablePattern__ = re.compile("[^" + re.escape(string.printable) + "]")
+
+def LineCharacterFindings (Line,LineNumber,Findings) :
+
    NChars = len(Line)
-   Index = 0;
-   while (Index < NChars) :
    
-      Char = Line[Index]
-      if (not Char in string.printable) :
-         Problem = True
-         Num = ord(Char)
+   #  A UTF-8 character takes up more than one byte, and the other bytes
+   #  that make it up are skipped over. NextIndex records, for each encoding,
+   #  the first index that still needs to be looked at.
+   
+   NextIndex = {}
+   for Encoding in Findings : NextIndex[Encoding] = 0
+   
+   for Match in __UnprintablePattern__.finditer(Line) :
+      Index = Match.start()
+      Num = ord(Line[Index])
+      for Encoding in Findings :
+         if (Index < NextIndex[Encoding]) : continue
+         NextIndex[Encoding] = Index + 1
+         LowEncoding = Encoding.lower()
+         Codepoint = Num
          Repl = None
          Descrip = None
-         if (UseAscii) :
+         if (LowEncoding == "ascii") :
             Descrip = "ASCII character (" + hex(Num) + ")"
-         elif (UseLatin1) :
+         elif (LowEncoding == "latin1") :
             Repl = __Latin1_LaTeX_Chars__.get(Num)
             Descrip = "Latin1 character (" + hex(Num) + ")"
-         elif (UseMacRoman) :
+         elif (LowEncoding == "macroman") :
             Repl = __Macintosh_LaTeX_Chars__.get(Num)
             Descrip = "Mac Roman character (" + hex(Num) + ")"
-         elif (UseUnicode) :
+         elif (LowEncoding == "utf-8") :
             (IsUnicode, Unicode, NewIndex) = \
                                      CheckForUTF8Unicode(Line,Index,NChars)
-            Index = NewIndex
             if (IsUnicode) :
+               NextIndex[Encoding] = NewIndex + 1
+               Codepoint = Unicode
                Descrip = "Unicode character U+" + hex(Unicode)[2:]
                Repl = __Unicode_LaTeX_Chars__.get(Unicode)
                if (Repl == None) :
@@ -2492,17 +3440,42 @@ def CheckCharacters (Line,LineNumber,Problems = None,Encoding = "Latin1") :
          if (Descrip == None) :
             Descrip = "Unexpected character (" + hex(Num) + \
                             ") in unexpected encoding (" + Encoding + ")"
-         if (Repl == None) :
-            Text = Descrip + " in .tex file at line " + str(LineNumber) + \
-                                               " : LaTeX equivalent unknown"
-         else :
-            Text = Descrip + " in .tex file at line " + str(LineNumber) + \
-                                             " should be replaced by " + Repl
-         if (BatchMode) : Problems.append(Text)
-         else : print(Text)
-      Index = Index + 1
+         Findings[Encoding].append(CharacterFinding(Encoding,LineNumber, \
+                                             Index + 1,Codepoint,Repl,Descrip))
+
+# ------------------------------------------------------------------------------
+
+#                      F i n d  U n p r i n t a b l e
+#
+#   This checks a complete .tex file for potentially unprintable characters,
+#   for each of a list of possible Encodings, such as that returned by
+#   GetFileEncoding(). The file is read just once, as bytes, and each line
+#   is checked for all the encodings at the same time. Lines that start
+#   with a '%' comment character are ignored, unless IgnoreComments is passed
+#   as False. Nothing is printed. It returns
+#   a dictionary, keyed by encoding, each entry being a list of the
+#   CharacterFinding objects for that encoding, in the order the characters
+#   appear in the file. If the file cannot be read, each list is empty.
+
+def FindUnprintable (TexFileName,Encodings,IgnoreComments = True) :
+
+   Findings = {}
+   for Encoding in Encodings : Findings[Encoding] = []
    
-   return Problem 
+   try :
+      TexFile = open(TexFileName,"rb")
+      Data = TexFile.read()
+      TexFile.close()
+   except :
+      Data = b""
+   
+   LineNumber = 0
+   for LineBytes in Data.splitlines(True) :
+      LineNumber = LineNumber + 1
+      if (not (IgnoreComments and LineBytes.startswith(b"%"))) :
+         LineCharacterFindings(LineBytes.decode("latin-1"),LineNumber,Findings)
+   
+   return Findings
  
 # ------------------------------------------------------------------------------
 
@@ -2632,33 +3605,107 @@ def RunCommand (Command) :
 #  ExtractArchive() is passed the name of an archive file - either a tar or
 #  a zip file - and extracts it into the current directory. If there are any
 #  problems, it returns a string describing the error. Normally, it returns
-#  None.
+#  None. The tarfile and zipfile modules are used to do the extraction, and
+#  member names that would put files outside the current directory are not
+#  allowed. (The 'data' filter for tar files does this, where the version of
+#  Python supports it. zipfile always does this.) The modification dates of
+#  the files extracted from a zip file are set from the archive, as unzip
+#  would have done.
 
 def ExtractArchive (Filename) :
 
    Status = None
    if (Filename.endswith(".tar") or Filename.endswith(".tar.gz") or \
            Filename.endswith(".zip") or Filename.endswith(".tgz")) :
-      
-      #  We're going to use a subprocess command to execute the extraction
-      #  command, so we need to handle any blanks or quote characters in the
-      #  filename. (Actually, this should use the Python archive modules.)
-      
-      AbsFilename = os.path.abspath(Filename)
-      AbsFilename = AbsFilename.replace("'","\\'")
-      AbsFilename = AbsFilename.replace(" ","\\ ")
-      
-      if (AbsFilename.endswith(".zip")) :
-         Command = "unzip " + AbsFilename
-      else :
-         Command = "tar -xf " + AbsFilename
-      Result = RunCommand(Command)
-      if (Result) : Status = Result
+      try :
+         if (Filename.endswith(".zip")) :
+            Archive = zipfile.ZipFile(Filename)
+            for Info in Archive.infolist() :
+               Path = Archive.extract(Info)
+               if (not Info.is_dir()) :
+                  FileTime = ZipMemberTime(Info)
+                  os.utime(Path,(FileTime,FileTime))
+            Archive.close()
+         else :
+            Archive = tarfile.open(Filename)
+            if (hasattr(tarfile,"data_filter")) :
+               Archive.extractall(filter="data")
+            else :
+               Archive.extractall()
+            Archive.close()
+      except (tarfile.TarError,zipfile.BadZipfile,IOError,OSError,EOFError) \
+                                                                 as Error :
+         Status = "Error extracting '" + Filename + "': " + str(Error)
    else :
       Status = "Type of archive file " + Filename + " is unclear"
 
    return Status
 
+# ------------------------------------------------------------------------------
+
+#                       A r c h i v e  M e m b e r s
+#
+#  ArchiveMembers() returns a list describing the contents of an archive
+#  file - a tar file (compressed or not) or a zip file - read straight from
+#  the archive headers, without extracting anything. Each item in the list
+#  is a tuple giving the name of the member (a path using '/' as separator,
+#  with any leading "./" or "/" removed), whether it is a regular file, and
+#  its modification time (in seconds since the epoch). Directories are
+#  included, flagged as not being regular files. So are links, which may
+#  refer to files that don't exist on this system. If the archive cannot be
+#  read, this returns None.
+
+def ArchiveMembers (Filename) :
+
+   Members = []
+   try :
+      if (Filename.endswith(".zip")) :
+         Archive = zipfile.ZipFile(Filename)
+         for Info in Archive.infolist() :
+            Members.append((Info.filename,not Info.is_dir(),\
+                                                  ZipMemberTime(Info)))
+         Archive.close()
+      else :
+         Archive = tarfile.open(Filename)
+         for Info in Archive.getmembers() :
+            Members.append((Info.name,Info.isfile(),float(Info.mtime)))
+         Archive.close()
+   except (tarfile.TarError,zipfile.BadZipfile,IOError,OSError,EOFError) :
+      Members = None
+
+   if (Members != None) :
+      Cleaned = []
+      for Name,IsFile,FileTime in Members :
+         Name = Name.replace("\\","/")
+         while (Name.startswith("./") or Name.startswith("/")) :
+            if (Name.startswith("/")) : Name = Name[1:]
+            else : Name = Name[2:]
+         Name = Name.rstrip("/")
+         if (Name != "" and Name != ".") :
+            Cleaned.append((Name,IsFile,FileTime))
+      Members = Cleaned
+
+   return Members
+
+# ------------------------------------------------------------------------------
+
+#                       Z i p  M e m b e r  T i m e
+#
+#  Returns the modification time, in seconds since the epoch, of a member of
+#  a zip file, given its zipfile.ZipInfo. Like unzip, this uses the time in
+#  the 'extended timestamp' extra field (which is in UTC) if there is one,
+#  and otherwise the standard zip date and time, which are in local time.
+
+def ZipMemberTime (Info) :
+
+   Extra = bytearray(Info.extra)
+   Index = 0
+   while (Index + 4 <= len(Extra)) :
+      HeaderId,Size = struct.unpack("<HH",bytes(Extra[Index:Index + 4]))
+      if (HeaderId == 0x5455 and Size >= 5 and (Extra[Index + 4] & 1)) :
+         return float(struct.unpack("<i",bytes(Extra[Index + 5:Index + 9]))[0])
+      Index = Index + 4 + Size
+   return time.mktime(Info.date_time + (0,0,-1))
 
 # ------------------------------------------------------------------------------
 
@@ -2668,84 +3715,80 @@ def ExtractArchive (Filename) :
 #   since the epoch) of any file contained in the named archive file, which
 #   can be a .tar, .tar.gz or a .zip file.  If it cannot determine the date
 #   it returns None. Optionally, it can also be passed a list to which will
-#   be added the names of all the files in the archive.
+#   be added the names of all the files in the archive. The details come
+#   from the archive headers, using ArchiveMembers(), so nothing needs to be
+#   extracted. The results for each archive are remembered, keyed by its
+#   path, size and modification date, so looking at the same archive again
+#   is almost free. This routine can safely be called from multiple threads.
+
+__ArchiveTimes__ = {}
 
 def GetArchiveTime (Filename,FileList = None) :
 
    LatestTime = None
    if (Filename.endswith(".tar") or Filename.endswith(".tar.gz") or \
            Filename.endswith(".zip") or Filename.endswith(".tgz")) :
-      
-      #  Remember the current directory and the absolute path of the file
-      #  we've been passed (which may have been a relative name)
-         
-      OriginalDir = os.getcwd()
-      AbsFilename = os.path.abspath(Filename)
-      AbsFilename = AbsFilename.replace("'","\\'")
-      AbsFilename = AbsFilename.replace(" ","\\ ")
-      
-      #  Create a temporary directory for the files in the archive, move
-      #  to it and copy the archive files into it. (This is slower but more
-      #  reliable than trying to interpret the output from commands like
-      #  "tar -tvf") (This code should now use the newer ExtractArchive()
-      #  routine.)
-      
-      TempDir = tempfile.mkdtemp()
-      os.chdir(TempDir)
-      if (AbsFilename.endswith(".zip")) :
-         Proc = os.popen("unzip " + AbsFilename)
-      else :   
-         Proc = os.popen("tar -xf " + AbsFilename)
-      Proc.close()
-      
-      #  Now we'll go through all the files looking at the dates. One
+
+      try :
+         Stat = os.stat(Filename)
+         Key = (os.path.abspath(Filename),Stat.st_size,Stat.st_mtime)
+      except OSError :
+         Key = None
+      if (Key != None and Key in __ArchiveTimes__) :
+         LatestTime,FilesInDir = __ArchiveTimes__[Key]
+         if (FileList != None) : FileList.extend(FilesInDir)
+         return LatestTime
+
+      Members = ArchiveMembers(Filename)
+      if (Members == None) : Members = []
+
+      #  We look at the files at the top level of the archive. One
       #  complication - the top level of the archive may be a single
       #  directory which itself holds the files. If so, we dive into that
       #  intermediate directory. (It would probably be better to do a 
       #  recursive search through the whole of the directory.) Also ignore
-      #  the __MACOSX files that sometimes end up in OS X archives.
+      #  the __MACOSX files that sometimes end up in OS X archives. Note that
+      #  an archive need not include entries for its directories, so a name
+      #  is taken to be a directory if anything in the archive is inside it.
       
-      FilesInDir = os.listdir(".")
+      TopNames = []
+      Directories = set()
+      for Name,IsFile,FileTime in Members :
+         Parts = Name.split("/")
+         if (not Parts[0] in TopNames) : TopNames.append(Parts[0])
+         if (len(Parts) > 1 or not IsFile) : Directories.add(Parts[0])
       FileCount = 0
-      IntermediateDir = ""
       LastFile = ""
-      for File in FilesInDir :
-         if (not File.startswith('.') and File != "__MACOSX") :
-            LastFile = File
+      for Name in TopNames :
+         if (not Name.startswith('.') and Name != "__MACOSX") :
+            LastFile = Name
             FileCount = FileCount + 1
-      if (FileCount == 1) :
-         IntermediateDir = os.path.abspath(LastFile)
-         if (os.path.isdir(IntermediateDir)) :
-            os.chdir(IntermediateDir)
-            FilesInDir = os.listdir(".") 
-            
-      #  Now look at the modification dates of all the files. (The test for
-      #  exists() is because a file may be a link to a file that does not
-      #  exist on this system.) And directories will have the current date,
-      #  and we don't expect them anyway.
-              
-      First = True
-      for File in FilesInDir :
-         if (os.path.exists(File)) :
-            if (not os.path.isdir(File)) :
-               FileTime = os.stat(File).st_mtime
-               if (First) :
-                  LatestTime = FileTime
-                  First = False
-               else :
-                  if (FileTime > LatestTime) : LatestTime = FileTime
+      Prefix = ""
+      if (FileCount == 1 and LastFile in Directories) :
+         Prefix = LastFile + "/"
+      
+      #  Now look at the modification dates of all the files at that level.
+      #  Directories and links are ignored - a link may be to a file that
+      #  does not exist on this system.
+      
+      FilesInDir = []
+      for Name,IsFile,FileTime in Members :
+         if (Prefix == "" or Name.startswith(Prefix)) :
+            Name = Name[len(Prefix):]
+            if (Name != "") :
+               Slash = Name.find("/")
+               if (Slash >= 0) : Name = Name[:Slash]
+               if (not Name in FilesInDir) : FilesInDir.append(Name)
+               if (Slash < 0 and IsFile) :
+                  if (LatestTime == None or FileTime > LatestTime) :
+                     LatestTime = FileTime
                
       #  If the caller passed us a file list, add the file names to it.
       
       if (FileList != None) :
          FileList.extend(FilesInDir)
+      if (Key != None) : __ArchiveTimes__[Key] = (LatestTime,FilesInDir)
          
-      #  Cleaup up after outselves, and return to the directory we started from.
-      
-      if (TempDir != "") :
-         Proc = os.popen("rm -rf " + TempDir)
-         Proc.close()
-      os.chdir(OriginalDir)
    return LatestTime
    
 # ------------------------------------------------------------------------------
@@ -2756,69 +3799,121 @@ def GetArchiveTime (Filename,FileList = None) :
 #   the directory passed as Path. It looks for any file that might be an 
 #   archive file for the paper whose name is passed as Paper. That is, any
 #   .tar, .tar.gz or .zip file whose name contains the paper name in some
-#   way. It returns a list of the paths of each candidate file, relative to
-#   the current directory.
+#   way (see ArchivePattern()). It returns a list of the paths of each
+#   candidate file, relative to the current directory. The directories are
+#   read using os.scandir(), in the same order that os.walk() would use, and
+#   symbolic links to directories are not followed.
 
 def GetArchiveList (Path,Paper) :
 
-   #  ArchiveWalkCallback() is a nested callback routine that does most of 
-   #  the work. It's nested because that's the easiest way for it to get
-   #  access to Paper. It gets called for each directory in Path with DirPath
-   #  as the directory path and FileList a list of files in the directory. It
-   #  adds any candidate files to the list passed as ArchivePath. (This
-   #  structure dates back to Python2 days, when this actually was a routine
-   #  called back from os.path.walk(). Now we use os.walk() instead, and the
-   #  structure could be rather simpler.)
-    
-   def ArchiveWalkCallback(ArchiveList,DirPath,FileList) :
-      for File in FileList :
-         if (File.endswith(".tar") or File.endswith(".tar.gz") \
+   #  ScanDirectory() is a nested routine that does most of the work. It's
+   #  nested because that's the easiest way for it to get access to Pattern
+   #  and ArchiveList. It looks at each entry in the directory DirPath, adds
+   #  any candidate files to ArchiveList, and then calls itself for each of
+   #  the sub-directories.
+   
+   def ScanDirectory(DirPath) :
+      SubDirs = []
+      try :
+         Entries = list(os.scandir(DirPath))
+      except OSError :
+         Entries = []
+      for Entry in Entries :
+         File = Entry.name
+         if (Entry.is_dir()) :
+            if (not Entry.is_symlink()) : SubDirs.append(Entry.path)
+         elif (File.endswith(".tar") or File.endswith(".tar.gz") \
                                                or File.endswith(".zip")) :
-            Match = False
-            Filelower = File.lower()
-            Paperlower = Paper.lower()
-            
-            #  The basic test is to see if the paper name appears in the file
-            #  name - as a case-insensitive test.
-            
-            if (Filelower.find(Paperlower) >= 0) :
-               Match = True
-            else :
-            
-               #  Some people call their files O1.4 instead of O1_4, so we
-               #  check for that.
-               
-               if (Filelower.find(Paperlower.replace('-','.')) >= 0) :
-                  Match = True
-               else :
-               
-                  #  And some people miss leading zeros from paper numbers,
-                  #  using P71 instead of P071.
-                  
-                  if (Paperlower.startswith("p00")) :
-                     if (Filelower.find(Paperlower.replace('p00','p')) >= 0) :
-                        Match = True
-                  elif (Paperlower.startswith("p0")) :
-                     if (Filelower.find(Paperlower.replace('p0','p')) >= 0) :
-                        Match = True
-            if (Match) :
-               FilePath = os.path.join(DirPath,File)
-               ArchiveList.append(FilePath)
-   
-   #  This is the main body of GetArchiveList(). Walk through the supplied
-   #  directory structure, calling ArchiveWalkCallback() for each directory 
-   #  it contains. This used to use os.path.walk, but this was removed from
-   #  Python 3.
-              
+            if (Pattern.search(File.lower())) :
+               ArchiveList.append(os.path.join(DirPath,File))
+      for SubDir in SubDirs :
+         ScanDirectory(SubDir)
+   
+   Pattern = ArchivePattern(Paper)
    ArchiveList = []
-   os.path.walk(Path,ArchiveWalkCallback,ArchiveList)
-   for Details in os.walk(Path) :
-      ArchiveWalkCallback(ArchiveList,Details[0],Details[2])
+   ScanDirectory(Path)
    
    return ArchiveList
 
 # ------------------------------------------------------------------------------
 
+#                        A r c h i v e  P a t t e r n
+#
+#   Returns a compiled regular expression that matches the (lower case) name
+#   of any file that might be an archive for the paper whose name is passed as
+#   Paper. The basic test is to see if the paper name appears in the file
+#   name - as a case-insensitive test. Some people call their files O1.4
+#   instead of O1_4, so we check for that. And some people miss leading zeros
+#   from paper numbers, using P71 instead of P071. The pattern for each paper
+#   is only compiled once.
+
+__ArchivePatterns__ = {}
+
+def ArchivePattern (Paper) :
+
+   Pattern = __ArchivePatterns__.get(Paper)
+   if (Pattern == None) :
+      Paperlower = Paper.lower()
+      Variants = [Paperlower,Paperlower.replace('-','.')]
+      if (Paperlower.startswith("p00")) :
+         Variants.append(Paperlower.replace('p00','p'))
+      elif (Paperlower.startswith("p0")) :
+         Variants.append(Paperlower.replace('p0','p'))
+      Pattern = re.compile('|'.join([re.escape(Variant) \
+                                                 for Variant in Variants]))
+      __ArchivePatterns__[Paper] = Pattern
+   return Pattern
+
+# ------------------------------------------------------------------------------
+
+#                      G e t  A r c h i v e  T i m e s
+#
+#   GetArchiveTimes() is passed a list of archive files, such as that returned
+#   by GetArchiveList(), and returns a dictionary giving the result of
+#   GetArchiveTime() for each of them, keyed by the names in the list. The
+#   archives are looked at in parallel using a pool of Jobs threads (the
+#   default is the concurrent.futures default) - most of the time goes in
+#   reading and decompressing the archives, which doesn't hold up the other
+#   threads.
+
+def GetArchiveTimes (ArchiveList,Jobs = None) :
+
+   Times = {}
+   Executor = concurrent.futures.ThreadPoolExecutor(max_workers = Jobs)
+   for Archive,Time in zip(ArchiveList,\
+                                Executor.map(GetArchiveTime,ArchiveList)) :
+      Times[Archive] = Time
+   Executor.shutdown()
+
+   return Times
+
+# ------------------------------------------------------------------------------
+
+#                     G e t  L a t e s t  A r c h i v e
+#
+#   Looks in the tree whose root is the directory passed as Path for any
+#   archive files for the paper whose name is passed as Paper, and returns the
+#   one containing the most recently modified files - usually the latest
+#   revision submitted. If no suitable archive is found, this returns an empty
+#   string. Jobs is passed on to GetArchiveTimes().
+
+def GetLatestArchive (Path,Paper,Jobs = None) :
+
+   LatestArchive = ""
+   LatestTime = None
+   ArchiveList = GetArchiveList(Path,Paper)
+   Times = GetArchiveTimes(ArchiveList,Jobs)
+   for Archive in ArchiveList :
+      Time = Times[Archive]
+      if (Time != None) :
+         if (LatestTime == None or Time > LatestTime) :
+            LatestTime = Time
+            LatestArchive = Archive
+
+   return LatestArchive
+
+# ------------------------------------------------------------------------------
+
 #                         C o l l a p s e  D i r
 #
 #  Often, an archive will turn out not to have all the files for a paper
@@ -3005,10 +4100,10 @@ def LocateTexFile (PaperID = None, Details = None, Single = False) :
       PaperFiles = []
       for File in Files :
          Ignore = []
-         Authors = GetAuthors(None,Ignore,File)
+         Authors = GetAuthors(None,Ignore,File,True)
          if (len(Authors) > 0) :
             Surname = AuthorSurname(Authors[0])
-            Title = GetTitle(None,Ignore,File)
+            Title = GetTitle(None,Ignore,File,True)
             if (Title != "") :
                if (Report) :
                   Details.append("File " + File + " appears to be a paper by " \
@@ -3036,15 +4131,61 @@ def LocateTexFile (PaperID = None, Details = None, Single = False) :
 
 # ------------------------------------------------------------------------------
 
+#                      P a p e r  D i r e c t o r i e s
+#
+#  Returns a sorted list of the directories under VolumeDir, the top level
+#  directory for an ADASS volume, that seem to hold the files for a paper -
+#  that is, any directory that contains a .tex file. Once a directory has
+#  been found to hold a paper, its sub-directories are not searched. The top
+#  level directory itself is never treated as a paper directory, and hidden
+#  directories, the __MACOSX directories left by some archives and the
+#  Author_Template directory (which has the template .tex file) are ignored.
+#  Within each paper directory, LocateTexFile() can be used to find the main
+#  .tex file.
+
+def PaperDirectories (VolumeDir) :
+
+   PaperDirs = []
+   TopDir = os.path.abspath(VolumeDir)
+   Pending = [TopDir]
+   while (len(Pending) > 0) :
+      Directory = Pending.pop()
+      SubDirs = []
+      HasTexFile = False
+      try :
+         Entries = list(os.scandir(Directory))
+      except OSError :
+         Entries = []
+      for Entry in Entries :
+         Name = Entry.name
+         if (Name.startswith('.') or Name == "__MACOSX" or \
+                                            Name == "Author_Template") :
+            continue
+         if (Entry.is_dir()) :
+            SubDirs.append(Entry.path)
+         elif (Name.endswith(".tex")) :
+            HasTexFile = True
+      if (HasTexFile and Directory != TopDir) :
+         PaperDirs.append(Directory)
+      else :
+         Pending.extend(SubDirs)
+   PaperDirs.sort()
+   return PaperDirs
+
+# ------------------------------------------------------------------------------
+
 #                   P a c k a g e  S c a n  C a l l b a c k
 #
 #   Used as the callback routine for the TexScanner when it is used to scan
 #   the .tex file for any packages used. Words are the components of a LaTeX
 #   directive parsed by the TexScanner. If this is a "\usepackage" directive,
 #   this parses the arguments to that directive and checks to see if any of
-#   these are non-standard packages. StandardList is a list of any standard
-#   packages found, to which this routine appends. Similarly, NonStandard is
-#   a list of any non-standard packages found. In fact, no .tex file should
+#   these are non-standard packages. Packages should be a list of two lists.
+#   The first is StandardList, a list of any standard packages found, to which
+#   this routine appends. Similarly, the second is NonStandard, a list of any
+#   non-standard packages found. If a dictionary is passed as Lines, the line
+#   of the directive is added to it for each package not already in it, keyed
+#   by name. In fact, no .tex file should
 #   need any \usepackage directives, other than \usepackage{asp2014} as that
 #   the standard package itself includes all the standard packages.
 
@@ -3052,8 +4193,11 @@ __StandardPackages__ = \
    {"array","txfonts","ifthen","lscape","index","graphicx","asmsymb", \
     "wrapfig","chapterbib","url","ncccropmark","watermark"}
 
-def PackageScanCallback(Words,StandardList,NonStandard) :
+def PackageScanCallback(Words,Packages,Lines) :
 
+   StandardList = Packages[0]
+   NonStandard = Packages[1]
+   
    NumberWords = len(Words)
    if (NumberWords > 1) :
       if (Words[0] == "\\usepackage") :
@@ -3072,6 +4216,8 @@ def PackageScanCallback(Words,StandardList,NonStandard) :
                            StandardList.append(Package)
                         else :
                            NonStandard.append(Package)
+                        if (Lines != None) :
+                           Lines.setdefault(Package,Words.Line)
 
 # ------------------------------------------------------------------------------
 
@@ -3086,14 +4232,16 @@ def PackageScanCallback(Words,StandardList,NonStandard) :
 # 
 #   To allow this to be used for preliminary checking, where the main .tex
 #   file has been misnamed, the actual .tex file name can be supplied as
-#   an optional argument. The final optional Problems argument allows this to
+#   an optional argument. The optional Problems argument allows this to
 #   be used in batch mode, where direct output from this routine is suppressed
 #   and instead a set of report lines are added to the list of problems passed.
+#   If a list is passed as Results, a CheckResult is added to it for each
+#   package used, giving the line that includes it and a suggested fix.
 #
 #   This routine returns True if everything looks OK, False otherwise.
 
 
-def CheckPackages (Paper,TexFileName = "",Problems = None) :
+def CheckPackages (Paper,TexFileName = "",Problems = None,Results = None) :
    
    ReturnOK = True
    
@@ -3101,6 +4249,7 @@ def CheckPackages (Paper,TexFileName = "",Problems = None) :
    if (Problems != None) : BatchMode = True
    
    if (TexFileName == "") : TexFileName = Paper + ".tex"
+   ResultFileName = TexFileName
    TexFileName = os.path.abspath(TexFileName)
    if (not os.path.exists(TexFileName)) :
       Problem = "Cannot find main .tex file: " + TexFileName
@@ -3111,22 +4260,31 @@ def CheckPackages (Paper,TexFileName = "",Problems = None) :
 
       #  Now get a list of the packages from the .tex file.
 
-      TexFile = open(TexFileName,mode='r')
-      TheScanner = TexScanner.TexScanner()
-      TheScanner.SetFile(TexFile)
-      
-      #  GetNextTexCommand() will call PackageScanCallback for each command it
-      #  finds in the file, and PackageScanCallback will check the command
-      #  and add any packages to one of the two lists.
+      #  The dispatcher will call PackageScanCallback for each \usepackage
+      #  command in the file, and PackageScanCallback will check the command
+      #  and add any packages to one of the two lists, and the line that
+      #  includes each of them to PackageLines.
       
-      Finished = False
       StandardList = []
       NonStandard = []
-      while (not Finished) :
-         Finished =  TheScanner.GetNextTexCommand(PackageScanCallback,\
-                                                   StandardList,NonStandard)
-                                                         
-      TexFile.close()
+      PackageLines = {}
+      Dispatcher = TexScanner.TexDispatcher()
+      Dispatcher.Register(PackageScanCallback,(StandardList,NonStandard),\
+                                           PackageLines,["\\usepackage"])
+      ScanTexFile(TexFileName,Dispatcher)
+      
+      if (Results != None) :
+         for Package in StandardList :
+            Results.append(CheckResult("Packages","note", \
+               "Standard package " + Package + " is included",ResultFileName, \
+               PackageLines.get(Package,0),"Remove " + Package + \
+                      " from the \\usepackage directive - asp2014 includes it"))
+         for Package in NonStandard :
+            Results.append(CheckResult("Packages","warning", \
+               "Non-standard package " + Package + " is included", \
+               ResultFileName,PackageLines.get(Package,0),"Remove " + \
+                  Package + " from the \\usepackage directive if the " + \
+                                               "paper can do without it"))
       
       if (len(StandardList) > 0) :
          if (not BatchMode) :
@@ -3170,18 +4328,21 @@ def CheckPackages (Paper,TexFileName = "",Problems = None) :
 #   it has found. Since any paper should only include one \markboth directive,
 #   after the paper has been scanned, Notes should contain exactly two strings. 
 #   If Notes is empty, no \markboth has been found, If it contains more than
-#   two strings, some problem has been found.
+#   two strings, some problem has been found. Lines is either None or a list
+#   to which the line of the \markboth directive is added for each string
+#   added to Notes.
 
-def RunningHeadsCallback(Words,Notes,Unused) :
+def RunningHeadsCallback(Words,Notes,Lines) :
 
    NumberWords = len(Words)
    if (NumberWords > 1) :
       if (Words[0] == "\\markboth") :
          if (len(Notes) > 0) :
             Problem = "Paper contains multiple \\markboth directives"
+            Notes.append(Problem)
          if (NumberWords != 3) :
             Problem = "\\markboth directive has wrong number of arguments"
-            Problems.append(Problem)
+            Notes.append(Problem)
          else :
             Authors = Words[1].strip('{}')
             Title = Words[2].strip('{}')
@@ -3207,6 +4368,8 @@ def RunningHeadsCallback(Words,Notes,Unused) :
             if (Authors == Title) :
                Problem = "Paper title is the same as the author list"
                Notes.append(Problem)
+         if (Lines != None) :
+            Lines.extend([Words.Line] * (len(Notes) - len(Lines)))
                
 # ------------------------------------------------------------------------------
 
@@ -3222,7 +4385,9 @@ def RunningHeadsCallback(Words,Notes,Unused) :
 #   issues that have been seen. The final optional Problems argument allows
 #   this to be used in batch mode, where direct output from this routine is
 #   suppressed and instead a set of report lines are added to the list of
-#   problems passed.
+#   problems passed. If a list is passed as Results, a CheckResult is added
+#   to it for each problem, giving the line of the \markboth directive and a
+#   suggested fix where there is an obvious one.
 # 
 #   To allow this to be used for preliminary checking, where the main .tex
 #   file has been misnamed, the actual .tex file name can be supplied as
@@ -3230,8 +4395,25 @@ def RunningHeadsCallback(Words,Notes,Unused) :
 #
 #   This routine returns True if everything looks OK, False otherwise.
 
-
-def CheckRunningHeads (Paper,TexFileName = "",Problems = None) :
+__RunningHeadsFixes__ = {
+   "Author list is unchanged from the template" :
+      "Give the authors' names in the first argument of \\markboth",
+   "Author list is blank" :
+      "Give the authors' names in the first argument of \\markboth",
+   "Paper title is unchanged from an out-of-date template" :
+      "Give a short title for the paper in the second argument of \\markboth",
+   "Paper title is unchanged from the template" :
+      "Give a short title for the paper in the second argument of \\markboth",
+   "Paper title is blank" :
+      "Give a short title for the paper in the second argument of \\markboth",
+   "Paper title is the same as the author list" :
+      "Give a short title for the paper in the second argument of \\markboth",
+   "Paper contains multiple \\markboth directives" :
+      "Remove all but one of the \\markboth directives",
+   "\\markboth directive has wrong number of arguments" :
+      "Give \\markboth two arguments, {authors}{short title}"}
+
+def CheckRunningHeads (Paper,TexFileName = "",Problems = None,Results = None) :
    
    ReturnOK = True
    
@@ -3239,6 +4421,7 @@ def CheckRunningHeads (Paper,TexFileName = "",Problems = None) :
    if (Problems != None) : BatchMode = True
    
    if (TexFileName == "") : TexFileName = Paper + ".tex"
+   ResultFileName = TexFileName
    TexFileName = os.path.abspath(TexFileName)
    if (not os.path.exists(TexFileName)) :
       Problem = "Cannot find main .tex file: " + TexFileName
@@ -3249,21 +4432,14 @@ def CheckRunningHeads (Paper,TexFileName = "",Problems = None) :
 
       #  Now set up to check the .tex file.
 
-      TexFile = open(TexFileName,mode='r')
-      TheScanner = TexScanner.TexScanner()
-      TheScanner.SetFile(TexFile)
-      
-      #  GetNextTexCommand() will call RunningHeadsCallback for each command it
-      #  finds in the file, and RunningHeadsCallback will check the command
-      #  and will process any \markboth directive it finds.
+      #  The dispatcher will call RunningHeadsCallback for each \markboth
+      #  command in the file, and RunningHeadsCallback will process it.
       
-      Finished = False
       Notes = []
-      while (not Finished) :
-         Finished =  TheScanner.GetNextTexCommand(RunningHeadsCallback,\
-                                                               Notes,None)
-                                                         
-      TexFile.close()
+      NoteLines = []
+      Dispatcher = TexScanner.TexDispatcher()
+      Dispatcher.Register(RunningHeadsCallback,Notes,NoteLines,["\\markboth"])
+      ScanTexFile(TexFileName,Dispatcher)
       
       #  See comments for RunningHeadsCallback() for details of how it handles
       #  Notes. Essentially, if all is well, Notes will have two entries,
@@ -3281,6 +4457,10 @@ def CheckRunningHeads (Paper,TexFileName = "",Problems = None) :
             Problem = TexFileName + " has no \\markboth directive"
             if (BatchMode) : Problems.append(Problem)
             else : print("**",Problem,"**")
+            if (Results != None) :
+               Results.append(CheckResult("RunningHeads","error", \
+                  "No \\markboth directive",ResultFileName,0, \
+                  "Add \\markboth{authors}{short title} after \\title"))
          else :
             Problem = TexFileName + \
              " has problems with the running heads specified using \\markboth:"
@@ -3289,6 +4469,12 @@ def CheckRunningHeads (Paper,TexFileName = "",Problems = None) :
             for Note in Notes :
                if (BatchMode) : Problems.append(Note)
                else : print("   ",Note)
+            if (Results != None) :
+               for Index,Note in enumerate(Notes) :
+                  if (Note in __RunningHeadsFixes__) :
+                     Results.append(CheckResult("RunningHeads","error", \
+                                   Note,ResultFileName,NoteLines[Index], \
+                                               __RunningHeadsFixes__[Note]))
       if (not BatchMode) : print("")
 
    return ReturnOK
@@ -3326,9 +4512,12 @@ def TitleCallback(Words,Titles,Unused) :
 #   a brief description of anything possibly amiss that it comes across when
 #   searching for the title. If it doesn't find a title, for example, it will
 #   return an empty string and will say so in Notes. If it finds multiple
-#   titles, it will return the first and mention this in notes.
+#   titles, it will return the first and mention this in notes. If FirstOnly
+#   is True, the search stops at the first title, which is quicker if all
+#   that is wanted is to see if the file has a title at all, but means that
+#   multiple titles are not noticed.
 
-def GetTitle (Paper,Notes,TexFileName = "") :
+def GetTitle (Paper,Notes,TexFileName = "",FirstOnly = False) :
 
    Title = ""
    Titles = []
@@ -3341,20 +4530,17 @@ def GetTitle (Paper,Notes,TexFileName = "") :
 
       #  Now get a list of any title entries from the .tex file.
 
-      TexFile = open(TexFileName,mode='r')
-      TheScanner = TexScanner.TexScanner()
-      TheScanner.SetFile(TexFile)
-      
-      #  GetNextTexCommand() will call TitleCallback for each command it
-      #  finds in the file, and TitleCallback will check the command
-      #  and add any title to Titles.
+      #  The dispatcher will call TitleCallback for each \title command
+      #  in the file, and TitleCallback will add the title to Titles.
       
-      Finished = False
-      while (not Finished) :
-         Finished =  TheScanner.GetNextTexCommand(TitleCallback,\
-                                                      Titles,None)
-      
-      TexFile.close()
+      if (FirstOnly) :
+         for Command in IterTexCommands(TexFileName,["\\title"]) :
+            TitleCallback(Command,Titles,None)
+            if (len(Titles) > 0) : break
+      else :
+         Dispatcher = TexScanner.TexDispatcher()
+         Dispatcher.Register(TitleCallback,Titles,None,["\\title"])
+         ScanTexFile(TexFileName,Dispatcher)
 
       NumberTitles = len(Titles)
       if (NumberTitles == 1) :
@@ -3376,14 +4562,16 @@ def GetTitle (Paper,Notes,TexFileName = "") :
 #   Used as the callback routine for the TexScanner when it is used to scan
 #   the .tex file to see if any references use the old \cite directive. For
 #   more details, see RefScanCallback(). This routine adds to CiteRefs the
-#   names of any references cited using \cite..
+#   names of any references cited using \cite.. Lines is either None or a
+#   list to which the line of each such \cite is added.
 
-def CiteCallback (Words,CiteRefs,Unused) :
+def CiteCallback (Words,CiteRefs,Lines) :
 
    if (len(Words) > 0) :
       if (Words[0] == "\\cite") :
          Refs = ExtractRefs(Words)
          CiteRefs.append(Refs)
+         if (Lines != None) : Lines.append(Words.Line)
             
 # ------------------------------------------------------------------------------
 
@@ -3396,14 +4584,16 @@ def CiteCallback (Words,CiteRefs,Unused) :
 # 
 #   To allow this to be used for preliminary checking, where the main .tex
 #   file has been misnamed, the actual .tex file name can be supplied as
-#   an optional argument. The final optional Problems argument allows this to
+#   an optional argument. The optional Problems argument allows this to
 #   be used in batch mode, where direct output from this routine is suppressed
 #   and instead a set of report lines are added to the list of problems passed.
+#   If a list is passed as Results, a CheckResult is added to it for each
+#   \cite, giving its line and the \citep that should replace it.
 #
 #   This routine returns True if everything looks OK, False otherwise.
 
 
-def CheckCite (Paper,TexFileName = "",Problems = None) :
+def CheckCite (Paper,TexFileName = "",Problems = None,Results = None) :
    
    BatchMode = False
    if (Problems != None) : BatchMode = True
@@ -3411,6 +4601,7 @@ def CheckCite (Paper,TexFileName = "",Problems = None) :
    ReturnOK = True
    
    if (TexFileName == "") : TexFileName = Paper + ".tex"
+   ResultFileName = TexFileName
    TexFileName = os.path.abspath(TexFileName)
    if (not os.path.exists(TexFileName)) :
       Problem = "Cannot find main .tex file: " + TexFileName
@@ -3421,20 +4612,22 @@ def CheckCite (Paper,TexFileName = "",Problems = None) :
 
       #  Now set up to check the .tex file.
 
-      TexFile = open(TexFileName,mode='r')
-      TheScanner = TexScanner.TexScanner()
-      TheScanner.SetFile(TexFile)
+      #  The dispatcher will call CiteCallback for each \cite command in
+      #  the file, and CiteCallback will add the references it cites to
+      #  CiteRefs.
       
-      #  GetNextTexCommand() will call CiteCallback for each command it
-      #  finds in the file, and CiteCallback will check the command
-      #  and will add any reference cited using \cite to CiteRefs..
-      
-      Finished = False
       CiteRefs = []
-      while (not Finished) :
-         Finished =  TheScanner.GetNextTexCommand(CiteCallback,CiteRefs,None)
-                                                         
-      TexFile.close()
+      CiteLines = []
+      Dispatcher = TexScanner.TexDispatcher()
+      Dispatcher.Register(CiteCallback,CiteRefs,CiteLines,["\\cite"])
+      ScanTexFile(TexFileName,Dispatcher)
+      
+      if (Results != None) :
+         for Index,Ref in enumerate(CiteRefs) :
+            Results.append(CheckResult("Cite","error", \
+               "Reference " + Ref + " is cited using \\cite",ResultFileName, \
+               CiteLines[Index],"Use \\citep{" + Ref + "} or \\citet{" + \
+                                                          Ref + "} instead"))
       
       if (len(CiteRefs) > 0) :
          Problem = "The .tex file cites the following references using \cite:"
@@ -3786,26 +4979,45 @@ def SubjectIndexEntries (Paper,IgnoreThese = None,TexFileName = "") :
       print("Cannot find main .tex file",TexFileName)
    else :
 
-      #  Ideally, we'd use a TexScanner to parse subject index entries
-      #  properly, but unfortunately TexScanner ignores commented out lines,
-      #  and this is one case where we don't want to do this. Fortunately,
-      #  because of the commening aspects of these entries, they really
-      #  do have to be on separate lines, and \ssindex only takes one
-      #  argument, so parsing the file directly is fairly easy.
+      #  The entries themselves are found by FindSubjectIndexEntries(),
+      #  via the .tex file cache.
 
-      TexFile = open(TexFileName,mode='r')
-      for Line in TexFile :
-         Line = Line.strip()
-         if (Line.startswith("\\ssindex") or Line.startswith("%\\ssindex")) :
-            LBrace = Line.find('{')
-            if (LBrace > 0) :
-               RBrace = Line.find('}')
-               if (RBrace > LBrace) :
-                  Entry = Line[LBrace + 1:RBrace]
-                  if (IgnoreThese) :
-                     if (not Entry in IgnoreThese) :
-                        Entries.append(Entry)
-      TexFile.close()
+      for Entry in CachedTexProduct(TexFileName,"SubjectIndex",\
+                                               FindSubjectIndexEntries) :
+         if (not IgnoreThese or not Entry in IgnoreThese) :
+            Entries.append(Entry)
+
+   return Entries
+
+# ------------------------------------------------------------------------------
+
+#                F i n d  S u b j e c t  I n d e x  E n t r i e s
+#
+#   Returns a list of all the \ssindex entries, commented out or not, in the
+#   named .tex file. This is the part of SubjectIndexEntries() that depends
+#   only on the contents of the file, so its results can be cached.
+
+def FindSubjectIndexEntries (TexFileName) :
+
+   Entries = []
+
+   #  Ideally, we'd use a TexScanner to parse subject index entries
+   #  properly, but unfortunately TexScanner ignores commented out lines,
+   #  and this is one case where we don't want to do this. Fortunately,
+   #  because of the commening aspects of these entries, they really
+   #  do have to be on separate lines, and \ssindex only takes one
+   #  argument, so parsing the file directly is fairly easy.
+
+   TexFile = open(TexFileName,mode='r')
+   for Line in TexFile :
+      Line = Line.strip()
+      if (Line.startswith("\\ssindex") or Line.startswith("%\\ssindex")) :
+         LBrace = Line.find('{')
+         if (LBrace > 0) :
+            RBrace = Line.find('}')
+            if (RBrace > LBrace) :
+               Entries.append(Line[LBrace + 1:RBrace])
+   TexFile.close()
 
    return Entries
 
@@ -17,11 +17,20 @@
 #
 #  Usage:
 #     FixUnprintable filename <encoding>
+#     FixUnprintable --batch directory <encoding> <jobs>
 #
 #     where filename is the name of the .tex file in question, and encoding is
 #     an optional argument that can be used to tell the script what encoding
 #     should be assumed for the file.
 #
+#     With --batch, the main .tex file for each paper in the directory tree is
+#     fixed, the papers being processed in parallel by a pool of processes.
+#     (Each directory with a .tex file in it is taken to be a paper - see
+#     AdassChecks.PaperDirectories().) jobs is the number of processes to use,
+#     by default one for each processor. Any paper whose encoding is ambiguous
+#     is left unchanged, and listed at the end, unless an encoding is given
+#     explicitly - in which case it is used for all the papers.
+#
 #  If unprintable characters are found in the file, a new version of the file
 #  will be created in which those unprintable characters that can be fixed
 #  have been fixed, and the original file is renamed.
@@ -47,11 +56,20 @@
 #     23rd Nov 2018. Converted to run under Python3, using 2to3. Added
 #                    the importing of items from __future__ to allow this to
 #                    run under either Python2 or Python3. KS.
+#     18th Oct 2026. The file is now fixed in a single pass, by FixFile(),
+#                    translating its contents using a table from
+#                    AdassChecks.FixTranslationTable(). The new version is
+#                    written to a temporary file that is then renamed to
+#                    replace the original, which is kept through a hard link
+#                    (or a copy), so the .tex file is never missing.
+#                    NextVersion() now lists the directory once instead of
+#                    checking for each possible name in turn. Added the
+#                    --batch option. This code now needs Python 3.
 #
 #  Python versions:
-#     This code should run under either python 2 or python 3, so long as
-#     the python 2 version supports the "from __future__ import" used here.
-#     It has been tested under 2.7 and 3.6.
+#     This code needs python 3 (at least 3.4, for os.replace(), the
+#     "surrogateescape" error handler, concurrent.futures and
+#     contextlib.redirect_stdout()). It no longer runs under python 2.
 #
 
 from __future__ import (print_function,division,absolute_import)
@@ -59,142 +77,282 @@ from __future__ import (print_function,division,absolute_import)
 import os
 import sys
 import string
+import io
+import contextlib
+import traceback
+import tempfile
+import shutil
+import concurrent.futures
 
 import AdassChecks
 
+# ------------------------------------------------------------------------------
+
+#                         N e x t  V e r s i o n
+#
+#   Returns the first name of the form FileName_1, FileName_2 etc. that
+#   isn't already in use. The directory is listed just once.
+
 def NextVersion (FileName) :
-   NextVersion = FileName + '_1'
+   Directory = os.path.dirname(FileName)
+   if (Directory == "") : Directory = "."
+   Names = set(os.listdir(Directory))
+   Base = os.path.basename(FileName)
    Number = 1
-   while (os.path.exists(NextVersion)) :
+   while (Base + '_' + str(Number) in Names) :
       Number = Number + 1
-      NextVersion = FileName + '_' + str(Number)
-   return NextVersion
-
-#  Defaults
-
-UseAscii = False
-UseMacRoman = False
-UseLatin1 = False
-UseUtf8 = False
-CheckEncoding = True
-ArgsValid = True
-
-#  First, just check we have the necessary filename, and see if an encoding
-#  was specified.
-
-NumberArgs = len(sys.argv)
-if (NumberArgs < 2) :
-   print("Usage: FixUnprintable filename <encoding>")
-   print("eg: FixUnprintable P10-3.tex")
-   ArgsValid = False
-if (NumberArgs > 2) :
-   CheckEncoding = False
-   Encoding = sys.argv[2]
-   if (Encoding.lower() == "ascii") : UseAscii = True
-   elif (Encoding.lower() == "macroman") : UseMacRoman = True
-   elif (Encoding.lower() == "latin1") : UseLatin1 = True
-   elif (Encoding.lower() == "utf-8") : UseUtf8 = True
-   else :
-      print("Encoding must be one of: ASCII, MacRoman, Latin1, UTF-8")
-      ArgsValid = False
-   if (ArgsValid) : print("Will assume file is encoded using",Encoding)
+   return FileName + '_' + str(Number)
 
-if (ArgsValid) :
-   TexFileName = sys.argv[1]
-   
-   if (not os.path.exists(TexFileName)) :
-      print("Cannot find file '" + TexFileName + "'")
-   else :
-   
-      #  Unless we've been asked to use a specific encoding, try to determine
-      #  the encoding automatically. GetFileEncoding() will do this.
-      
-      EncodingOK = True
-      if (CheckEncoding) :
-         Report = []
-         Encodings = []
-         Certainty = AdassChecks.GetFileEncoding(TexFileName,Encodings,Report)
-         if (len(Encodings) == 1) :
-            print("")
-            if (Encodings[0] == "ASCII") :
-               print("File is encoded in standard ASCII")
-            else :
-               if (Certainty == 100) :
-                  print("File is encoded using",Encodings[0])
-               else :
-                  print("File appears to be encoded using",Encodings[0])
-                  for Line in Report :
-                     print(Line)
-                  print("")
-                  print("If necessary, restore the saved version an re-run")
-                  print("specifying a different encoding explicitly, eg:")
-                  if (Encodings[0] == "Latin1") :
-                     print("FixUnprintable",TexFileName,"MacRoman")
-                  else :
-                     print("FixUnprintable",TexFileName,"Latin1")
-            Encoding = Encodings[0].lower()
+# ------------------------------------------------------------------------------
+
+#                      D e t e r m i n e  E n c o d i n g
+#
+#   Uses AdassChecks.GetFileEncoding() to determine the encoding used by a
+#   .tex file, reporting what it finds. If this is clear enough for the file
+#   to be fixed, it returns the encoding (in lower case), otherwise it
+#   returns None, having suggested how the program might be re-run with the
+#   encoding specified explicitly.
+
+def DetermineEncoding (TexFileName) :
 
+   Encoding = None
+   Report = []
+   Encodings = []
+   Certainty = AdassChecks.GetFileEncoding(TexFileName,Encodings,Report)
+   if (len(Encodings) == 1) :
+      print("")
+      if (Encodings[0] == "ASCII") :
+         print("File is encoded in standard ASCII")
+      else :
+         if (Certainty == 100) :
+            print("File is encoded using",Encodings[0])
          else :
-            EncodingOK = False
-            Message = "File could be encoded using any of: "
-            for Encoding in Encodings :
-               Message = Message + ' ' + Encoding
-            print(Message)
+            print("File appears to be encoded using",Encodings[0])
             for Line in Report :
                print(Line)
             print("")
-            print("Re-run, specifying a different encoding explicitly.")
-            print("For example, use one of:")
-            for Encoding in Encodings :
-               print("FixUnprintable",TexFileName,Encoding)
+            print("If necessary, restore the saved version an re-run")
+            print("specifying a different encoding explicitly, eg:")
+            if (Encodings[0] == "Latin1") :
+               print("FixUnprintable",TexFileName,"MacRoman")
+            else :
+               print("FixUnprintable",TexFileName,"Latin1")
+      Encoding = Encodings[0].lower()
 
-      if (EncodingOK) :
-   
-         #  An initial pass to see if we need to do anything. CheckCharacter()
-         #  doesn't output any messages - it returns any it generates in Details,
-         #  which we ignore - and returns True or False depending on whether
-         #  it found any problem characters.
-      
-         LineNumber = 0
-         FileOK = True
-         InputFile = open(TexFileName,"r")
+   else :
+      Message = "File could be encoded using any of: "
+      for Possible in Encodings :
+         Message = Message + ' ' + Possible
+      print(Message)
+      for Line in Report :
+         print(Line)
+      print("")
+      print("Re-run, specifying a different encoding explicitly.")
+      print("For example, use one of:")
+      for Possible in Encodings :
+         print("FixUnprintable",TexFileName,Possible)
+
+   return Encoding
+
+# ------------------------------------------------------------------------------
+
+#                            F i x  F i l e
+#
+#   Replaces any unprintable characters in the named .tex file that have
+#   LaTeX equivalents, assuming it uses the specified encoding, and lists
+#   the characters it finds. An initial pass, using AdassChecks.FindUnprintable(),
+#   finds the characters in question. If any can be replaced, the file is
+#   then read a line at a time, each line being translated using the table
+#   from AdassChecks.FixTranslationTable(), and written to a temporary file in
+#   the same directory. The original file is saved as the next of the names
+#   TexFileName_1, TexFileName_2 etc., and the temporary file is renamed to
+#   replace it. This returns the name of the saved file, or None if nothing
+#   needed doing.
+
+def FixFile (TexFileName,Encoding) :
+
+   SavedFileName = None
+   Findings = AdassChecks.FindUnprintable(TexFileName,[Encoding],False)
+   Findings = Findings[Encoding]
+   Fixable = False
+   for Finding in Findings :
+      print(Finding.Message(True))
+      if (Finding.Replacement != None) : Fixable = True
+
+   if (len(Findings) == 0) :
+      print("Nothing needs doing,",TexFileName,"left unchanged")
+   elif (not Fixable) :
+      print("None of these can be fixed,",TexFileName,"left unchanged")
+   else :
+      (Codec,Table) = AdassChecks.FixTranslationTable(Encoding)
+      Directory = os.path.dirname(os.path.abspath(TexFileName))
+      (Handle,WorkFileName) = tempfile.mkstemp(".tex","Work",Directory)
+      try :
+         OutputFile = os.fdopen(Handle,"wb")
+         InputFile = open(TexFileName,"rb")
          for Line in InputFile :
-            LineNumber = LineNumber + 1
-            Details = []
-            if (AdassChecks.CheckCharacters(Line,LineNumber,Details,Encoding)) :
-               FileOK = False
-               break
+            Text = Line.decode(Codec,"surrogateescape").translate(Table)
+            OutputFile.write(Text.encode(Codec,"surrogateescape"))
+         InputFile.close()
+         OutputFile.close()
+         shutil.copymode(TexFileName,WorkFileName)
+
+         #  Keep the original under its saved name, then rename the new
+         #  version so it replaces the original in a single step.
+
+         SavedFileName = NextVersion(TexFileName)
+         try :
+            os.link(TexFileName,SavedFileName)
+         except OSError :
+            shutil.copy2(TexFileName,SavedFileName)
+         os.replace(WorkFileName,TexFileName)
+      except :
+         if (os.path.exists(WorkFileName)) : os.remove(WorkFileName)
+         raise
+      print("Original file saved as",SavedFileName)
 
-         #  If nothing needed doing, just close the file.
+   return SavedFileName
 
-         if (FileOK) :
-            print("Nothing needs doing,",TexFileName,"left unchanged")
-            InputFile.close()
+# ------------------------------------------------------------------------------
+
+#                   F i x  P a p e r  D i r e c t o r y
+#
+#   Used by BatchFix() to fix the main .tex file for the paper in the specified
+#   directory. This is run in a separate process, so it can change to the
+#   paper's directory. The .tex file is found using AdassChecks.LocateTexFile(),
+#   using the directory name as the likely paper designation. If Encoding is
+#   None, it is determined from the file. Everything that would have been
+#   printed is collected as a transcript. This returns a tuple giving the
+#   directory, the .tex file name (blank if none was found), a short status
+#   string and the transcript.
+
+def FixPaperDirectory (Directory,Encoding = None) :
+
+   TexFileName = ""
+   Status = ""
+   Transcript = io.StringIO()
+   try :
+      os.chdir(Directory)
+      with contextlib.redirect_stdout(Transcript) :
+         Details = []
+         TexFiles = AdassChecks.LocateTexFile(os.path.basename(Directory),\
+                                                           Details,True)
+         if (len(TexFiles) == 0) :
+            Status = "Unable to locate a main .tex file"
+            for Line in Details :
+               print(Line)
          else :
+            TexFileName = TexFiles[0]
+            FileEncoding = Encoding
+            if (FileEncoding == None) :
+               FileEncoding = DetermineEncoding(TexFileName)
+            if (FileEncoding == None) :
+               Status = "Encoding is ambiguous, left unchanged"
+            elif (FixFile(TexFileName,FileEncoding) == None) :
+               Status = "Left unchanged"
+            else :
+               Status = "Fixed"
+   except Exception :
+      Status = "Failed: " + traceback.format_exc().strip().split("\n")[-1]
+      Transcript.write(traceback.format_exc())
+
+   return (Directory,TexFileName,Status,Transcript.getvalue())
+
+# ------------------------------------------------------------------------------
+
+#                            B a t c h  F i x
+#
+#   Fixes the main .tex file for every paper in the directory tree TopDir,
+#   using a pool of Jobs processes (by default, one for each processor).
+#   Encoding is used for all the papers if specified, otherwise it is
+#   determined for each paper. This lists the result for each paper, then
+#   the full output for any paper that was fixed, could not be fixed, or had
+#   an ambiguous encoding. It returns the number of papers that could not
+#   be handled.
+
+def BatchFix (TopDir,Encoding = None,Jobs = None) :
+
+   TopDir = os.path.abspath(TopDir)
+   Directories = AdassChecks.PaperDirectories(TopDir)
+   print("Fixing",len(Directories),"papers in",TopDir)
+
+   Results = []
+   Executor = concurrent.futures.ProcessPoolExecutor(max_workers = Jobs)
+   Futures = []
+   for Directory in Directories :
+      Futures.append(Executor.submit(FixPaperDirectory,Directory,Encoding))
+   for Future in Futures :
+      Result = Future.result()
+      Directory,TexFileName,Status,Transcript = Result
+      print("   ",os.path.relpath(Directory,TopDir),TexFileName,Status)
+      Results.append(Result)
+   Executor.shutdown()
+
+   Failed = 0
+   for Directory,TexFileName,Status,Transcript in Results :
+      if (Status != "Fixed" and Status != "Left unchanged") :
+         Failed = Failed + 1
+      if (Status != "Left unchanged") :
+         print("")
+         print("====",os.path.relpath(Directory,TopDir),"====")
+         print(Transcript.rstrip("\n"))
 
-            #  A second pass, if necessary, to actually do the fixing.
-            #  FixCharacters() returns a fixed line, and prints out details of
-            #  what it did. If no changes were made, it returns None.
-
-            InputFile.seek(0)
-            WorkFileName = NextVersion("Work.tex")
-            OutputFile = open(WorkFileName,"w")
-            LineNumber = 0
-            for Line in InputFile :
-               LineNumber = LineNumber + 1
-               FixedLine = AdassChecks.FixCharacters(Line,LineNumber,Encoding)
-               if (FixedLine != None) : Line = FixedLine
-               OutputFile.write(Line)
-            OutputFile.close()
-            InputFile.close()
-            
-            #  We now need to rename the files, so the original file becomes a
-            #  saved version, and the work file we just created replaces the
-            #  original file.
-
-            SavedFileName = NextVersion(TexFileName)
-            os.rename(TexFileName,SavedFileName)
-            os.rename(WorkFileName,TexFileName)
-            print("Original file saved as",SavedFileName)
+   print("")
+   print(len(Results),"papers processed,",Failed,"could not be handled")
 
+   return Failed
 
+# ------------------------------------------------------------------------------
+
+#                  M a i n  F i x  U n p r i n t a b l e  P r o g r a m
+#
+#   This is only run when this file is run as a script, so that BatchFix() can
+#   import it into the processes it uses.
+
+__Encodings__ = ["ascii","macroman","latin1","utf-8"]
+
+if (__name__ == "__main__") :
+
+   #  Defaults
+
+   Encoding = None
+   ArgsValid = True
+
+   #  First, just check we have the necessary filename, and see if an encoding
+   #  was specified.
+
+   NumberArgs = len(sys.argv)
+   BatchMode = (NumberArgs > 1 and sys.argv[1] == "--batch")
+   FirstArg = 1
+   if (BatchMode) : FirstArg = 2
+   if (NumberArgs < FirstArg + 1) :
+      print("Usage: FixUnprintable filename <encoding>")
+      print("       FixUnprintable --batch directory <encoding> <jobs>")
+      print("eg: FixUnprintable P10-3.tex")
+      ArgsValid = False
+   if (NumberArgs > FirstArg + 1) :
+      Encoding = sys.argv[FirstArg + 1]
+      if (not Encoding.lower() in __Encodings__) :
+         print("Encoding must be one of: ASCII, MacRoman, Latin1, UTF-8")
+         ArgsValid = False
+      if (ArgsValid) : print("Will assume file is encoded using",Encoding)
+      Encoding = Encoding.lower()
+
+   if (ArgsValid and BatchMode) :
+      Jobs = None
+      if (NumberArgs > 4) : Jobs = int(sys.argv[4])
+      Failed = BatchFix(sys.argv[2],Encoding,Jobs)
+      sys.exit( - Failed )
+
+   if (ArgsValid) :
+      TexFileName = sys.argv[1]
+   
+      if (not os.path.exists(TexFileName)) :
+         print("Cannot find file '" + TexFileName + "'")
+      else :
+   
+         #  Unless we've been asked to use a specific encoding, try to determine
+         #  the encoding automatically. GetFileEncoding() will do this.
+      
+         if (Encoding == None) : Encoding = DetermineEncoding(TexFileName)
+         if (Encoding != None) : FixFile(TexFileName,Encoding)
@@ -13,10 +13,13 @@
 #  will be merged.)
 #
 #  Usage:
-#      Index.py Term [Term2...]
+#      Index.py [--prefix] [--all] [--local] [--socket Path] Term [Term2...]
+#      Index.py --serve [--socket Path]
 #
 #  any number of terms can be supplied on the command line, and these will be
-#  looked up individually.
+#  looked up individually. If --prefix is specified, only entries that start
+#  with a term are listed. If --all is specified, the terms are looked up
+#  together, and only entries that contain all of them are listed.
 #
 #  This program reads the current list of subject keywords from the master
 #  subject index list and the new subject index list (if it exists). It
@@ -40,6 +43,27 @@
 #  prints out quite comprehensive details about where it looked and what it
 #  found. It treats the new subject index list file as optional.
 #
+#  The searches use the AdassIndex.SearchIndex class, which indexes the
+#  entries so they can be searched without looking at every entry in turn.
+#  The search index for each file is built in memory when the file is read
+#  (see AdassIndex.ReadSearchIndex()), and the lookup server described below
+#  keeps it, so it only has to be built again when the file changes.
+#
+#  For looking up entries many times - from an editor, say, as an entry is
+#  being typed - the script can be run as a lookup server, using --serve.
+#  This finds and reads the index files once, and then answers requests
+#  sent over a Unix domain socket (by default, a file in the system temporary
+#  directory whose name includes the user id, but --socket can be used to
+#  specify a different one). It only reads a file again if it changes. When
+#  the script is run to look up terms, it first tries to pass them to the
+#  server, and only reads the index files itself if there is no server
+#  running (or if --local is specified). The server's replies give the index
+#  files it is using, and if these are not the ones the ADASS_Configuration
+#  file gives the client - the server may have been started for a different
+#  volume - the client ignores the reply and reads the index files itself.
+#  The requests and replies are single lines of JSON, described in the
+#  comments to LookupHandler(), so any other program can use the server too.
+#
 #  Author(s): Keith Shortridge (keith@knaveandvarlet.com.au)
 #
 #  History:
@@ -55,111 +79,469 @@
 #                    run under either Python2 or Python3. KS.
 #     22nd Aug 2017. Now checks to make sure an item wasn't included in the
 #                    mater index before listing it as in the 'new' index. KS.
+#     18th Oct 2026. Now uses AdassIndex.ReadSearchIndex() and the SearchIndex
+#                    class for the searches, instead of looking at each entry
+#                    in turn. Added the --prefix and --all options.
+#                    Added the lookup server, and the --serve, --socket and
+#                    --local options. The code is now split into routines.
+#                    A missing new index file is no longer looked for in the
+#                    current directory, and the client only uses a reply from
+#                    the lookup server if it is using the same index files.
+#                    The lookup server will only remove an existing file at
+#                    its socket path if that is a socket, and a request whose
+#                    Terms is not a list now gets an error reply. This code
+#                    now needs Python 3.
 #
 #  Python versions:
-#     This code should run under either python 2 or python 3, so long as
-#     the python 2 version supports the "from __future__ import" used here.
-#     It has been tested under 2.7 and 3.6.
+#     This code needs python 3 - the lookup server and its clients exchange
+#     JSON as UTF-8 text over a Unix domain socket, and this has only been
+#     written and tested for python 3. It no longer runs under python 2.
 # 
 
 from __future__ import (print_function,division,absolute_import)
 
 import os
 import sys
+import json
+import stat
+import signal
+import socket
 import string
+import tempfile
+import threading
 
 import AdassIndex
 import AdassConfig
 
-#  See if we have any arguments (ignoring the zeroth).
+#  The default name for the socket used by the lookup server. This includes
+#  the user id, so each user gets their own server.
+
+__IndexSocketName__ = "AdassIndex-%d.socket"
+
+#  How long the client waits for the server to reply, in seconds, before
+#  giving up on it and searching the index files itself.
+
+__IndexClientTimeout__ = 5.0
+
+# ------------------------------------------------------------------------------
+
+#                       D e f a u l t  S o c k e t
+#
+#   Returns the name of the Unix domain socket used by the lookup server if
+#   no --socket option is given - a file in the system temporary directory
+#   whose name includes the user id.
+
+def DefaultSocket () :
+
+   UserId = 0
+   if (hasattr(os,"getuid")) : UserId = os.getuid()
+   return os.path.join(tempfile.gettempdir(),__IndexSocketName__ % UserId)
+
+# ------------------------------------------------------------------------------
+
+#                           I n d e x  F i l e s
+#
+#   An IndexFiles object holds the SearchIndex objects for the master subject
+#   index list and the new subject index list. Locate() finds the files, using
+#   the ADASS_Configuration file, and Load() finds them and reads them. If the
+#   master subject index list can't be found, these return False and Details
+#   is left with the description of where AdassConfig looked for it. If no new
+#   subject index list is configured, NewIndexPath is left blank. Refresh()
+#   reads either file again if it has changed since it was last read, which
+#   is what lets the lookup server keep running while the new index list is
+#   edited.
+
+class IndexFiles(object) :
+
+   def __init__(self) :
+      self.MasterIndexPath = ""
+      self.NewIndexPath = ""
+      self.MasterIndex = AdassIndex.SearchIndex()
+      self.NewIndex = AdassIndex.SearchIndex()
+      self.NewIndexExists = False
+      self.Signatures = {}
+      self.Lock = threading.Lock()
+
+   def Locate(self,Details) :
+
+      #  Get the path names for the master subject index list, and the new
+      #  subject index list. We need there to be a master subject index list,
+      #  so we complain if this doesn't exist. There may not be a new subject
+      #  index list. Note that MainSubjectIndexFile() always returns the name
+      #  of an existing file, and a null string if there isn't one.
+      #  NewSubjectIndexFile() may return the name to be used if the file
+      #  doesn't exist, and a null string if none is configured, which has
+      #  to be left as it is rather than being taken as the current directory.
+
+      self.MasterIndexPath = AdassConfig.MainSubjectIndexFile(Details)
+      if (self.MasterIndexPath == "") : return False
+      self.MasterIndexPath = os.path.abspath(self.MasterIndexPath)
+      self.NewIndexPath = AdassConfig.NewSubjectIndexFile()
+      if (self.NewIndexPath != "") :
+         self.NewIndexPath = os.path.abspath(self.NewIndexPath)
+      return True
+
+   def Load(self,Details) :
+
+      #  Finds the index files and reads them.
+
+      if (not self.Locate(Details)) : return False
+      self.Refresh()
+      return True
+
+   def Refresh(self) :
+
+      #  ReadSearchIndex() returns a SearchIndex for the contents of each
+      #  file, in the "top level!2nd level!3rd level" form used by the actual
+      #  entries inserted in the .tex file. If the new index file does not
+      #  exist, ReadSearchIndex() would silently return an empty index, but
+      #  it's easiest if we know if the file exists or not.
+
+      with self.Lock :
+         Signature = FileSignature(self.MasterIndexPath)
+         if (Signature != self.Signatures.get("Master")) :
+            self.MasterIndex = AdassIndex.ReadSearchIndex(self.MasterIndexPath)
+            self.Signatures["Master"] = Signature
+         Signature = FileSignature(self.NewIndexPath)
+         if (Signature != self.Signatures.get("New")) :
+            self.NewIndexExists = (Signature != None)
+            if (self.NewIndexExists) :
+               self.NewIndex = AdassIndex.ReadSearchIndex(self.NewIndexPath)
+            else :
+               self.NewIndex = AdassIndex.SearchIndex()
+            self.Signatures["New"] = Signature
+
+   def Search(self,Terms,Prefix = False) :
+
+      #  Looks for the entries matching Terms - see SearchIndexes().
+
+      with self.Lock :
+         return SearchIndexes(self.MasterIndex,self.NewIndex,Terms,Prefix)
+
+# ------------------------------------------------------------------------------
+
+#                         F i l e  S i g n a t u r e
+#
+#   Returns the size and modification time of the named file, or None if
+#   it does not exist (or is not an ordinary file - FilePath may be blank, or
+#   a directory), so a change to the file can be spotted.
+
+def FileSignature (FilePath) :
+
+   if (FilePath == "" or not os.path.isfile(FilePath)) : return None
+   try :
+      Stat = os.stat(FilePath)
+   except (IOError,OSError) :
+      return None
+   return (Stat.st_size,Stat.st_mtime)
+
+# ------------------------------------------------------------------------------
+
+#                         S e a r c h  I n d e x e s
+#
+#   Looks for the entries that match the list of strings in Terms (all of
+#   them, if there is more than one) in the master and new index lists, each
+#   passed as an AdassIndex.SearchIndex. If Prefix is True, the entries have
+#   to start with the terms rather than just contain them. This returns a
+#   tuple with the list of matching entries in the master index and the list
+#   of those in the new index that are not in the master list.
+
+def SearchIndexes (MasterIndex,NewIndex,Terms,Prefix = False) :
+
+   #  Note that we assume the master index entries have already been sorted
+   #  and will not contain duplicate entries. Note which ones we find.
+
+   MasterFound = MasterIndex.SearchAll(Terms,Prefix)
+   MasterEntries = set(MasterFound)
+
+   #  Search the new index list. The new keyword file has separate sections
+   #  for the various new papers and so are not likely to be in order, so the
+   #  entries found in it are sorted. Allow for the possibility of duplicate
+   #  entries. (Different papers might have the same entries.) Also note that
+   #  if a new second or third level entry is found in the new entry file, the
+   #  new entry file will include the higher level entries as well, and those
+   #  might have already been found in the master index - that's why we keep
+   #  a set of ones already found in MasterEntries.
 
-Argc = len(sys.argv)
-if (Argc < 2) :
-   print("No search terms supplied on command line")
-else :
+   NewFound = []
+   LastEntry = ""
+   for Entry in sorted(NewIndex.SearchAll(Terms,Prefix)) :
+      if (Entry != LastEntry) :
+         LastEntry = Entry
+         if (not Entry in MasterEntries) : NewFound.append(Entry)
 
-   #  Get the path names for the master subject index list, and the new subject
-   #  index list. We need there to be a master subject index list, so we
-   #  complain if this doesn't exist. There may not be a new subject index
-   #  list. Note that MainSubjectIndexFile() always returns the name of an
-   #  existing file, and a null string if there isn't one. NewSubjectIndexFile()
-   #  may return the name to be used if the file doesn't exist. ReadIndexList()
-   #  returns the contents of each file in the "top level!2nd level!3rd level"
-   #  form used by the actual entries inserted in the .tex file.
+   return (MasterFound,NewFound)
+
+# ------------------------------------------------------------------------------
+
+#                         P r i n t  R e s u l t s
+#
+#   Prints the entries found for the list of strings in Terms, given the list
+#   MasterFound of matching entries from the master index and the list
+#   NewFound of matching entries from the new index, as commented-out
+#   \ssindex{} directives. NewIndexExists indicates if there is a new index.
+
+def PrintResults (Terms,MasterFound,NewFound,NewIndexExists) :
+
+   print("")
+   print("Looking for index entries matching '" + "' and '".join(Terms) + "'")
+   print("")
+
+   for Entry in MasterFound :
+      print("%\\ssindex{" + Entry + "}")
+   Count = len(MasterFound)
+   if (Count == 1) :
+      print("One entry in master index")
+   elif (Count > 1) :
+      print(Count,"entries in master index")
+   else :
+      print("No entries in master index")
+
+   if (NewIndexExists) :
+      for Entry in NewFound :
+         print("%\\ssindex{" + Entry + "}")
+      Count = len(NewFound)
+      if (Count == 1) :
+         print("One entry in new index")
+      elif (Count > 1) :
+         print(Count,"entries in new index")
+      else :
+         print("No entries in new index")
+
+# ------------------------------------------------------------------------------
+
+#                         L o o k u p  H a n d l e r
+#
+#   The routine run by the lookup server for each connection. Each request is
+#   a single line of JSON giving a dictionary with "Terms", a list of the
+#   strings to search for, and optionally "Prefix" and "All" (both false by
+#   default) which have the same meaning as the --prefix and --all options.
+#   The reply is also a single line of JSON, a dictionary with "Searches",
+#   a list of dictionaries (one for each search) with "Terms", "Master" and
+#   "New" giving the terms and the entries found in the master and new index
+#   lists, "NewIndexExists", and "MasterIndexPath" and "NewIndexPath" giving
+#   the absolute paths of the index files (NewIndexPath is blank if there is
+#   no new index list configured). A client should check these are the files
+#   it expects to be searched - one server may be used from several volumes.
+#   If the request can't be understood - if "Terms" is missing or is not a
+#   list, for example - the reply has "Error" giving the reason. A client can
+#   send any number of requests over the one connection, which is useful for
+#   an editor looking entries up as they are typed.
+
+def LookupHandler (Connection,Indexes) :
+
+   Reader = Connection.makefile('rb')
+   try :
+      for Line in Reader :
+         try :
+            Request = json.loads(Line.decode("utf-8"))
+            if (not isinstance(Request["Terms"],list)) :
+               raise TypeError("Terms must be a list")
+            Terms = [str(Term) for Term in Request["Terms"]]
+            Prefix = bool(Request.get("Prefix",False))
+            Searches = [[Term] for Term in Terms]
+            if (Request.get("All",False)) : Searches = [Terms]
+            Indexes.Refresh()
+            Reply = {"Searches" : [], "NewIndexExists" : Indexes.NewIndexExists,
+                     "MasterIndexPath" : Indexes.MasterIndexPath,
+                     "NewIndexPath" : Indexes.NewIndexPath}
+            for Search in Searches :
+               MasterFound,NewFound = Indexes.Search(Search,Prefix)
+               Reply["Searches"].append({"Terms" : Search, \
+                                  "Master" : MasterFound, "New" : NewFound})
+         except (ValueError,KeyError,TypeError,AttributeError) as Error :
+            Reply = {"Error" : "Bad request: " + str(Error)}
+         Connection.sendall((json.dumps(Reply) + "\n").encode("utf-8"))
+   except (IOError,OSError) :
+      pass
+   Reader.close()
+   Connection.close()
+
+# ------------------------------------------------------------------------------
+
+#                               S e r v e
+#
+#   Runs the lookup server, listening on the Unix domain socket SocketPath.
+#   The index files are read once, when the server starts, and are only read
+#   again if they change. Each connection is handled by its own thread (see
+#   LookupHandler()). If there is already a server listening on the socket,
+#   this returns False. A socket file left behind by a server that is no
+#   longer running is removed, but if SocketPath exists and is not a socket
+#   it is left alone and this returns False. The socket can only be used by
+#   the user running the server. This runs until interrupted or terminated,
+#   and then removes the socket file.
+
+def Serve (SocketPath) :
 
    Details = []
-   MasterIndexPath = AdassConfig.MainSubjectIndexFile(Details)
-   if (MasterIndexPath == "") :
+   Indexes = IndexFiles()
+   if (not Indexes.Load(Details)) :
       for Line in Details :
          print(Line)
+      return False
+
+   if (os.path.exists(SocketPath)) :
+      if (not stat.S_ISSOCK(os.stat(SocketPath).st_mode)) :
+         print(SocketPath,"exists, but is not a socket")
+         return False
+      if (Connect(SocketPath) != None) :
+         print("A lookup server is already running on",SocketPath)
+         return False
+      os.remove(SocketPath)
+   Server = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+   OldMask = os.umask(0o077)
+   try :
+      Server.bind(SocketPath)
+   finally :
+      os.umask(OldMask)
+   Server.listen(16)
+   print("Serving subject index lookups on",SocketPath)
+   print("Master index:",Indexes.MasterIndexPath,"-",len(Indexes.MasterIndex), \
+                                                                    "entries")
+   if (Indexes.NewIndexExists) :
+      print("New index:",Indexes.NewIndexPath,"-",len(Indexes.NewIndex), \
+                                                                    "entries")
+   signal.signal(signal.SIGTERM,lambda Signum,Frame : sys.exit(0))
+   try :
+      while (True) :
+         Connection,Address = Server.accept()
+         Thread = threading.Thread(target=LookupHandler, \
+                                          args=(Connection,Indexes))
+         Thread.daemon = True
+         Thread.start()
+   except KeyboardInterrupt :
+      print("")
+   finally :
+      Server.close()
+      try :
+         os.remove(SocketPath)
+      except (IOError,OSError) :
+         pass
+   return True
+
+# ------------------------------------------------------------------------------
+
+#                              C o n n e c t
+#
+#   Returns a socket connected to the lookup server listening on SocketPath,
+#   or None if there is no server running there (or if Unix domain sockets
+#   are not supported).
+
+def Connect (SocketPath) :
+
+   if (not hasattr(socket,"AF_UNIX") or not os.path.exists(SocketPath)) :
+      return None
+   Client = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+   Client.settimeout(__IndexClientTimeout__)
+   try :
+      Client.connect(SocketPath)
+   except (IOError,OSError) :
+      Client.close()
+      return None
+   return Client
+
+# ------------------------------------------------------------------------------
+
+#                                Q u e r y
+#
+#   Sends a request to the lookup server listening on SocketPath, for the
+#   list of strings in Terms with the Prefix and All options as described for
+#   LookupHandler(), and returns the reply as a dictionary. If there is no
+#   server, or it does not reply properly, this returns None, and the caller
+#   should search the index files itself.
+
+def Query (SocketPath,Terms,Prefix = False,All = False) :
+
+   Client = Connect(SocketPath)
+   if (Client == None) : return None
+   Reply = None
+   try :
+      Request = {"Terms" : Terms, "Prefix" : Prefix, "All" : All}
+      Client.sendall((json.dumps(Request) + "\n").encode("utf-8"))
+      Reader = Client.makefile('rb')
+      Line = Reader.readline()
+      Reader.close()
+      Reply = json.loads(Line.decode("utf-8"))
+      if (not "Searches" in Reply) : Reply = None
+   except (IOError,OSError,ValueError) :
+      Reply = None
+   Client.close()
+   return Reply
+
+# ------------------------------------------------------------------------------
+
+#                     M a i n  I n d e x  P r o g r a m
+
+if (__name__ == "__main__") :
+
+   #  See if we have any options. --prefix looks for entries that start with
+   #  the terms, and --all looks for entries that contain all of the terms.
+   #  --serve runs the lookup server, and --socket gives the socket it uses.
+   #  --local searches the index files even if there is a server running.
+
+   Prefix = False
+   if ("--prefix" in sys.argv) :
+      Prefix = True
+      sys.argv = [Arg for Arg in sys.argv if Arg != "--prefix"]
+   All = False
+   if ("--all" in sys.argv) :
+      All = True
+      sys.argv = [Arg for Arg in sys.argv if Arg != "--all"]
+   Local = False
+   if ("--local" in sys.argv) :
+      Local = True
+      sys.argv = [Arg for Arg in sys.argv if Arg != "--local"]
+   Server = False
+   if ("--serve" in sys.argv) :
+      Server = True
+      sys.argv = [Arg for Arg in sys.argv if Arg != "--serve"]
+   SocketPath = DefaultSocket()
+   if ("--socket" in sys.argv) :
+      Index = sys.argv.index("--socket")
+      if (Index + 1 < len(sys.argv)) :
+         SocketPath = sys.argv[Index + 1]
+         del sys.argv[Index:Index + 2]
+
+   if (Server) :
+      if (not hasattr(socket,"AF_UNIX")) :
+         print("The lookup server needs Unix domain sockets")
+         sys.exit(1)
+      if (not Serve(SocketPath)) : sys.exit(1)
+
+   #  See if we have any arguments (ignoring the zeroth).
+
+   elif (len(sys.argv) < 2) :
+      print("No search terms supplied on command line")
    else :
 
-      MasterIndexList = AdassIndex.ReadIndexList(MasterIndexPath)
-      
-      #  Now the new index list. If the file does not exist, ReadIndexList()
-      #  would silently return an empty list, but it's easiest if we know
-      #  if the file exists or not.
-      
-      NewIndexPath = AdassConfig.NewSubjectIndexFile()
-      NewIndexExists = False
-      if (os.path.exists(NewIndexPath)) :
-         NewIndexList = sorted(AdassIndex.ReadIndexList(NewIndexPath))
-         NewIndexExists = True
+      #  If there is a lookup server running, let it do the searches.
+      #  Otherwise, read the index files and do them here. The default
+      #  socket is the same wherever this is run, so the server may have
+      #  been started for a different volume, and its reply is only used if
+      #  it searched the index files the ADASS_Configuration file gives here.
+
+      Terms = sys.argv[1:]
+      Details = []
+      Indexes = IndexFiles()
+      Located = Indexes.Locate(Details)
+      Reply = None
+      if (Located and not Local) : Reply = Query(SocketPath,Terms,Prefix,All)
+      if (Reply != None) :
+         if (Reply.get("MasterIndexPath") != Indexes.MasterIndexPath or \
+                       Reply.get("NewIndexPath") != Indexes.NewIndexPath) :
+            Reply = None
+      if (Reply != None) :
+         for Search in Reply["Searches"] :
+            PrintResults(Search["Terms"],Search["Master"],Search["New"], \
+                                                     Reply["NewIndexExists"])
       else :
-         NewIndexList = []
-
-      #  Note that we assume the master index entries have already been
-      #  sorted and will not contain duplicate entries. The new keyword file
-      #  has separate sections for the various new papers and so are not
-      #  likely to be in order and so have been sorted here.
-
-      for Ind in range(1,len(sys.argv)) :
-
-         Arg = sys.argv[Ind]
-
-         print("")
-         print("Looking for index entries matching '" + Arg + "'")
-         print("")
-         Arg = Arg.lower()
-
-         #  Search the master index list. Note which ones we find.
-
-         Count = 0
-         MasterEntries = []
-         for Entry in MasterIndexList :
-            if (Entry.lower().find(Arg) >= 0) :
-               print("%\\ssindex{" + Entry + "}")
-               MasterEntries.append(Entry)
-               Count = Count + 1
-         if (Count == 1) :
-            print("One entry in master index")
-         elif (Count > 1) :
-            print(Count,"entries in master index")
+         if (not Located) :
+            for Line in Details :
+               print(Line)
          else :
-            print("No entries in master index")
-
-         #  Search the new index list. Allow for the possibility of duplicate
-         #  entries. (Different papers might have the same entries.) Also note
-         #  that if a new second or third level entry is found in the new
-         #  entry file, the new entry file will include the higher level entries
-         #  as well, and those might have already been found in the master
-         #  index - that's why we keep a list of ones already found in
-         #  MasterEntries.
-
-         if (NewIndexExists) :
-            Count = 0
-            LastEntry = ""
-            for Entry in NewIndexList :
-               if (Entry != LastEntry) :
-                  LastEntry = Entry
-                  if (Entry.lower().find(Arg) >= 0) :
-                     if (not Entry in MasterEntries) :
-                        Count = Count + 1
-                        print("%\\ssindex{" + Entry + "}")
-            if (Count == 1) :
-               print("One entry in new index")
-            elif (Count > 1) :
-               print(Count,"entries in new index")
-            else :
-               print("No entries in new index")
-
+            Indexes.Refresh()
+            Searches = [[Term] for Term in Terms]
+            if (All) : Searches = [Terms]
+            for Search in Searches :
+               MasterFound,NewFound = Indexes.Search(Search,Prefix)
+               PrintResults(Search,MasterFound,NewFound,Indexes.NewIndexExists)
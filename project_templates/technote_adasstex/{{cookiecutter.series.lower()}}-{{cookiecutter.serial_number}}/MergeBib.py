@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+#                          M e r g e  B i b . p y
+#
+#  A convenience script to help with processing the submissions for an
+#  ADASS conference. This builds the master .bib file for a whole volume from
+#  the .bib files supplied with the individual papers.
+#
+#  Usage:
+#     MergeBib VolumeDir <output> <jobs>
+#
+#     where VolumeDir is the top level directory for the volume, with each
+#     paper in its own sub-directory (see AdassChecks.PaperDirectories()),
+#     output is the name of the merged .bib file to be written (by default,
+#     MergedReferences.bib in the current directory) and jobs is the number of
+#     threads used to read the papers' .bib files (by default, one for each
+#     processor).
+#
+#  The .bib file for each paper is found using AdassChecks.FindBibFile(), and
+#  its entries are found using AdassChecks.IndexBibFile(), which is the parser
+#  behind AdassChecks.GetBibFileRefs(). The files are read in parallel, but are
+#  merged in the order of the paper directories, so the result is always the
+#  same. Entries are compared using their name, ignoring case, and a
+#  fingerprint of their contents - the entry type and the fields, ignoring
+#  case and the way the entry is laid out. So:
+#
+#  o An entry with the same name and contents as one already merged is a
+#    duplicate, and is dropped.
+#  o An entry with the same name as one already merged, but different
+#    contents, is a collision. The first entry is kept, and the later one is
+#    written commented out (with the '@' replaced by '_AT_', as done by
+#    TrimBibFile()) so the editor can see it, and it is reported. One of the
+#    papers will need to rename its reference.
+#  o An entry with different names but the same contents as one already
+#    merged is kept, as the papers cite it under different names, but it is
+#    reported as a possible duplicate.
+#
+#  Entries without a name, such as @string definitions, are only dropped if
+#  they are exact duplicates. The .bib files are handled as bytes, so the
+#  entries are copied without any change to their encoding.
+#
+#  History:
+#     18th Oct 2026. Original version.
+#
+
+from __future__ import (print_function,division,absolute_import)
+
+import os
+import re
+import sys
+import time
+import hashlib
+import concurrent.futures
+
+import AdassChecks
+
+# ------------------------------------------------------------------------------
+
+#                        R e a d  P a p e r  B i b
+#
+#   Finds and reads the .bib file for the paper in the specified directory,
+#   the directory name being taken as the paper designation. This returns a
+#   tuple giving the directory, the name of the .bib file (blank if none was
+#   found), a list of (BibEntry,Text) tuples, one for each entry in the file,
+#   where Text is the entry as bytes, and a list of notes about the file.
+
+def ReadPaperBib (Directory) :
+
+   Notes = []
+   EntryTexts = []
+   BibFileName = AdassChecks.FindBibFile(os.path.basename(Directory),Notes, \
+                                                                     Directory)
+   if (BibFileName != "") :
+      Entries = AdassChecks.IndexBibFile(BibFileName,Notes)
+      BibFile = open(BibFileName,mode='rb')
+      for Entry in Entries :
+         EntryTexts.append((Entry,AdassChecks.ReadBibEntry(BibFile,Entry)))
+      BibFile.close()
+
+   return (Directory,BibFileName,EntryTexts,Notes)
+
+# ------------------------------------------------------------------------------
+
+#                      E n t r y  F i n g e r p r i n t
+#
+#   Returns a fingerprint for the contents of a .bib file entry, given the
+#   BibEntry for it and its text as bytes - just the entry itself, as
+#   returned by AdassChecks.ReadBibEntry(). For a named entry this covers the
+#   entry type and everything after the name. The text is compared ignoring
+#   case and the way it is laid out - how much space there is and where the
+#   lines break, spaces around the '=', ',' and braces, and a comma after the
+#   last field - so two copies of the same reference formatted differently by
+#   different authors will still match.
+
+def EntryFingerprint (Entry,Text) :
+
+   Body = Text.decode("utf-8","replace")
+   if (Entry.Key != None) :
+      Comma = Body.find(',')
+      if (Comma >= 0) : Body = Body[Comma + 1:]
+      Body = Entry.Type.strip() + ',' + Body
+   Body = ' '.join(Body.lower().split())
+   Body = re.sub(r' ?([=,{}()"]) ?',r'\1',Body)
+   Body = re.sub(r',([})])$',r'\1',Body)
+   return hashlib.sha1(Body.encode("utf-8")).hexdigest()
+
+# ------------------------------------------------------------------------------
+
+#                            M e r g e  B i b
+#
+#   Merges the .bib files for all the papers in VolumeDir into the single file
+#   OutputFileName, as described in the header comments. The files are read by
+#   a pool of Jobs threads (by default, one for each processor), and the merged
+#   file is written in a single pass as the results come in. This returns the
+#   number of collisions found - entries with the same name in different
+#   papers but with different contents.
+
+def MergeBib (VolumeDir,OutputFileName,Jobs = None) :
+
+   VolumeDir = os.path.abspath(VolumeDir)
+   Directories = AdassChecks.PaperDirectories(VolumeDir)
+   print("Merging the .bib files for",len(Directories),"papers in",VolumeDir)
+
+   Seen = {}            # Lower case name -> (Fingerprint,Paper)
+   SeenContents = {}    # Fingerprint -> (Name,Paper)
+   Merged = 0
+   Duplicates = 0
+   Collisions = []
+   PossibleDuplicates = []
+
+   OutputFile = open(OutputFileName,mode='wb')
+   OutputFile.write(("% Master .bib file for " + VolumeDir + "\n" + \
+                     "% Merged by MergeBib.py, " + time.strftime("%c") + \
+                                                            "\n").encode())
+
+   if (Jobs == None) : Jobs = os.cpu_count()
+   Executor = concurrent.futures.ThreadPoolExecutor(max_workers = Jobs)
+   for Result in Executor.map(ReadPaperBib,Directories) :
+      Directory,BibFileName,EntryTexts,Notes = Result
+      Paper = os.path.relpath(Directory,VolumeDir)
+      if (BibFileName == "") :
+         print("   ",Paper,": no .bib file")
+         continue
+      print("   ",Paper,":",len(EntryTexts),"entries in", \
+                                              os.path.basename(BibFileName))
+      for Note in Notes :
+         if (Note.startswith("Unexpected")) : print("       ",Note)
+      OutputFile.write(("\n% ---- " + Paper + " (" + \
+                             os.path.basename(BibFileName) + ")\n\n").encode())
+
+      for Entry,Text in EntryTexts :
+         if (not Text.endswith(b'\n')) : Text = Text + b'\n'
+         Fingerprint = EntryFingerprint(Entry,Text)
+         if (Entry.Key == None) :
+            Key = None
+         else :
+            Key = Entry.Key.strip().lower()
+
+         #  Unnamed entries, such as @string definitions, are only compared
+         #  on their contents.
+
+         if (Key == None or Key == "") :
+            if (Fingerprint in SeenContents) :
+               Duplicates = Duplicates + 1
+            else :
+               SeenContents[Fingerprint] = (None,Paper)
+               OutputFile.write(Text)
+               Merged = Merged + 1
+
+         elif (Key in Seen) :
+            (SeenFingerprint,SeenPaper) = Seen[Key]
+            if (SeenFingerprint == Fingerprint) :
+               Duplicates = Duplicates + 1
+            else :
+               Collisions.append((Entry.Key,SeenPaper,Paper))
+               First = True
+               for Line in Text.splitlines(True) :
+                  if (First) : Line = Line.replace(b'@',b"_AT_")
+                  OutputFile.write(b'%' + Line)
+                  First = False
+
+         else :
+            Seen[Key] = (Fingerprint,Paper)
+            if (Fingerprint in SeenContents) :
+               (SeenName,SeenPaper) = SeenContents[Fingerprint]
+               if (SeenName != None) :
+                  PossibleDuplicates.append((Entry.Key,Paper,SeenName,SeenPaper))
+            else :
+               SeenContents[Fingerprint] = (Entry.Key,Paper)
+            OutputFile.write(Text)
+            Merged = Merged + 1
+   Executor.shutdown()
+   OutputFile.close()
+
+   print("")
+   print(Merged,"entries written to",OutputFileName,"-",Duplicates, \
+                                                       "duplicates dropped")
+   if (len(PossibleDuplicates) > 0) :
+      print("")
+      print("Entries with different names but the same contents:")
+      for Name,Paper,SeenName,SeenPaper in PossibleDuplicates :
+         print("   ",Name,"in",Paper,"matches",SeenName,"in",SeenPaper)
+   if (len(Collisions) > 0) :
+      print("")
+      print("** Entries with the same name but different contents -", \
+                                      "the later ones have been commented out:")
+      for Name,SeenPaper,Paper in Collisions :
+         print("   ",Name,"in",Paper,"clashes with the entry in",SeenPaper)
+
+   return len(Collisions)
+
+# ------------------------------------------------------------------------------
+
+#                   M a i n  M e r g e  B i b  P r o g r a m
+
+if (__name__ == "__main__") :
+
+   NumberArgs = len(sys.argv)
+   if (NumberArgs < 2) :
+      print("Usage: MergeBib <volume directory> [<output> [<jobs>]]")
+      print("eg: MergeBib ADASS2026 MergedReferences.bib")
+   else :
+      OutputFileName = "MergedReferences.bib"
+      if (NumberArgs > 2) : OutputFileName = sys.argv[2]
+      Jobs = None
+      if (NumberArgs > 3) : Jobs = int(sys.argv[3])
+      Collisions = MergeBib(sys.argv[1],OutputFileName,Jobs)
+      sys.exit( - Collisions )
@@ -14,10 +14,10 @@
 #  those defined in the .bib file. It checks that any figures used in the paper
 #  have been supplied, and that these are .eps files as required.
 #
-#  This script should run under either Python 2 or Python 3, and has been
-#  developed on OS X. It should work equally well under Linux. It has not been
-#  tried under Windows. It is designed to be run from the command line, and
-#  makes no effort to provide a fancy user interface.
+#  This script needs Python 3, and has been developed on OS X. It should work
+#  equally well under Linux. It has not been tried under Windows. It is
+#  designed to be run from the command line, and makes no effort to provide a
+#  fancy user interface.
 #
 #  To run this program, you need to have this PaperCheck.py script in a
 #  directory together with the source files for the two additional Python
@@ -40,6 +40,39 @@
 #  Paper is the designation for the paper, for example O3-4
 #  Author is the surname of the first author.
 #
+#  All the papers for a volume can be checked in one go using
+#
+#  PaperCheck.py --batch VolumeDir [Report [Jobs]]
+#
+#  where VolumeDir is the top level directory for the volume, with each
+#  paper in its own sub-directory. The papers are checked in parallel using
+#  Jobs processes (by default, one per processor), and a report on all of
+#  them is written to the file Report (by default, PaperCheckReport.txt).
+#
+#  Either form can be given the --incremental option. This saves the results
+#  of each check in a .PaperCheckState.json file in the paper's directory, and
+#  the next time only repeats the checks whose inputs - the .tex file, the
+#  .bib file, the list of files in the directory, the subject keyword lists
+#  and the check code itself - have changed. The others just repeat their
+#  saved results. This is useful when working on a paper, where usually only
+#  the .bib file or a figure has changed since the last check.
+#
+#  When checking a single paper, the --watch option keeps the script running
+#  after the first check, and re-checks the paper each time one of its files
+#  changes, as with --incremental but without having to start the script again.
+#  It uses inotify to wait for changes where it can, and otherwise looks to see
+#  if any of the files have changed every half second. Use Ctrl-C to stop it.
+#
+#  Any of these can also be given --json File or --ndjson File, to write the
+#  results to the named file in a form other programs can use. Each problem
+#  found is given as an object with the name of the check that found it, its
+#  severity ("error" for the problems listed in the summary, "warning" for
+#  the details behind them), the file and line concerned if known, a message
+#  and a suggested fix if there is one. --json writes a single JSON object
+#  with a list of the results for each paper. --ndjson writes each result as a
+#  JSON object on a line of its own, including the paper it is for, as soon as
+#  each paper has been checked.
+#
 #  The script looks for the main .tex file for the paper. If it finds it, it
 #  runs a number of checks on the files for the paper, and eventually prints
 #  out a summary of what it found. If the summary shows that problems were
@@ -129,12 +162,43 @@
 #
 #     31st Oct 2020. Fixed .add -> .append for ADASS2020
 #     4 April 2022   Fixed pickup of vim temporary file buffers as tex files
+#     18th Oct 2026. The preliminary parse of the .tex file now goes through
+#                    AdassChecks.GetTexCommands(), so the file is parsed once
+#                    and the later checks all reuse the commands it found.
+#                    The checks are now run by CheckPaper(), and the new
+#                    --batch option uses BatchCheck() to check every paper
+#                    in a volume using a pool of processes. The main program
+#                    now only runs when this file is run as a script. This
+#                    code now needs Python 3. The copyright form check now
+#                    uses the author named on the command line (it had been
+#                    picking up the last author in the parsed author list).
+#                    The .tex file is now read just once when checking for
+#                    unprintable characters, using AdassChecks.FindUnprintable()
+#                    to check all the possible encodings at the same time.
+#                    Added the --incremental option, using the new CheckState
+#                    class to skip checks whose inputs have not changed. Its
+#                    state file is given the usual permissions for a new file.
+#                    Added the --watch option, using WatchPaper() and the new
+#                    DirectoryWatcher class.
+#                    Added the --json and --ndjson options. CheckPaper() can now
+#                    return its results as AdassChecks.CheckResult objects,
+#                    and these are written out by the new ResultsWriter class.
+#                    The package, \cite, graphics and running heads checks
+#                    now add their own CheckResults, giving the line in the
+#                    .tex file and a suggested fix, and so does
+#                    FindCopyrightForm(). ProblemResults() does not repeat a
+#                    problem a check has already given a CheckResult for, and
+#                    the paper name and copyright form results now give a file.
+#                    CheckSubjectIndexEntries() now loads the subject keyword
+#                    lists just once, into a frozenset, lists the entries not
+#                    found in sorted order, and suggests close matches for
+#                    them using AdassIndex.SearchIndex.Similar().
 #
-#  Python 2 and Python 3.
+#  Python versions:
 #
-#     This code should run under either python 2 or python 3, so long as
-#     the python 2 version supports the "from __future__ import" used here.
-#     It has been tested under 2.7 and 3.6.
+#     This code needs python 3 (at least 3.5 - it uses concurrent.futures,
+#     contextlib.redirect_stdout(), os.replace() and os.scandir()). It no
+#     longer runs under python 2.
 #
 
 from __future__ import (print_function,division,absolute_import)
@@ -143,9 +207,17 @@ import os
 import sys
 import string
 import time
+import io
+import json
+import hashlib
+import select
+import struct
+import tempfile
+import contextlib
+import traceback
+import concurrent.futures
 
 import AdassChecks
-import TexScanner
 
 # ------------------------------------------------------------------------------
 
@@ -208,9 +280,11 @@ def FindTexFile (Paper,Problems) :
 #  directory. If it finds one that can be used, it returns its name. If not,
 #  it returns a nul string. A summary of any problems found is appened to
 #  the list passed as Warnings - copyright forms may have been submitted as
-#  paper copies, so a missing one is not necessarily a problem.
+#  paper copies, so a missing one is not necessarily a problem. If a list is
+#  passed as Results, an AdassChecks.CheckResult is added to it for each of
+#  these, giving the file concerned and what should be done about it.
 
-def FindCopyrightForm (Paper,Author,Warnings) :
+def FindCopyrightForm (Paper,Author,Warnings,Results = None) :
 
    Found = False
 
@@ -233,8 +307,11 @@ def FindCopyrightForm (Paper,Author,Warnings) :
          print("There seems to be just one copyright file in the directory,")
          print("so we will assume",OnlyFileName,"is the one to use.")
          print("It should be renamed as",CopyrightForm)
-         Warnings.append("Should rename " + OnlyFileName + " as " \
-                                                           + CopyrightForm)
+         Warning = "Should rename " + OnlyFileName + " as " + CopyrightForm
+         Warnings.append(Warning)
+         if (Results != None) :
+            Results.append(AdassChecks.CheckResult("Copyright","warning", \
+               Warning,OnlyFileName,0,"Rename it as " + CopyrightForm))
          CopyrightForm = OnlyFileName
          Found = True
       else :
@@ -242,14 +319,23 @@ def FindCopyrightForm (Paper,Author,Warnings) :
             print("* Could not find any copyright forms in the directory *")
             print("Unless a paper copy has been submitted, there should be ")
             print("a copyright form called",CopyrightForm)
-            Warnings.append("Could not find any copyright forms" +
-                                                         " in the directory")
+            Warning = "Could not find any copyright forms in the directory"
+            Warnings.append(Warning)
+            if (Results != None) :
+               Results.append(AdassChecks.CheckResult("Copyright","warning", \
+                  Warning,CopyrightForm,0,"Unless a paper copy has been " + \
+                      "submitted, supply the form as " + CopyrightForm))
          else :
             print("The directory has the following possible copyright forms:")
             for CopyrightFile in CopyrightFiles :
                print("   ",CopyrightFile)
             print("Unable to know which is the correct one for the paper")
-            Warnings.append("Cannot identify the correct copyright form to use")
+            Warning = "Cannot identify the correct copyright form to use"
+            Warnings.append(Warning)
+            if (Results != None) :
+               Results.append(AdassChecks.CheckResult("Copyright","warning", \
+                  Warning,CopyrightForm,0,"Rename the form for this paper " + \
+                              "as " + CopyrightForm + " and remove the others"))
          CopyrightForm = ""
 
    if (Found) :
@@ -636,22 +722,17 @@ def CheckPaperName(Paper,Problems) :
 #  sequences for these accented characters. Some LaTeX installations seem to
 #  handle these better than others, but it's probably best if they aren't used
 #  at all. This returns True if any unprintable characters were found, False
-#  otherwise.
+#  otherwise. If the file has already been checked by FindUnprintable(), the
+#  findings it returned for this encoding can be passed as Findings.
 
-def CheckUnprintable (TexFileName,Encoding) :
+def CheckUnprintable (TexFileName,Encoding,Findings = None) :
 
-   ReturnOK = False
-   LineNumber = 0
-   TexFile = open(TexFileName,mode='r')
-   for TexFileLine in TexFile :
-      LineNumber = LineNumber + 1
-      if (not TexFileLine.startswith("%")) :
-         Problem = AdassChecks.CheckCharacters(TexFileLine,LineNumber, \
-                                                             None,Encoding)
-         if (Problem) : ReturnOK = True
-   TexFile.close()
+   if (Findings == None) :
+      Findings = AdassChecks.FindUnprintable(TexFileName,[Encoding])[Encoding]
+   for Finding in Findings :
+      print(Finding.Message())
 
-   return ReturnOK
+   return (len(Findings) > 0)
 
 
 # ------------------------------------------------------------------------------
@@ -719,69 +800,523 @@ Reduce        = lambda r: partial(reduce, r)
 get_ssindices = compose(set, Map(methodcaller('group', 1)), Filter(truth),
                         Map(re.compile(r'^%?\\ssindex{([^}]*)}.*$').match), open)
 
+# The subject keyword lists, relative to the paper's directory
+# Is there a better way to use AdassConfig.* methods to point at relative file paths?
+__SubjectKeywordFiles__ = ['../Author_Template/subjectKeywords.txt', '../Author_Template/newKeywords.txt']
+
+# The keyword vocabulary is loaded once per process, and again only if one of the
+# keyword files changes: a frozenset of all the valid entries, so each entry is
+# checked in constant time, and the AdassIndex.SearchIndex for each file, used to
+# suggest near misses. In batch mode each process checking papers builds these
+# once, and keeps them for all the papers it checks.
+__SubjectKeywords__ = {}
+
+signature     = lambda path: (os.stat(path).st_mtime_ns, os.stat(path).st_size) if os.path.exists(path) else None
+
+def SubjectKeywords(KeywordFiles = __SubjectKeywordFiles__) :
+    Paths      = tuple(map(os.path.abspath, KeywordFiles))
+    Signatures = tuple(map(signature, Paths))
+    Cached     = __SubjectKeywords__.get(Paths)
+    if Cached is None or Cached[0] != Signatures:
+        Indexes = list(map(AdassIndex.ReadSearchIndex, Paths))
+        Cached  = (Signatures, frozenset(Entry for Index in Indexes for Entry in Index.Entries), Indexes)
+        __SubjectKeywords__[Paths] = Cached
+    return Cached[1:]
+
+# Up to Count known entries that look like an unknown one, best first
+def SuggestSubjectKeywords(Entry, Indexes, Count = 3) :
+    Scores = {}
+    for Score, Known in Reduce(__add__)([Index.Similar(Entry, Count) for Index in Indexes], []):
+        Scores[Known] = max(Score, Scores.get(Known, 0))
+    return [Known for Known, Score in sorted(Scores.items(), key=lambda item: (-item[1], item[0]))][:Count]
+
 def CheckSubjectIndexEntries(Paper, Problems, TexFileName = "") :
-    # Read the total list of keywords from subjectKeywords.txt and newKeywords.txt
-    # Is there a better way to use AdassConfig.* methods to point at relative file paths?
-    Entries = compose(set, Reduce(__add__), Map(AdassIndex.ReadIndexList))(
-                      ['../Author_Template/subjectKeywords.txt', '../Author_Template/newKeywords.txt'] )
+    # The total list of keywords from subjectKeywords.txt and newKeywords.txt
+    Entries, Indexes = SubjectKeywords()
     if not Entries:
         Problems.append( "No subject keywords found **at all**?! (../Author_Template/{subject|new}Keywords.txt missing?" )
         return False
 
-    # ssindex entries that are not in Entries pose a problem!
-    missing = get_ssindices(Paper + ".tex" if TexFileName == "" else TexFileName) - Entries
+    # ssindex entries that are not in Entries pose a problem! Suggest what might have been meant.
+    missing = sorted(get_ssindices(Paper + ".tex" if TexFileName == "" else TexFileName) - Entries)
+    def describe(entry):
+        suggestions = SuggestSubjectKeywords(entry, Indexes)
+        return "\t{0}\n".format(entry) + ("\t\tperhaps: {0}\n".format("; ".join(suggestions)) if suggestions else "")
     if missing:
         Problems.append( "Found ssindex{} entries that are not in subjectKeywords.txt/newKeywords.txt:\n" +
-                         "".join( map("\t{0}\n".format, missing) ) )
+                         "".join( map(describe, missing) ) )
     return not missing
 
 # ------------------------------------------------------------------------------
 
-#                   M a i n  P a p e r  C h e c k  P r o g r a m
+#                           C h e c k  S t a t e
 #
-#  This is the main code for the program. For details of how to invoke it,
-#  see the header comments.
+#  Supports the --incremental option, which lets an author who is editing a
+#  paper re-run PaperCheck without repeating the checks that cannot have been
+#  affected by what was changed - usually only the .bib file or a figure has
+#  been touched. Each step of CheckPaper() is described by the names of the
+#  files it reads and by any other details its results depend on (for
+#  example, the list of files in the directory). Together with a hash of the
+#  code for the checks themselves, these make up a signature for the step.
+#  After a step has been run, its signature, the output it printed, the
+#  problems it found and any value passed on to later steps are saved in a
+#  small state file (see __CheckStateName__) in the paper's directory. The
+#  next time, if a step's signature matches the saved one, the saved results
+#  are simply repeated. If the state file cannot be read or written, or if
+#  incremental checking is not enabled, every step is run as usual.
+#
+#  The state file is JSON, not a pickle, since it lives in a directory
+#  supplied by the authors (see AdassChecks.CachedTexProduct()).
+
+__CheckStateName__ = ".PaperCheckState.json"
+
+__CheckStateVersion__ = 1
+
+#  The modules whose code the checks depend on. If any of these change, the
+#  saved results are not used.
+
+__CheckCodeFiles__ = ["PaperCheck.py","AdassChecks.py","TexScanner.py",\
+                                              "AdassIndex.py","AdassConfig.py"]
+
+__CheckCodeDir__ = os.path.dirname(os.path.abspath(__file__))
+
+__CheckCodeHash__ = None
+
+class CheckState (object) :
+
+   def __init__ (self,Enabled = False,Directory = ".") :
+      self.Enabled = Enabled
+      self.FileName = os.path.join(Directory,__CheckStateName__)
+      self.Steps = {}
+      self.Hashes = {}
+      self.Name = ""
+      self.File = ""
+      self.Signature = ""
+      self.First = 0
+      self.FirstResult = 0
+      self.Output = None
+      self.Stdout = None
+      self.Changed = False
+      self.Result = None
+      if (Enabled) :
+         try :
+            StateFile = open(self.FileName,mode='r')
+            State = json.load(StateFile)
+            StateFile.close()
+            if (State.get("Version") == __CheckStateVersion__) :
+               self.Steps = State.get("Steps",{})
+         except (IOError,OSError,ValueError,AttributeError) :
+            self.Steps = {}
+
+   #  Returns the hash of the contents of a file, or a blank string if it
+   #  does not exist. A file is only hashed again if its modification time
+   #  or size has changed, which matters when the same CheckState is used
+   #  for a series of checks (see WatchPaper()).
+
+   def FileHash (self,FileName) :
+      try :
+         Stat = os.stat(FileName)
+         Key = (Stat.st_mtime_ns,Stat.st_size)
+         Saved = self.Hashes.get(FileName)
+         if (Saved == None or Saved[0] != Key) :
+            Saved = (Key,AdassChecks.TexFileHash(FileName))
+            self.Hashes[FileName] = Saved
+         return Saved[1]
+      except (IOError,OSError) :
+         self.Hashes.pop(FileName,None)
+         return ""
+
+   #  Works out the signature for the named step, given the list of files it
+   #  reads and any other details it depends on (which must be something
+   #  that can be saved as JSON). If the saved results for the step have the
+   #  same signature, they are repeated - the output is printed again and the
+   #  problems and CheckResults are added to Problems and Results - the value
+   #  the step produced is set in self.Result, and this returns True.
+   #  Otherwise, this returns False and the step needs to be run, between
+   #  calls to Start() and Finish(). (These need to be called even if
+   #  incremental checking is not enabled, as Finish() also adds a CheckResult
+   #  for each problem the step found.) Those CheckResults are for the first
+   #  of the Inputs, unless File is given.
+
+   def Replay (self,Name,Inputs,Problems,Results,Extra = None,File = "") :
+      self.Name = Name
+      self.File = File
+      if (File == "" and len(Inputs) > 0) : self.File = Inputs[0]
+      if (not self.Enabled) : return False
+      global __CheckCodeHash__
+      if (__CheckCodeHash__ == None) :
+         Hashes = []
+         for FileName in __CheckCodeFiles__ :
+            Hashes.append(self.FileHash(os.path.join(__CheckCodeDir__,FileName)))
+         __CheckCodeHash__ = Hashes
+      Details = [__CheckCodeHash__,Extra]
+      for FileName in Inputs :
+         Details.append([FileName,self.FileHash(FileName)])
+      self.Signature = hashlib.sha1(json.dumps(Details,sort_keys=True).\
+                                                  encode("utf-8")).hexdigest()
+      Saved = self.Steps.get(Name)
+      if (Saved == None or Saved.get("Signature") != self.Signature) :
+         return False
+      print("(Nothing this step depends on has changed since the last check)")
+      sys.stdout.write(Saved.get("Output",""))
+      Problems.extend(Saved.get("Problems",[]))
+      for Dict in Saved.get("Results",[]) :
+         Results.append(AdassChecks.CheckResult(**Dict))
+      self.Result = Saved.get("Result")
+      return True
+
+   #  Called before running a step whose saved results could not be used,
+   #  with the lists of problems and CheckResults found so far. From now on,
+   #  anything printed is also collected so it can be saved.
+
+   def Start (self,Problems,Results) :
+      self.First = len(Problems)
+      self.FirstResult = len(Results)
+      if (not self.Enabled) : return
+      self.Output = io.StringIO()
+      self.Stdout = sys.stdout
+      sys.stdout = TeeOutput(self.Stdout,self.Output)
+
+   #  Called once a step has been run, with the lists of problems and
+   #  CheckResults, and the value the step produced that is needed by later
+   #  steps, if any. A CheckResult is added for each new problem (see
+   #  ProblemResults()), and the results of the step are saved under the
+   #  signature worked out by Replay().
+
+   def Finish (self,Problems,Results,Result = None) :
+      ProblemResults(self.Name,Problems[self.First:],Results,self.File)
+      if (not self.Enabled) : return
+      sys.stdout = self.Stdout
+      self.Steps[self.Name] = {"Signature" : self.Signature, \
+             "Output" : self.Output.getvalue(), \
+             "Problems" : Problems[self.First:], \
+             "Results" : [Item.ToDict() for Item in \
+                                         Results[self.FirstResult:]], \
+             "Result" : Result}
+      self.Output = None
+      self.Changed = True
+
+   #  Writes out the saved results, if anything has changed. As with the
+   #  .tex file cache, the state is written to a temporary file which then
+   #  replaces the old one. mkstemp() creates this readable only by its owner,
+   #  so it is given the usual permissions for a new file first.
+
+   def Save (self) :
+      if (not self.Enabled or not self.Changed) : return
+      State = {"Version" : __CheckStateVersion__, "Steps" : self.Steps}
+      try :
+         FileDesc,TempName = tempfile.mkstemp(\
+                dir=os.path.dirname(os.path.abspath(self.FileName)),\
+                                                    prefix=__CheckStateName__)
+         TempFile = os.fdopen(FileDesc,'w')
+         TempFile.write(json.dumps(State,separators=(',',':')))
+         TempFile.close()
+         os.chmod(TempName,AdassChecks.NewFileMode())
+         os.replace(TempName,self.FileName)
+      except (IOError,OSError) :
+         pass
+
+#  Used by CheckState.Start() in place of sys.stdout, to send anything printed
+#  both to the original output and to a StringIO that collects it.
+
+class TeeOutput (object) :
+
+   def __init__ (self,Output,Copy) :
+      self.Output = Output
+      self.Copy = Copy
+
+   def write (self,Text) :
+      self.Copy.write(Text)
+      return self.Output.write(Text)
+
+   def flush (self) :
+      self.Output.flush()
 
-#  First, just check we have the necessary arguments.
+# ------------------------------------------------------------------------------
 
-NumberArgs = len(sys.argv)
-if (NumberArgs < 3) :
-   print(sys.argv)
-   print("Usage: PaperCheck <paper> <author>")
-   print("<paper> should be the identifier for the paper, eg O5-4")
-   print("<author> should be the surname of the first author")
-   print("e.g. PaperCheck 05-4 Jones")
-else :
+#                     D i r e c t o r y  L i s t i n g
+#
+#  Returns a sorted list of the files in the default directory, ignoring
+#  hidden files such as the state file used by CheckState. If Recursive is
+#  True, the files in sub-directories are included as well, as paths relative
+#  to the default directory. This is used to describe what the checks that
+#  look at the directory contents depend on.
+
+def DirectoryListing (Recursive = False) :
+
+   Listing = []
+   for Details in os.walk('.') :
+      Dir = os.path.relpath(Details[0],'.')
+      for FileName in Details[2] :
+         if (not FileName.startswith('.')) :
+            if (Dir != '.') : FileName = os.path.join(Dir,FileName)
+            Listing.append(FileName)
+      if (not Recursive) : break
+   Listing.sort()
+   return Listing
 
-   Paper = sys.argv[1]
-   PaperAuthor = sys.argv[2]
-   if NumberArgs>3:
-       PaperAuthor = " ".join(sys.argv[2:])
+# ------------------------------------------------------------------------------
 
-   print("")
-   print("          A D A S S   P a p e r   C h e c k")
-   print("")
-   print("This program will run a number of checks on the files in the")
-   print("default directory, assuming these include the main .tex file for")
-   print("the paper",Paper,"and any associated .eps graphics files and any")
-   print("supplied .bib BibTeX file.")
-   print("")
-   print("The surname of the main author is assumed to be",PaperAuthor)
-   print("")
-   print("This program cannot check all the possible problems with the paper.")
-   print("It does not check that the paper typesets properly using LaTeX,")
-   print("and it does not check the content of the paper or the references.")
-   print("However, it does perform a number of basic checks that will also")
-   print("be performed by the ADASS editors, and it will save a lot of time")
-   print("if you submit .tex files that pass these checks.")
-   print("")
+#                       D i r e c t o r y  W a t c h e r
+#
+#  Used by the --watch option to wait for files in the paper's directory to
+#  change. On Linux this uses inotify, called directly through ctypes so no
+#  extra package is needed, and the process just sleeps until a file is
+#  written, created, deleted or renamed. Anywhere else - or if inotify can't
+#  be used for some reason - it falls back to checking the modification times
+#  and sizes of the files every __WatchPollInterval__ seconds, using a single
+#  os.scandir() of the directory each time. Hidden files (including the state
+#  and cache files written by the checks themselves, and the swap files most
+#  editors use) and backup files ending in '~' are ignored. Only the directory
+#  itself is watched, not any sub-directories. Any other files whose changes
+#  should be ignored can be listed in Ignore.
+#
+#  Editors often save a file in several steps, so once a change is seen the
+#  watcher waits until things have been quiet for __WatchSettleTime__ seconds
+#  before reporting it.
+
+__WatchPollInterval__ = 0.5
+
+__WatchSettleTime__ = 0.2
+
+#  The inotify event flags used: IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE,
+#  IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE and IN_DELETE. IN_MODIFY is only
+#  used to notice that something is happening - the settle time covers the
+#  rest of the write.
+
+__InotifyMask__ = 0x002 | 0x004 | 0x008 | 0x040 | 0x080 | 0x100 | 0x200
+
+class DirectoryWatcher (object) :
+
+   def __init__ (self,Directory = ".",Ignore = None) :
+      self.Directory = Directory
+      self.Ignore = []
+      if (Ignore != None) : self.Ignore = Ignore
+      self.Descriptor = None
+      self.Snapshot = None
+      try :
+         import ctypes
+         import ctypes.util
+         Libc = ctypes.CDLL(ctypes.util.find_library("c"),use_errno=True)
+         Descriptor = Libc.inotify_init()
+         if (Descriptor >= 0) :
+            if (Libc.inotify_add_watch(Descriptor,\
+                 os.fsencode(os.path.abspath(Directory)),__InotifyMask__) < 0) :
+               os.close(Descriptor)
+            else :
+               self.Descriptor = Descriptor
+      except (ImportError,OSError,AttributeError,TypeError) :
+         self.Descriptor = None
+      if (self.Descriptor == None) : self.Snapshot = self.Scan()
+
+   #  Returns True if the named file is one whose changes should be ignored.
+
+   def Ignored (self,FileName) :
+      return (FileName == "" or FileName.startswith('.') or \
+                      FileName.endswith('~') or FileName in self.Ignore)
+
+   #  Returns a dictionary giving the modification time and size of each file
+   #  in the directory that isn't ignored, keyed by file name.
+
+   def Scan (self) :
+      Snapshot = {}
+      try :
+         for Entry in os.scandir(self.Directory) :
+            if (not self.Ignored(Entry.name)) :
+               try :
+                  Stat = Entry.stat()
+                  Snapshot[Entry.name] = (Stat.st_mtime_ns,Stat.st_size)
+               except OSError :
+                  pass
+      except OSError :
+         pass
+      return Snapshot
+
+   #  Returns the names of the files in the inotify events that can be read
+   #  from the descriptor within Timeout seconds, or an empty list if there
+   #  were none. (Timeout None means wait for as long as it takes.) Each event
+   #  is a 16 byte header - the watch descriptor, the mask, a cookie and the
+   #  length of the name - followed by the nul-padded name.
+
+   def ReadEvents (self,Timeout) :
+      FileNames = []
+      Ready = select.select([self.Descriptor],[],[],Timeout)[0]
+      if (len(Ready) > 0) :
+         Buffer = os.read(self.Descriptor,65536)
+         Offset = 0
+         while (Offset + 16 <= len(Buffer)) :
+            Length = struct.unpack_from("iIII",Buffer,Offset)[3]
+            Name = Buffer[Offset + 16:Offset + 16 + Length].rstrip(b'\0')
+            FileNames.append(os.fsdecode(Name))
+            Offset = Offset + 16 + Length
+      return FileNames
+
+   #  Waits until one or more files in the directory change, and returns a
+   #  sorted list of their names.
+
+   def Wait (self) :
+      Changed = set()
+      if (self.Descriptor != None) :
+         while (len(Changed) == 0) :
+            for FileName in self.ReadEvents(None) :
+               if (not self.Ignored(FileName)) : Changed.add(FileName)
+         while (True) :
+            FileNames = self.ReadEvents(__WatchSettleTime__)
+            if (len(FileNames) == 0) : break
+            for FileName in FileNames :
+               if (not self.Ignored(FileName)) : Changed.add(FileName)
+      else :
+         Settled = False
+         while (not Settled) :
+            time.sleep(__WatchPollInterval__)
+            Snapshot = self.Scan()
+            Names = set(Snapshot) | set(self.Snapshot)
+            New = set([Name for Name in Names \
+                        if Snapshot.get(Name) != self.Snapshot.get(Name)])
+            self.Snapshot = Snapshot
+            Settled = (len(New) == 0 and len(Changed) > 0)
+            Changed.update(New)
+            if (len(New) > 0) : time.sleep(__WatchSettleTime__)
+      return sorted(Changed)
+
+   #  Stops watching the directory.
+
+   def Close (self) :
+      if (self.Descriptor != None) :
+         os.close(self.Descriptor)
+         self.Descriptor = None
+
+# ------------------------------------------------------------------------------
+
+#                           W a t c h  P a p e r
+#
+#  Used for the --watch option. Checks the paper, then re-checks it each
+#  time any of the files in the default directory change, until interrupted.
+#  The same CheckState is used for every check, so only the steps affected by
+#  the files that changed are repeated, and everything AdassChecks has worked
+#  out from the .tex file (see AdassChecks.CachedTexProduct()) stays in memory
+#  between checks. Paper and PaperAuthor are as for CheckPaper(). If a file name
+#  is given as ResultsFileName, the CheckResults from each check are written
+#  to it (replacing those from the previous check) using a ResultsWriter in
+#  the specified Format. This returns the problems found by the last check.
+
+def WatchPaper (Paper,PaperAuthor,ResultsFileName = "",Format = "json") :
+
+   State = CheckState(True)
+   Watcher = None
+   try :
+      while (True) :
+         Results = []
+         Problems = CheckPaper(Paper,PaperAuthor,True,State,Results)
+         if (ResultsFileName != "") :
+            Writer = ResultsWriter(ResultsFileName,Format)
+            Writer.Add(os.getcwd(),Paper,Problems,Results)
+            Writer.Close()
+         if (Watcher == None) :
+            Watcher = DirectoryWatcher(".",[os.path.basename(ResultsFileName)])
+            Method = "polling"
+            if (Watcher.Descriptor != None) : Method = "inotify"
+         print("")
+         print("Watching for changes (using",Method + ") - Ctrl-C to stop")
+         Changed = Watcher.Wait()
+         print("")
+         print("====",time.strftime("%X"),"changed:",", ".join(Changed),"====")
+   except KeyboardInterrupt :
+      print("")
+   if (Watcher != None) : Watcher.Close()
+   return Problems
+
+# ------------------------------------------------------------------------------
+
+#                        P r o b l e m  R e s u l t s
+#
+#  Adds an AdassChecks.CheckResult to the list Results for each of the
+#  problems in the list Problems, as found by the check Check. These are all
+#  errors, since the problems are what the summary of CheckPaper() lists, and
+#  FileName is the file they refer to, if known. Fix is the fix to suggest for
+#  all of them, if there is one. A problem that runs over a number of lines is
+#  given as a single message. A problem that the check has already added a
+#  CheckResult for, with the same message, is not repeated.
+
+def ProblemResults (Check,Problems,Results,FileName = "",Fix = "") :
+
+   Given = set([Result.Message for Result in Results if Result.Check == Check])
+   for Problem in Problems :
+      Message = Problem.rstrip("\n")
+      if (not Message in Given) :
+         Results.append(AdassChecks.CheckResult(Check,"error",Message, \
+                                                          FileName,0,Fix))
+
+# ------------------------------------------------------------------------------
+
+#                        R e s u l t s  W r i t e r
+#
+#  Writes the CheckResults for one or more papers to a file, for the --json
+#  and --ndjson options. If Format is "json", the file is written as a single
+#  JSON object when Close() is called, with "Papers" giving a list with an
+#  entry for each paper. If Format is "ndjson", each result is written as soon
+#  as Add() is called, as a JSON object on a line of its own, with "Directory"
+#  and "Paper" added to say which paper it is for. The latter lets the results
+#  for a large volume be processed while the checks are still running, and
+#  lets the results be filtered with a simple line-by-line tool such as grep.
+#  Add() is passed the directory, the paper designation, the list of problems
+#  and the list of CheckResults for each paper.
+
+class ResultsWriter (object) :
+
+   def __init__ (self,FileName,Format = "json") :
+      self.Format = Format
+      self.Papers = []
+      self.File = open(FileName,mode='w')
+
+   def Add (self,Directory,Paper,Problems,Results) :
+      if (self.Format == "ndjson") :
+         for Result in Results :
+            Dict = Result.ToDict()
+            Dict["Directory"] = Directory
+            Dict["Paper"] = Paper
+            self.File.write(json.dumps(Dict,sort_keys=True) + "\n")
+         self.File.flush()
+      else :
+         self.Papers.append({"Directory" : Directory, "Paper" : Paper, \
+            "Problems" : len(Problems), \
+            "Results" : [Result.ToDict() for Result in Results]})
+
+   def Close (self) :
+      if (self.Format != "ndjson") :
+         json.dump({"Papers" : self.Papers},self.File,indent=1,sort_keys=True)
+         self.File.write("\n")
+      self.File.close()
+
+# ------------------------------------------------------------------------------
+
+#                           C h e c k  P a p e r
+#
+#  Runs the full set of checks on the paper whose files are in the default
+#  directory, printing out the details as it goes and finishing with a
+#  summary of any problems. Paper is the designation for the paper, eg O5-4,
+#  and PaperAuthor is the surname of the first author. If Incremental is True,
+#  any step whose inputs have not changed since the last check simply repeats
+#  its previous results (see CheckState). A CheckState to use can be passed
+#  as State, so that it can be kept between checks. If a list is passed as
+#  Results, an AdassChecks.CheckResult is added to it for each problem found,
+#  and for the details behind them where these are known - the line of each
+#  unprintable character, each unused or undefined reference, and so on. This
+#  returns the list of problems found, which will be empty if all was well.
+
+def CheckPaper (Paper,PaperAuthor,Incremental = False,State = None, \
+                                                           Results = None) :
 
    Problems = []
    Step = 0
+   if (State == None) : State = CheckState(Incremental)
+   if (Results == None) : Results = []
 
    #  Should check that we have a conforming paper name.
 
    CheckPaperName(Paper,Problems)
+   ProblemResults("PaperName",Problems,Results,Paper + ".tex", \
+                   "Use the paper ID from the conference programme, eg O5-4")
 
    #  Locate the main .tex file for the paper.
 
@@ -789,7 +1324,12 @@ else :
    print("")
    print("Step",Step," - Locate main .tex file for paper -------------------")
 
+   First = len(Problems)
    TexFileName = FindTexFile(Paper,Problems)
+   if (TexFileName == "") :
+      ProblemResults("TexFile",Problems[First:],Results,Paper + ".tex")
+   else :
+      ProblemResults("TexFile",Problems[First:],Results,TexFileName)
    if (TexFileName == "") :
 
       print("Unable to continue without a main .tex file for the paper")
@@ -798,25 +1338,35 @@ else :
 
       print("Found file ",TexFileName)
 
+      #  These are what the later steps depend on, as well as the .tex file.
+      #  The subject keyword lists are the ones CheckSubjectIndexEntries()
+      #  reads.
+
+      Listing = DirectoryListing()
+      BibFiles = [FileName for FileName in Listing if FileName.endswith(".bib")]
+      KeywordFiles = __SubjectKeywordFiles__
 
       #  Preliminary step. See if the TexParser used by AdassChecks has any
       #  problems with the .tex file. If so, it may well generate incorrect
       #  results.
 
-      TexFile = open(TexFileName,mode='r')
-      TheScanner = TexScanner.TexScanner()
-      TheScanner.SetFile(TexFile)
-      Finished = False
-      while (not Finished) :
-         Finished =  TheScanner.GetNextTexCommand(None,None,None)
-      if (not TheScanner.ParsedOK()) :
-         print("")
-         print("The parser used for these tests reported a problem:")
-         Report = TheScanner.GetReport()
-         for Line in Report :
-            print(Line)
-         Problems.append("There was a problem parsing the .tex file")
-      TexFile.close()
+      #  This is the only time the .tex file is actually parsed. The commands
+      #  found are remembered by AdassChecks.GetTexCommands(), and the
+      #  checks that follow are passed the ones they need from that list.
+
+      if (not State.Replay("Parse",[TexFileName],Problems,Results)) :
+         State.Start(Problems,Results)
+         Report = []
+         AdassChecks.GetTexCommands(TexFileName,Report)
+         if (len(Report) > 0) :
+            print("")
+            print("The parser used for these tests reported a problem:")
+            for Line in Report :
+               print(Line)
+               Results.append(AdassChecks.CheckResult("Parse","warning", \
+                                                           Line,TexFileName))
+            Problems.append("There was a problem parsing the .tex file")
+         State.Finish(Problems,Results)
 
       #  Check to see if the main .tex file makes use of any non-standard
       #  LaTeX packages..
@@ -825,11 +1375,14 @@ else :
       print("")
       print("Step",Step," - Check for use of unsupported LaTeX packages -------")
 
-      AllOK = AdassChecks.CheckPackages(Paper,TexFileName)
-      if (AllOK) :
-         print("No unsupported packages used")
-      else :
-         Problems.append("Problems were found with the use of LaTeX packages")
+      if (not State.Replay("Packages",[TexFileName],Problems,Results)) :
+         State.Start(Problems,Results)
+         AllOK = AdassChecks.CheckPackages(Paper,TexFileName,None,Results)
+         if (AllOK) :
+            print("No unsupported packages used")
+         else :
+            Problems.append("Problems were found with the use of LaTeX packages")
+         State.Finish(Problems,Results)
 
       #  Check to see if the main .tex file contains any characters some
       #  LaTeX installations might have problems with..
@@ -838,18 +1391,24 @@ else :
       print("")
       print("Step",Step," - Check for unprintable characters in the .tex file -")
 
-      Encodings = GetFileEncodings(TexFileName,Problems)
-      Warned = False
-      for Encoding in Encodings :
-         print(" ")
-         print("Assuming file is encoded using",Encoding)
-         Problem = CheckUnprintable(TexFileName,Encoding)
-         if (Problem) :
-            if (not Warned) : Problems.append( \
+      if (not State.Replay("Unprintable",[TexFileName],Problems,Results)) :
+         State.Start(Problems,Results)
+         Encodings = GetFileEncodings(TexFileName,Problems)
+         Findings = AdassChecks.FindUnprintable(TexFileName,Encodings)
+         Warned = False
+         for Encoding in Encodings :
+            print(" ")
+            print("Assuming file is encoded using",Encoding)
+            Problem = CheckUnprintable(TexFileName,Encoding,Findings[Encoding])
+            for Finding in Findings[Encoding] :
+               Results.append(Finding.Result("Unprintable",TexFileName))
+            if (Problem) :
+               if (not Warned) : Problems.append( \
                      "Unprintable characters in the .tex file should be fixed")
-            Warned = True
-         else :
-            print("No unprintable characters found - all OK")
+               Warned = True
+            else :
+               print("No unprintable characters found - all OK")
+         State.Finish(Problems,Results)
 
       #  Check that a proper BibTeX file is being used, not an old-style
       #  bibliography using \bibitem entries..
@@ -858,7 +1417,12 @@ else :
       print("")
       print("Step",Step," - Check that bibliography entries use a BibTex file -")
 
-      BibFileName = CheckBibFileUsage(TexFileName,Problems)
+      if (State.Replay("BibFile",[TexFileName],Problems,Results,Listing)) :
+         BibFileName = State.Result
+      else :
+         State.Start(Problems,Results)
+         BibFileName = CheckBibFileUsage(TexFileName,Problems)
+         State.Finish(Problems,Results,BibFileName)
 
       #  Check on the references supplied and cited in .tex file.
 
@@ -866,11 +1430,19 @@ else :
       print("")
       print("Step",Step," - Check references against citations ---------------")
 
-      AllOK = AdassChecks.VerifyRefs(Paper,False,TexFileName,BibFileName)
-      if (AllOK) :
-         print("No problems found")
-      else :
-         Problems.append("Problems were found with the use of references")
+      if (not State.Replay("References",[TexFileName] + BibFiles,Problems, \
+                                       Results,[Listing,BibFileName])) :
+         State.Start(Problems,Results)
+         Diff = []
+         AllOK = AdassChecks.VerifyRefs(Paper,False,TexFileName,BibFileName, \
+                                                              None,None,Diff)
+         for RefsDiff in Diff :
+            Results.extend(RefsDiff.Results(TexFileName,BibFileName,False))
+         if (AllOK) :
+            print("No problems found")
+         else :
+            Problems.append("Problems were found with the use of references")
+         State.Finish(Problems,Results)
 
 
       #  Check explicitly on the use of \cite for any references.
@@ -879,24 +1451,34 @@ else :
       print("")
       print("Step",Step," - Check use of use of \cite for references ---------")
 
-      AllOK = AdassChecks.CheckCite(Paper,TexFileName)
-      if (AllOK) :
-         print("No problems found")
-      else :
-         Problems.append(
-            "References make use of \cite instead of \citep or \citet")
+      if (not State.Replay("Cite",[TexFileName],Problems,Results)) :
+         State.Start(Problems,Results)
+         AllOK = AdassChecks.CheckCite(Paper,TexFileName,None,Results)
+         if (AllOK) :
+            print("No problems found")
+         else :
+            Problems.append(
+               "References make use of \cite instead of \citep or \citet")
+         State.Finish(Problems,Results)
 
       #  Check on the graphics files supplied and used by the main .tex file.
+      #  This only looks at the names of the graphics files, not their
+      #  contents, so it depends on the files in the directory and any
+      #  sub-directories rather than on what is in them.
 
       Step = Step + 1
       print("")
       print("Step",Step," - Check use of graphics files ----------------------")
 
-      AllOK = AdassChecks.VerifyEps(Paper,TexFileName)
-      if (AllOK) :
-         print("No problems found")
-      else :
-         Problems.append("Problems were found with the use of graphics files")
+      if (not State.Replay("Graphics",[TexFileName],Problems,Results, \
+                                                   DirectoryListing(True))) :
+         State.Start(Problems,Results)
+         AllOK = AdassChecks.VerifyEps(Paper,TexFileName,None,None,Results)
+         if (AllOK) :
+            print("No problems found")
+         else :
+            Problems.append("Problems were found with the use of graphics files")
+         State.Finish(Problems,Results)
 
       #  Check the running heads for the paper specified by the main .tex file.
 
@@ -904,11 +1486,15 @@ else :
       print("")
       print("Step",Step," - Check the running heads for the paper ------------")
 
-      AllOK = AdassChecks.CheckRunningHeads(Paper,TexFileName)
-      if (AllOK) :
-         print("No problems found")
-      else :
-         Problems.append("Problems were found with the use of \\markboth")
+      if (not State.Replay("RunningHeads",[TexFileName],Problems,Results)) :
+         State.Start(Problems,Results)
+         AllOK = AdassChecks.CheckRunningHeads(Paper,TexFileName,None,\
+                                                                     Results)
+         if (AllOK) :
+            print("No problems found")
+         else :
+            Problems.append("Problems were found with the use of \\markboth")
+         State.Finish(Problems,Results)
 
 
       #  Check on the parsing of the author list from the .tex file.
@@ -917,29 +1503,35 @@ else :
       print("")
       print("Step",Step," - Check parsing of author list ---------------------")
 
-      Notes = []
-      AuthorList = AdassChecks.GetAuthors(Paper,Notes,TexFileName)
-      print("Author list parsed as follows (as surname, then initials):")
-      for Author in AuthorList :
-         print("   ",Author)
-      if (len(Notes) == 0) :
-         print("No problems found")
-      else :
-         print("The following possible problems were found:")
-         for Note in Notes :
-            print("*",Note,"*")
-         Problems.append("There may be issues with the author list")
-      if (len(AuthorList) > 0) :
-         FirstAuthor = AuthorList[0]
-         if (not FirstAuthor.startswith(PaperAuthor)) :
-            FirstAuthor = \
-              FirstAuthor.replace("\\","").replace("'","").replace("`","")
-            TrimPaperAuthor = \
-              PaperAuthor.replace("\\","").replace("'","").replace("`","")
-            if (not FirstAuthor.startswith(TrimPaperAuthor)) :
-               Problem = "First author does not appear to be " + PaperAuthor
-               print("**",Problem,"**")
-               Problems.append(Problem)
+      if (not State.Replay("Authors",[TexFileName],Problems,Results, \
+                                                             PaperAuthor)) :
+         State.Start(Problems,Results)
+         Notes = []
+         AuthorList = AdassChecks.GetAuthors(Paper,Notes,TexFileName)
+         print("Author list parsed as follows (as surname, then initials):")
+         for Author in AuthorList :
+            print("   ",Author)
+         if (len(Notes) == 0) :
+            print("No problems found")
+         else :
+            print("The following possible problems were found:")
+            for Note in Notes :
+               print("*",Note,"*")
+               Results.append(AdassChecks.CheckResult("Authors","warning", \
+                                                           Note,TexFileName))
+            Problems.append("There may be issues with the author list")
+         if (len(AuthorList) > 0) :
+            FirstAuthor = AuthorList[0]
+            if (not FirstAuthor.startswith(PaperAuthor)) :
+               FirstAuthor = \
+                 FirstAuthor.replace("\\","").replace("'","").replace("`","")
+               TrimPaperAuthor = \
+                 PaperAuthor.replace("\\","").replace("'","").replace("`","")
+               if (not FirstAuthor.startswith(TrimPaperAuthor)) :
+                  Problem = "First author does not appear to be " + PaperAuthor
+                  print("**",Problem,"**")
+                  Problems.append(Problem)
+         State.Finish(Problems,Results)
 
       #  Check if the ssindex keywords in the file are valid
 
@@ -947,19 +1539,30 @@ else :
       print("")
       print("Step",Step," - Check ssindex entries ---------------------")
 
-      if not CheckSubjectIndexEntries(Paper, Problems, TexFileName) :
-          print("** There may be undefined ssindex keywords in the tex file")
-      else:
-          print("No problems found")
+      if (not State.Replay("SubjectIndex",[TexFileName] + KeywordFiles, \
+                                                         Problems,Results)) :
+         State.Start(Problems,Results)
+         if not CheckSubjectIndexEntries(Paper, Problems, TexFileName) :
+             print("** There may be undefined ssindex keywords in the tex file")
+         else:
+             print("No problems found")
+         State.Finish(Problems,Results)
 
       #  Check if there is a copyright form
       Step = Step + 1
       print("")
       print("Step", Step, " - Check copyright form --------------------")
-      if (not FindCopyrightForm(Paper, Author, Problems)):
-         Problem = "CopyRight form not found"
-      else:
-         print("CopyRight form found")
+      CopyrightForm = "copyrightForm_" + Paper + "_" + PaperAuthor + ".pdf"
+      if (not State.Replay("Copyright",[],Problems,Results, \
+                                  [Listing,PaperAuthor],CopyrightForm)) :
+         State.Start(Problems,Results)
+         if (not FindCopyrightForm(Paper, PaperAuthor, Problems, Results)):
+            Problem = "CopyRight form not found"
+         else:
+            print("CopyRight form found")
+         State.Finish(Problems,Results)
+
+      State.Save()
 
       #  Summarise any problems.
 
@@ -982,6 +1585,219 @@ else :
          print("For more details, see the earlier diagnostics from the", \
                                                           "various stages")
 
-      #  See if there is a copyright form
+   return Problems
+
+# ------------------------------------------------------------------------------
+
+#                   C h e c k  P a p e r  D i r e c t o r y
+#
+#  Used by BatchCheck() to check the paper whose files are in the specified
+#  directory. This is run in a separate process, so it can change to the
+#  paper's directory and then proceed much as if PaperCheck had been run
+#  there. The main .tex file is found using AdassChecks.LocateTexFile(),
+#  using the directory name as the likely paper designation, and the first
+#  author is taken from the .tex file itself. Everything that would have been
+#  printed is collected as a transcript. This returns a tuple giving the
+#  directory, the paper designation (blank if no .tex file was found), the
+#  list of problems, the transcript and a list of AdassChecks.CheckResult
+#  objects for the problems. Incremental is passed on to CheckPaper().
+
+def CheckPaperDirectory (Directory,Incremental = False) :
+
+   Paper = ""
+   Problems = []
+   Results = []
+   Transcript = io.StringIO()
+   try :
+      os.chdir(Directory)
+      with contextlib.redirect_stdout(Transcript) :
+         Details = []
+         TexFiles = AdassChecks.LocateTexFile(os.path.basename(Directory),\
+                                                           Details,True)
+         if (len(TexFiles) == 0) :
+            Problems.append("Unable to locate a main .tex file")
+            ProblemResults("TexFile",Problems,Results)
+            for Line in Details :
+               print(Line)
+         else :
+            Paper = TexFiles[0][:-4]
+            PaperAuthor = ""
+            Authors = AdassChecks.GetAuthors(Paper,[],"",True)
+            if (len(Authors) > 0) :
+               PaperAuthor = AdassChecks.AuthorSurname(Authors[0])
+            Problems = CheckPaper(Paper,PaperAuthor,Incremental,None,Results)
+   except Exception :
+      Problems.append("PaperCheck failed: " + \
+                         traceback.format_exc().strip().split("\n")[-1])
+      ProblemResults("PaperCheck",Problems[-1:],Results)
+      Transcript.write(traceback.format_exc())
+
+   return (Directory,Paper,Problems,Transcript.getvalue(),Results)
+
+# ------------------------------------------------------------------------------
+
+#                            B a t c h  C h e c k
+#
+#  Runs PaperCheck on every paper in an ADASS volume. VolumeDir is the top
+#  level directory for the volume, and each paper is assumed to be in its own
+#  sub-directory (see AdassChecks.PaperDirectories()). The papers are checked
+#  in parallel, using a pool of Jobs processes (by default, one for each
+#  processor). A report is written to the file ReportFileName, listing the
+#  problems found for each paper, followed by the full output of the checks
+#  for each paper that had problems. If Incremental is True, each paper only
+#  re-runs the checks affected by files that have changed since it was last
+#  checked (see CheckState). If a ResultsWriter is passed as Writer, the
+#  CheckResults for each paper are passed to it as soon as the paper has been
+#  checked. This returns the number of papers for which problems were found.
+
+def BatchCheck (VolumeDir,ReportFileName,Jobs = None,Incremental = False, \
+                                                             Writer = None) :
+
+   VolumeDir = os.path.abspath(VolumeDir)
+   Directories = AdassChecks.PaperDirectories(VolumeDir)
+   print("Checking",len(Directories),"papers in",VolumeDir)
+
+   Results = []
+   Executor = concurrent.futures.ProcessPoolExecutor(max_workers = Jobs)
+   for Result in Executor.map(CheckPaperDirectory,Directories,\
+                                         [Incremental] * len(Directories)) :
+      Directory,Paper,Problems,Transcript,CheckResults = Result
+      if (Writer != None) : Writer.Add(Directory,Paper,Problems,CheckResults)
+      Status = "OK"
+      if (len(Problems) > 0) : Status = str(len(Problems)) + " problem(s)"
+      print("   ",os.path.relpath(Directory,VolumeDir),Paper,Status)
+      Results.append(Result)
+   Executor.shutdown()
+
+   Failed = 0
+   for Directory,Paper,Problems,Transcript,CheckResults in Results :
+      if (len(Problems) > 0) : Failed = Failed + 1
+
+   ReportFile = open(ReportFileName,mode='w')
+   ReportFile.write("ADASS Paper Check - report for " + VolumeDir + "\n")
+   ReportFile.write(time.strftime("%c") + "\n\n")
+   ReportFile.write(str(len(Results)) + " papers checked, " + str(Failed) + \
+                                           " with problems\n\n")
+   for Directory,Paper,Problems,Transcript,CheckResults in Results :
+      Name = os.path.relpath(Directory,VolumeDir)
+      if (Paper != "") : Name = Name + " (" + Paper + ".tex)"
+      if (len(Problems) == 0) :
+         ReportFile.write(Name + ": OK\n")
+      else :
+         ReportFile.write(Name + ": " + str(len(Problems)) + " problem(s)\n")
+         for Problem in Problems :
+            ReportFile.write("    " + Problem.rstrip("\n").replace(\
+                                                  "\n","\n    ") + "\n")
+   ReportFile.write("\n---------------- Details " + "-" * 40 + "\n")
+   for Directory,Paper,Problems,Transcript,CheckResults in Results :
+      if (len(Problems) > 0) :
+         ReportFile.write("\n==== " + os.path.relpath(Directory,VolumeDir) + \
+                                                               " ====\n")
+         ReportFile.write(Transcript)
+   ReportFile.close()
+
+   print("")
+   print(len(Results),"papers checked,",Failed,"with problems")
+   print("Report written to",ReportFileName)
+
+   return Failed
+
+# ------------------------------------------------------------------------------
+
+#                   M a i n  P a p e r  C h e c k  P r o g r a m
+#
+#  This is the main code for the program. For details of how to invoke it,
+#  see the header comments. (It is only run when this file is run as a script,
+#  so that BatchCheck() can import it into the processes it uses.)
+
+if (__name__ == "__main__") :
+
+   #  The --incremental and --watch options can go anywhere in the arguments,
+   #  as can --json and --ndjson, each followed by the name of a file.
+
+   Incremental = False
+   if ("--incremental" in sys.argv) :
+      Incremental = True
+      sys.argv = [Arg for Arg in sys.argv if Arg != "--incremental"]
+   Watch = False
+   if ("--watch" in sys.argv) :
+      Watch = True
+      sys.argv = [Arg for Arg in sys.argv if Arg != "--watch"]
+   Format = ""
+   ResultsFileName = ""
+   for Option in ("--json","--ndjson") :
+      if (Option in sys.argv) :
+         Index = sys.argv.index(Option)
+         if (Index + 1 < len(sys.argv)) :
+            Format = Option[2:]
+            ResultsFileName = sys.argv[Index + 1]
+            del sys.argv[Index:Index + 2]
+
+   #  First, just check we have the necessary arguments.
+
+   NumberArgs = len(sys.argv)
+   if (NumberArgs >= 3 and sys.argv[1] == "--batch") :
+
+      #  Batch mode, checking all the papers in a volume.
+
+      VolumeDir = sys.argv[2]
+      ReportFileName = "PaperCheckReport.txt"
+      if (NumberArgs > 3) : ReportFileName = sys.argv[3]
+      Jobs = None
+      if (NumberArgs > 4) : Jobs = int(sys.argv[4])
+      Writer = None
+      if (ResultsFileName != "") :
+         Writer = ResultsWriter(ResultsFileName,Format)
+      Failed = BatchCheck(VolumeDir,ReportFileName,Jobs,Incremental,Writer)
+      if (Writer != None) : Writer.Close()
+      sys.exit( - Failed )
+
+   elif (NumberArgs < 3) :
+      print(sys.argv)
+      print("Usage: PaperCheck <paper> <author>")
+      print("<paper> should be the identifier for the paper, eg O5-4")
+      print("<author> should be the surname of the first author")
+      print("e.g. PaperCheck 05-4 Jones")
+      print("or:    PaperCheck --batch <volume directory> [<report> [<jobs>]]")
+      print("to check every paper in a volume, writing a report file")
+      print("Add --incremental to only repeat the checks affected by files")
+      print("that have changed since the paper was last checked, or --watch")
+      print("to keep re-checking the paper each time its files change")
+      print("Add --json <file> or --ndjson <file> to also write the results")
+      print("to a file as JSON, or as one JSON object per line")
+   else :
+
+      Paper = sys.argv[1]
+      PaperAuthor = sys.argv[2]
+      if NumberArgs>3:
+          PaperAuthor = " ".join(sys.argv[2:])
+
+      print("")
+      print("          A D A S S   P a p e r   C h e c k")
+      print("")
+      print("This program will run a number of checks on the files in the")
+      print("default directory, assuming these include the main .tex file for")
+      print("the paper",Paper,"and any associated .eps graphics files and any")
+      print("supplied .bib BibTeX file.")
+      print("")
+      print("The surname of the main author is assumed to be",PaperAuthor)
+      print("")
+      print("This program cannot check all the possible problems with the paper.")
+      print("It does not check that the paper typesets properly using LaTeX,")
+      print("and it does not check the content of the paper or the references.")
+      print("However, it does perform a number of basic checks that will also")
+      print("be performed by the ADASS editors, and it will save a lot of time")
+      print("if you submit .tex files that pass these checks.")
+      print("")
+
+      if (Watch) :
+         Problems = WatchPaper(Paper,PaperAuthor,ResultsFileName,Format)
+      else :
+         Results = []
+         Problems = CheckPaper(Paper,PaperAuthor,Incremental,None,Results)
+         if (ResultsFileName != "") :
+            Writer = ResultsWriter(ResultsFileName,Format)
+            Writer.Add(os.getcwd(),Paper,Problems,Results)
+            Writer.Close()
 
       sys.exit( - len(Problems) )
@@ -5,7 +5,8 @@
 #  Defines a TexScanner class that can be used to extract LaTeX directives
 #  from a .tex file. Call SetFile() to supply a reference to an already
 #  open .tex file, then use successive calls to GetNextTexCommand() to get 
-#  all the tex directives and their parameters from the file. This probably
+#  all the tex directives and their parameters from the file (or loop over
+#  the commands produced by IterTexCommands()). This probably
 #  isn't of very general utility when it comes to parsing .tex files, but
 #  it is useful for the ADASS editing purposes for which it was written,
 #  where all that was wanted was to find graphics or citation commands and
@@ -67,6 +68,38 @@
 #                    code worked unchanged under Python3, and since it doesn't
 #                    use print, doesn't really need that future import, but it
 #                    seems to be good practice anyway.) KS.
+#     18th Oct 2026. Reworked the scanning engine. SetFile() now reads the
+#                    whole file in one go, strips the comments with a single
+#                    regular expression substitution and turns newlines into
+#                    spaces. GetNextWord() then works on this buffer using
+#                    index arithmetic and compiled patterns instead of
+#                    reading one character at a time through GetNextChar().
+#                    The rules for comments, escaped characters and line
+#                    ends are unchanged, and so are the words returned.
+#                    GetNextTexCommand() uses the new SkipPlainWords() to
+#                    jump straight to the next word that can hold a command.
+#                    Added the TexDispatcher class, which allows a number of
+#                    callbacks, each interested in its own set of directives,
+#                    to share a single scan of a .tex file. CommandLine now
+#                    gives the line number of the directive for the command
+#                    most recently passed to a callback. Added the TexCommand
+#                    class, a list of words that also records the line the
+#                    command was found on.
+#                    Commands are now passed to callbacks as TexCommand
+#                    objects, which now also record the start and end offsets
+#                    of the command in the file and its column. The new
+#                    FilePosition() turns a position in the text buffer back
+#                    into a position in the file, allowing for comments, and
+#                    the new BufferPosn() allows for the carriage returns
+#                    removed from the arguments of commands.
+#                    Added IterTexCommands(), a generator that produces the
+#                    commands in the file one at a time, so a caller can stop
+#                    the scan as soon as it has found what it needs.
+#                    Added SetDirectives(), which limits a scan to the commands
+#                    using a given set of directives, and uses a search for
+#                    their names to skip the arguments that cannot contain
+#                    any of them and to stop once none are left. Added
+#                    TexDispatcher.GetDirectives() for use with it.
 #
 
 from __future__ import (print_function,division,absolute_import)
@@ -74,27 +107,209 @@ from __future__ import (print_function,division,absolute_import)
 import os
 import sys
 import string
+import re
+import bisect
+import itertools
+
+class TexCommand(list):
+
+   #  A TexCommand is what the scanner passes to a callback routine for each
+   #  command it finds. It is a list of strings - the directive followed by
+   #  its arguments - so it can be used just as the plain lists passed to
+   #  callbacks always have been. It also records where the command was found
+   #  in the file: Start is the offset of the '\' of the directive from the
+   #  start of the file and End is the offset just past the last of its
+   #  arguments (both counted in characters of the file as read, comments
+   #  included), and Line and Column give the line and column of the '\',
+   #  both starting from 1. All of these are zero if the position isn't known.
+   #  Slots are used so that this costs no more than four integers for each
+   #  command.
+   
+   __slots__ = ("Start","End","Line","Column")
+   
+   def __init__(self,Words = (),Start = 0,End = 0,Line = 0,Column = 0) :
+      list.__init__(self,Words)
+      self.Start = Start
+      self.End = End
+      self.Line = Line
+      self.Column = Column
 
 class TexScanner(object):
 
+   #  Compiled patterns used by the scanning routines. A comment runs from a
+   #  '%' character that does not follow a '\' up to, but not including,
+   #  the end of the line. Blanks, as far as separating words goes, are
+   #  spaces, newlines and carriage returns (but not tabs). An ordinary word
+   #  continues up to a blank or an opening brace or bracket that is not
+   #  escaped. Within a braced or bracketed word, only unescaped delimiters
+   #  of the same type affect the nesting.
+   
+   __CommentPattern__ = re.compile(r"(?<!\\)%[^\n]*")
+   __BlankPattern__ = re.compile(r"[ \r\n]*")
+   __WordPattern__ = re.compile(r"(?:[^ \r\n{\[]|(?<=\\)[{\[])*")
+   __DelimPatterns__ = { "{" : re.compile(r"(?<!\\)[{}]"),
+                         "[" : re.compile(r"(?<!\\)[\[\]]") }
+   __EndDelims__ = { "{" : "}", "[" : "]" }
+   __CandidatePattern__ = re.compile(r"[\\{\[]")
+
    def __init__(self):
       self.FileIdSet = False
       self.Escaped = False
       self.WasEscaped = False
-      self.LastChar = ""
       self.LastWord = ""
+      self.LastWordPosn = 0
+      self.WordPosn = 0
       self.Line = 0
+      self.CommandLine = 0
       self.Problems = []
+      self.Text = ""
+      self.Posn = 0
+      self.NewLines = []
+      self.Returns = []
+      self.CommentPosns = []
+      self.CommentShifts = []
+      self.Directives = None
+      self.DirectivePattern = None
+      self.NextWanted = -1
       
    def SetFile(self,FileId) :
    
       #  Needs to be called before any of the Get... routines. This passes
-      #  the Id of an open .tex file to the scanner.
+      #  the Id of an open .tex file to the scanner. The whole of the file
+      #  is read at this point, and the rest of the scanning works on the
+      #  text held in memory. Comments are removed, and newline characters
+      #  are turned into spaces, which is what LaTeX does with them. The
+      #  positions of the original newlines are kept in NewLines so that
+      #  line numbers can still be worked out when they are needed. The
+      #  position in the buffer of each comment that was removed is kept in
+      #  CommentPosns, and the total number of characters removed up to and
+      #  including that comment is kept in CommentShifts, so that a position
+      #  in the buffer can be turned back into a position in the file. The
+      #  positions of any carriage returns are kept in Returns, as these are
+      #  removed from braced words (see BufferPosn()).
       
       self.FileId = FileId
       self.FileIdSet = True
       self.Line = 0
+      self.CommandLine = 0
       self.Problems = []
+      self.Escaped = False
+      self.WasEscaped = False
+      self.LastWord = ""
+      Raw = FileId.read()
+      Text = self.__CommentPattern__.sub("",Raw)
+      Spans = [Match.span() for Match in self.__CommentPattern__.finditer(Raw)]
+      self.CommentShifts = \
+                  list(itertools.accumulate([End - Start for Start,End in Spans]))
+      self.CommentPosns = [Span[1] - Shift for Span,Shift in \
+                                            zip(Spans,self.CommentShifts)]
+      NewLines = []
+      Index = Text.find("\n")
+      while (Index >= 0) :
+         NewLines.append(Index)
+         Index = Text.find("\n",Index + 1)
+      self.NewLines = NewLines
+      Returns = []
+      Index = Text.find("\r")
+      while (Index >= 0) :
+         Returns.append(Index)
+         Index = Text.find("\r",Index + 1)
+      self.Returns = Returns
+      self.Text = Text.replace("\n"," ")
+      self.Posn = 0
+      self.NextWanted = -1
+   
+   def SetDirectives(self,Directives) :
+   
+      #  Restricts the commands passed to callbacks to those using one of the
+      #  directives listed in Directives (eg ["\\title","\\author"]). If
+      #  Directives is None, as it is initially, all commands are passed on.
+      #  This can make a scan much quicker, since most of the time goes in
+      #  searching the arguments of each command for other commands. Those
+      #  searches can only find one of the wanted directives if its name
+      #  appears somewhere in the argument, and a single search of the text
+      #  for any of the names shows whether this is the case. In the same way,
+      #  once there are no more of the names in the rest of the file, the scan
+      #  can finish. The commands that are passed on are exactly those that a
+      #  full scan would have found, in the same order. However, since the
+      #  scan may finish early, problems in the rest of the file (see
+      #  GetReport()) may not be noticed.
+      
+      if (Directives == None) :
+         self.Directives = None
+         self.DirectivePattern = None
+      else :
+         self.Directives = set(Directives)
+         Names = sorted(self.Directives,key=len,reverse=True)
+         self.DirectivePattern = \
+                    re.compile("|".join([re.escape(Name) for Name in Names]))
+      self.NextWanted = -1
+   
+   def LineNumber(self,Posn) :
+   
+      #  Returns the number of newline characters in the file before the
+      #  given position in the text buffer. (So the line number of the
+      #  character at that position is one more than the value returned.)
+      
+      return bisect.bisect_left(self.NewLines,Posn)
+   
+   def FilePosition(self,Posn) :
+   
+      #  Returns the offset in the file of the character at the given position
+      #  in the text buffer, allowing for the comments that were removed.
+      
+      Index = bisect.bisect_right(self.CommentPosns,Posn)
+      if (Index > 0) : Posn = Posn + self.CommentShifts[Index - 1]
+      return Posn
+   
+   def BufferPosn(self,Offset,Posn) :
+   
+      #  Returns the position in the text buffer of the character at Posn in
+      #  a string taken from the buffer starting at Offset. GetNextWord()
+      #  removes any carriage returns from a braced word, so the carriage
+      #  returns in the buffer from Offset up to that character have to be
+      #  added back. Each one added can move the position past another, so
+      #  this keeps counting until the number stops changing.
+      
+      Posn = Offset + Posn
+      Returns = self.Returns
+      if (len(Returns) == 0) : return Posn
+      First = bisect.bisect_left(Returns,Offset)
+      Count = 0
+      while (True) :
+         Skipped = bisect.bisect_right(Returns,Posn + Count) - First
+         if (Skipped == Count) : break
+         Count = Skipped
+      return Posn + Count
+   
+   def SetPosition(self,Command,Start,End) :
+   
+      #  Sets the position details in a TexCommand, given the positions in
+      #  the text buffer of its first character and of the character just
+      #  after its end. End can be passed as None if it isn't known yet, in
+      #  which case the end is left to be set later. A comment ends at the
+      #  end of a line, so none can have been removed between the start of a
+      #  line and a command on it, and the column can be worked out from the
+      #  buffer positions. This is called for every command found, so it
+      #  avoids calling LineNumber() and FilePosition(), and the common case
+      #  of a file with no comments is quick.
+      
+      NewLines = self.NewLines
+      Lines = bisect.bisect_left(NewLines,Start)
+      Command.Line = Lines + 1
+      if (Lines > 0) :
+         Command.Column = Start - NewLines[Lines - 1]
+      else :
+         Command.Column = Start + 1
+      CommentPosns = self.CommentPosns
+      if (len(CommentPosns) > 0) :
+         Index = bisect.bisect_right(CommentPosns,Start)
+         if (Index > 0) : Start = Start + self.CommentShifts[Index - 1]
+         if (End != None and End > 0) :
+            Index = bisect.bisect_right(CommentPosns,End - 1)
+            if (Index > 0) : End = End + self.CommentShifts[Index - 1]
+      Command.Start = Start
+      if (End != None) : Command.End = End
    
    def ParsedOK(self) :
    
@@ -113,28 +328,24 @@ class TexScanner(object):
    
    def GetNextChar(self) :
    
-      #  Returns the next character from a .tex file. If a comment character
-      #  ('%') is encountered, this skips to the end of the current line and
-      #  returns the newline character at the end. If the end of the file is
-      #  reached, or if the file is not open, this returns an empty string. 
-      #  Allow for the case where the comment character was escaped, in which
-      #  case treat it as a literal '%'. LaTeX treats an end of line like a 
-      #  space, and we intercept "\n" characters and turn them into spaces to
-      #  get the same effect.
+      #  Returns the next character from a .tex file. Comments have already
+      #  been removed, so if a comment character ('%') was encountered, the
+      #  next character returned will be the newline at the end of the line.
+      #  If the end of the file is reached, or if the file is not open, this
+      #  returns an empty string. An escaped comment character is treated as
+      #  a literal '%'. LaTeX treats an end of line like a space, and the
+      #  "\n" characters have already been turned into spaces to get the
+      #  same effect. (Note that GetNextWord() no longer uses this routine,
+      #  but works directly on the text buffer.)
       
       Char = ""
       if (self.FileIdSet) :
-         Char = self.FileId.read(1)
-         if (Char == "%") :
-            if (not self.Escaped) :
-               while (True) :
-                  Char = self.FileId.read(1)
-                  if (Char == "\n" or Char == "") : break
+         if (self.Posn < len(self.Text)) :
+            Char = self.Text[self.Posn]
+            self.Posn = self.Posn + 1
          self.WasEscaped = self.Escaped
          self.Escaped = (Char == "\\")
-         if (Char == "\n") :
-            Char = " "
-            self.Line = self.Line + 1
+         self.Line = self.LineNumber(self.Posn)
       return Char 
           
    def GetNextLine(self) :
@@ -164,71 +375,97 @@ class TexScanner(object):
       #  a word. Blanks and { and [ characters delimit words, as do the 
       #  ends of lines, which are assumed to be one or more of \n and \r
       #  characters. Ends of lines are removed when encountered within
-      #  {} or [] characters.
+      #  {} or [] characters. A character is escaped if the character
+      #  before it in the buffer is a '\'. The position in the buffer of
+      #  the start of the word is left in WordPosn.
       
       Word = ""
+      Text = self.Text
       
       #  Find the first non-blank character (treating newline characters
       #  and carriage returns as blanks).
       
-      while (True) :
-         if (self.LastChar != "") :
-            Char = self.LastChar
-         else :
-            Char = self.GetNextChar()
-         self.LastChar = ""
-         if (Char != " " and Char != "\n" and Char != "\r") : break
-      if (Char != "") :
-         Word = Word + Char
+      Posn = self.__BlankPattern__.match(Text,self.Posn).end()
+      self.WordPosn = Posn
+      if (Posn < len(Text)) :
+         Char = Text[Posn]
          
          #  If the word started with a { or [, then we ignore blanks and
          #  keep going until we hit the corresponding closing character
-         #  (or the end of the file). Allow for nesting. Note that when
-         #  GetNextChar() returns an empty string, that's the end of the file.
+         #  (or the end of the file). Allow for nesting. Only the unescaped
+         #  delimiters need to be looked at, and the pattern finds these
+         #  for us.
          
-         Escaped = self.WasEscaped
+         Escaped = (Posn > 0 and Text[Posn - 1] == "\\")
          if ((Char == "{" or Char == "[") and not Escaped) :
             Start = Char
-            if (Start == "{") : End = "}"
-            if (Start == "[") : End = "]"
-            Nesting = 1
-            Line = self.Line + 1
-            while (True) :
-               Char = self.GetNextChar()
-               if (Char == "") :
-                  self.Problems.append(
-                          "The file appears to have an unclosed '" \
-                                            + Start + "' in line " + str(Line))
-                  self.Problems.append("The file may be missing a '" + End + \
-                                                    "' character or there may")
-                  self.Problems.append(
-                      "be a problem with nested braces or with '%' characters")
-                  break
-               Escaped = self.WasEscaped
-               if (Char != '\n' and Char != '\r') : Word = Word + Char
-               if (Char == Start and not Escaped) : Nesting = Nesting + 1
-               if (Char == End and not Escaped) :
+            End = self.__EndDelims__[Start]
+            Nesting = 0
+            EndPosn = -1
+            for Match in self.__DelimPatterns__[Start].finditer(Text,Posn) :
+               if (Match.group() == Start) :
+                  Nesting = Nesting + 1
+               else :
                   Nesting = Nesting - 1
-                  if (Nesting <= 0) : break
+                  if (Nesting <= 0) :
+                     EndPosn = Match.end()
+                     break
+            if (EndPosn < 0) :
+               Line = self.LineNumber(Posn) + 1
+               self.Problems.append(
+                       "The file appears to have an unclosed '" \
+                                         + Start + "' in line " + str(Line))
+               self.Problems.append("The file may be missing a '" + End + \
+                                                 "' character or there may")
+               self.Problems.append(
+                   "be a problem with nested braces or with '%' characters")
+               EndPosn = len(Text)
+            Word = Text[Posn:EndPosn].replace("\r","")
             
          else :
 
             #  Otherwise, just keep going until we hit a blank or one of
             #  the delimiting braces. Either of these will terminate the word,
-            #  but if it was a brace, we need to remember it for the next
-            #  time we're called. 
+            #  and if it was a brace it will be the start of the next word.
 
-            while (True) :
-               Char = self.GetNextChar()
-               Escaped = self.WasEscaped
-               if (Char == "") : break
-               if (Char == " " or Char == '\r' or Char == '\n') : break
-               if ((Char == "{" or Char == "[") and not Escaped) :
-                  self.LastChar = Char
-                  break
-               Word = Word + Char
+            EndPosn = self.__WordPattern__.match(Text,Posn + 1).end()
+            Word = Text[Posn:EndPosn]
+         Posn = EndPosn
+      self.Posn = Posn
+      self.Line = self.LineNumber(Posn)
       return Word
                            
+   def SkipPlainWords(self) :
+   
+      #  Moves the current position in the text buffer past any words that
+      #  cannot possibly contain a LaTeX directive - ordinary words with no
+      #  '\' character in them. This leaves the position at the start of the
+      #  next word that contains a '\', or at the next opening brace or
+      #  bracket (a braced word may contain a directive, and even if it does
+      #  not, it has to be read to check for unclosed braces). If there is
+      #  nothing of interest left, the position is left at the end of the
+      #  buffer.
+      
+      Text = self.Text
+      Posn = self.Posn
+      Match = self.__CandidatePattern__.search(Text,Posn)
+      if (Match == None) :
+         Posn = len(Text)
+      else :
+         Index = Match.start()
+         if (Text[Index] == "\\") :
+            
+            #  Back up to the start of the word containing the '\'. There
+            #  can't be any unescaped braces between here and there, so the
+            #  word starts after the last blank.
+            
+            Blank = max(Text.rfind(" ",Posn,Index),
+                                              Text.rfind("\r",Posn,Index))
+            if (Blank >= 0) : Posn = Blank + 1
+         else :
+            Posn = Index
+      self.Posn = Posn
+      
    def GetNextTexCommand(self,Callback,ClientData,ClientExtra) :
    
       #  Searches for the next Tex/LaTeX command read from the open .tex file.
@@ -251,15 +488,43 @@ class TexScanner(object):
       #
       #  Callback can be passed as None, in which case no callback is made -
       #  this can be used for a quick check that the file can be parsed.
+      #
+      #  While the callback is being made, CommandLine gives the number of the
+      #  line in the file on which the directive was found. Commands found
+      #  in the arguments are given the line of the directive that took the
+      #  arguments. The command details are passed as a TexCommand, which
+      #  also gives the position of each command in the file, including
+      #  those found in the arguments of other commands. If SetDirectives()
+      #  has been called, only the commands using the directives it was
+      #  given are passed to the callback.
       
       Finished = True
-      Command = []
+      Command = TexCommand()
       Directive = ""
+      if (self.DirectivePattern != None) :
+      
+         #  Find the next place any of the wanted directives appear, unless
+         #  we already know it is still ahead of us. If there isn't one,
+         #  there's no more to be found. (The word held over from the last
+         #  call, if any, starts before the current position.)
+      
+         Posn = self.Posn
+         if (self.LastWord != "") : Posn = self.LastWordPosn
+         if (self.NextWanted < Posn) :
+            Match = self.DirectivePattern.search(self.Text,Posn)
+            if (Match == None) :
+               self.Posn = len(self.Text)
+               self.LastWord = ""
+               return Finished
+            self.NextWanted = Match.start()
       while (True) :
          if (self.LastWord == "") :
+            self.SkipPlainWords()
             Word = self.GetNextWord()
+            WordPosn = self.WordPosn
          else :
             Word = self.LastWord
+            WordPosn = self.LastWordPosn
             self.LastWord = ""
          if (Word == "") : break
          # (This doesn't handle the case where there are multiple directives
@@ -270,26 +535,60 @@ class TexScanner(object):
             Directive = Word[BSlashIndex:]
             break
       if (Directive != "") :
+         Start = WordPosn + BSlashIndex
+         End = WordPosn + len(Word)
          Command.append(Directive)
+         self.SetPosition(Command,Start,None)
+         self.CommandLine = Command.Line
          Word = self.GetNextWord()
          while (Word != "") :
             if (Word[0] == '[' or Word[0] == '{') :
                Command.append(Word)
+               End = self.Posn
                
                #  Search each argument recursively for any LaTeX commands
                #  it may contain.
                
                Word = Word[1:len(Word) - 1]
                self.GetNextTexCommandFromString(Word,\
-                                            Callback,ClientData,ClientExtra)
+                            Callback,ClientData,ClientExtra,self.WordPosn + 1)
                Word = self.GetNextWord()
             else :
                self.LastWord = Word
+               self.LastWordPosn = self.WordPosn
                break
-         if (Callback != None) : Callback(Command,ClientData,ClientExtra)
+         Command.End = self.FilePosition(End - 1) + 1
+         if (Callback != None) :
+            if (self.Directives == None or Directive in self.Directives) :
+               Callback(Command,ClientData,ClientExtra)
          Finished = False
       return Finished
      
+   def IterTexCommands(self) :
+   
+      #  A generator that yields, one at a time, each TexCommand found in the
+      #  file, in the same order in which GetNextTexCommand() would pass them
+      #  to a callback. This allows a loop over the commands in the file in
+      #  place of a callback routine, and the file is only scanned as far as
+      #  is needed to produce the commands used - if the loop stops early,
+      #  so does the scan. (A command found in the argument of another
+      #  command is produced just before the command that contains it.)
+      
+      Commands = []
+      Finished = False
+      while (not Finished) :
+         Finished = self.GetNextTexCommand(self.CollectCommand,Commands,None)
+         for Command in Commands :
+            yield Command
+         del Commands[:]
+   
+   def CollectCommand(self,Command,Commands,Unused) :
+   
+      #  Used by IterTexCommands() as the callback for GetNextTexCommand().
+      #  It just adds each command to the list passed as Commands.
+      
+      Commands.append(Command)
+   
    def GetNextWordFromString(self, String, Posn):
    
       #  Returns the next 'word' from a string, given the string and a start
@@ -372,7 +671,7 @@ class TexScanner(object):
       return (Word,Index)
 
    def GetNextTexCommandFromString(self,\
-                             String,Callback,ClientData,ClientExtra) :
+                String,Callback,ClientData,ClientExtra,Offset = None) :
       
       #  This is similar to GetNextTexCommand(), except that it works not on
       #  a file but on a string, and it works recursively, calling itself
@@ -381,13 +680,23 @@ class TexScanner(object):
       #  callback routine is called with the command details and the client
       #  arguments, just as for GetNextTexCommand(). Callback can be passed
       #  as None, in which case no callback is made - this can be used for a
-      #  quick check that the file can be parsed.
+      #  quick check that the file can be parsed. If the string is part of
+      #  the text buffer, Offset is the position in the buffer at which it
+      #  starts, and the position of each command is set in the TexCommand
+      #  passed to the callback (using BufferPosn(), since the string will
+      #  have had any carriage returns removed). Otherwise, the position is
+      #  left as zero.
+      #  If SetDirectives() has been called, there is nothing to do unless
+      #  the string includes one of the wanted directives.
+      
+      if (self.DirectivePattern != None) :
+         if (self.DirectivePattern.search(String) == None) : return
       
       Posn = 0
       More = True
       while (More) :
          Directive = ""
-         Command = []
+         Command = TexCommand()
 
          #  Apart from the recursion, this code follows the general lines of
          #  GetNextTexCommand().
@@ -399,10 +708,12 @@ class TexScanner(object):
             if (Word == "") : break
             if (Word[0] == '[' or Word[0] == '{') :
                self.GetNextTexCommandFromString(Word[1:len(Word) - 1],\
-                                               Callback,ClientData,ClientExtra)
+                 Callback,ClientData,ClientExtra,self.ArgOffset(Offset,Word,Posn))
             BSlashIndex = Word.find('\\')
             if (BSlashIndex >= 0) :
                Directive = Word[BSlashIndex:]
+               Start = Posn - len(Word) + BSlashIndex
+               End = Posn
                break
          More = False
          if (Directive != "") :
@@ -413,21 +724,112 @@ class TexScanner(object):
             if (Word != "") :
                if (Word[0] == '[' or Word[0] == '{') :
                   self.GetNextTexCommandFromString(Word[1:len(Word) - 1],\
-                                               Callback,ClientData,ClientExtra)
+                 Callback,ClientData,ClientExtra,self.ArgOffset(Offset,Word,Posn))
             while (Word != "") :
                if (Word[0] == '[' or Word[0] == '{') :
                   Command.append(Word)
+                  End = Posn
                   WordPair = self.GetNextWordFromString(String,Posn)
                   Word = WordPair[0]
                   Posn = WordPair[1]
                   if (Word != "") :
                      if (Word[0] == '[' or Word[0] == '{') :
                         self.GetNextTexCommandFromString(Word[1:len(Word) - 1],\
-                                               Callback,ClientData,ClientExtra)
+                 Callback,ClientData,ClientExtra,self.ArgOffset(Offset,Word,Posn))
                      More = False
                      if (String[Posn:].strip(" \\r\\n") != "") : More = True
                else :
                   More = True
                   break
-            if (Callback != None) : Callback(Command,ClientData,ClientExtra)
-            
+            if (Offset != None) :
+               self.SetPosition(Command,self.BufferPosn(Offset,Start),\
+                                        self.BufferPosn(Offset,End - 1) + 1)
+            if (Callback != None) :
+               if (self.Directives == None or Directive in self.Directives) :
+                  Callback(Command,ClientData,ClientExtra)
+
+
+   def ArgOffset(self,Offset,Word,Posn) :
+   
+      #  Used by GetNextTexCommandFromString() when it searches an argument
+      #  for more commands. Given the offset in the buffer of the string being
+      #  searched (None if not known), a bracketed word from that string and
+      #  the position in the string just after the word, returns the offset
+      #  in the buffer of the contents of the brackets - the position just
+      #  after the opening bracket, found using BufferPosn().
+      
+      if (Offset == None) : return None
+      return self.BufferPosn(Offset,Posn - len(Word)) + 1
+
+
+class TexDispatcher(object):
+
+   #  A TexDispatcher allows any number of callback routines to be run from
+   #  a single pass through a .tex file. Each callback is registered using
+   #  Register(), together with the ClientData and ClientExtra arguments it
+   #  should be passed and, optionally, a list of the directives it is
+   #  interested in (eg ["\\title"]). The dispatcher's Dispatch() routine is
+   #  itself a callback that can be passed to GetNextTexCommand(), and for
+   #  each command found it calls, in the order in which they were registered,
+   #  each callback registered for that directive and each callback that
+   #  was registered without a list of directives.
+   
+   def __init__(self):
+      self.Entries = []
+      self.ByDirective = {}
+      self.ForAll = []
+      self.Callbacks = {}
+      
+   def Register(self,Callback,ClientData,ClientExtra,Directives = None) :
+   
+      #  Registers a callback routine, to be called with the details of each
+      #  LaTeX command found that uses one of the specified directives. If
+      #  Directives is None, the callback is called for every command.
+      
+      Entry = (len(self.Entries),Callback,ClientData,ClientExtra)
+      self.Entries.append(Entry)
+      if (Directives == None) :
+         self.ForAll.append(Entry)
+      else :
+         for Directive in Directives :
+            if (Directive in self.ByDirective) :
+               self.ByDirective[Directive].append(Entry)
+            else :
+               self.ByDirective[Directive] = [Entry]
+      self.Callbacks = {}
+      
+   def Dispatch(self,Command,ClientData,ClientExtra) :
+   
+      #  Passes a command, as supplied by GetNextTexCommand(), on to each of
+      #  the registered callbacks interested in it. The ClientData and
+      #  ClientExtra arguments are ignored - each callback gets its own. The
+      #  list of callbacks for each directive is worked out the first time
+      #  that directive is seen, and remembered.
+      
+      Directive = ""
+      if (len(Command) > 0) : Directive = Command[0]
+      Callbacks = self.Callbacks.get(Directive)
+      if (Callbacks == None) :
+         Callbacks = sorted(self.ByDirective.get(Directive,[]) + self.ForAll)
+         self.Callbacks[Directive] = Callbacks
+      for Entry in Callbacks :
+         Entry[1](Command,Entry[2],Entry[3])
+         
+   def GetDirectives(self) :
+   
+      #  Returns a list of all the directives the registered callbacks are
+      #  interested in, or None if any callback was registered for every
+      #  command. This can be passed to a TexScanner's SetDirectives().
+      
+      if (len(self.ForAll) > 0) : return None
+      return sorted(self.ByDirective)
+      
+   def Scan(self,Scanner) :
+   
+      #  Runs through all the commands in the file supplied to the TexScanner
+      #  passed as Scanner (which should already have had SetFile() called),
+      #  passing each one on to the registered callbacks.
+      
+      Finished = False
+      while (not Finished) :
+         Finished = Scanner.GetNextTexCommand(self.Dispatch,None,None)